@@ -0,0 +1,196 @@
+# game_service/app/anomaly_scan.py
+"""
+Offline scan of finished sessions for scores that look wrong.
+
+/game/finish takes scores as submitted; checking them there would slow
+every finish down, so this runs as a separate job instead:
+
+    python -m game_service.app.anomaly_scan             # flag into score_reviews
+    python -m game_service.app.anomaly_scan --dry-run   # only print the counts
+    python -m game_service.app.anomaly_scan --since 1767225600
+
+Every finished (session, player) score is read in large batches into NumPy
+arrays, and two checks run over all of them at once:
+
+- z-score against the player's own history: how far the score is from the
+  mean of the player's *other* games, in standard deviations. Only players
+  with at least ANOMALY_MIN_HISTORY other games are judged.
+- score rate: points per second of game time (finished_at - started_at).
+  A point is a hit, so more than ANOMALY_MAX_SCORE_RATE per second is not
+  humanly possible; so is any score in a game without duration.
+
+Scores above ANOMALY_Z_THRESHOLD or ANOMALY_MAX_SCORE_RATE are upserted
+into `score_reviews`, one document per (session_id, user_id). A rerun
+refreshes the numbers but keeps each review's `status` and `flagged_at`.
+History is always read in full; `--since` only limits which games can be
+flagged.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, Optional
+
+import numpy as np
+from pymongo import UpdateOne
+
+from .db import get_db
+
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "4"))
+ANOMALY_MAX_SCORE_RATE = float(os.getenv("ANOMALY_MAX_SCORE_RATE", "15"))
+ANOMALY_MIN_HISTORY = int(os.getenv("ANOMALY_MIN_HISTORY", "5"))
+ANOMALY_BATCH_SIZE = int(os.getenv("ANOMALY_BATCH_SIZE", "50000"))
+
+# One row per player of every finished session
+ROWS_PIPELINE = [
+    {"$match": {"finished_at": {"$ne": None}}},
+    {"$project": {
+        "_id": 0,
+        "session_id": 1,
+        "finished_at": 1,
+        "duration": {"$subtract": ["$finished_at", "$started_at"]},
+        "score": {"$objectToArray": "$scores"},
+    }},
+    {"$unwind": "$score"},
+    {"$project": {
+        "session_id": 1,
+        "finished_at": 1,
+        "duration": 1,
+        "user_id": "$score.k",
+        "score": "$score.v",
+    }},
+]
+
+
+def score_anomalies(
+    users: np.ndarray,
+    scores: np.ndarray,
+    durations: np.ndarray,
+    z_threshold: float = ANOMALY_Z_THRESHOLD,
+    max_rate: float = ANOMALY_MAX_SCORE_RATE,
+    min_history: int = ANOMALY_MIN_HISTORY,
+) -> Dict[str, np.ndarray]:
+    """
+    Per-row z-score against the rest of that player's rows, score rate,
+    and which rows are anomalous for which reason. `users` are integer
+    player codes (0..n-1), one per row like scores and durations.
+    """
+    scores = scores.astype(np.float64)
+    counts = np.bincount(users)
+    sums = np.bincount(users, weights=scores)
+    squares = np.bincount(users, weights=scores * scores)
+
+    # Leave-one-out: the score itself must not pull its own baseline up
+    others = counts[users] - 1
+    judged = others >= max(min_history, 2)
+    safe = np.where(judged, others, 1)
+    mean = (sums[users] - scores) / safe
+    variance = (squares[users] - scores * scores) / safe - mean * mean
+    std = np.sqrt(np.maximum(variance, 0))
+    # Flat histories (std 0) are judged against a std of 1 point
+    z = np.where(judged, (scores - mean) / np.maximum(std, 1.0), 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(durations > 0, scores / durations, np.where(scores > 0, np.inf, 0.0))
+
+    high_z = z > z_threshold
+    high_rate = rate > max_rate
+    return {"z": z, "rate": rate, "high_z": high_z, "high_rate": high_rate, "flagged": high_z | high_rate}
+
+
+async def load_rows(db, batch_size: int = ANOMALY_BATCH_SIZE) -> Dict[str, np.ndarray]:
+    """
+    Every finished (session, player) score as column arrays. Rows arrive
+    `batch_size` at a time and are appended column by column, so nothing
+    but the columns themselves is held in memory.
+    """
+    codes: Dict[str, int] = {}
+    session_ids, user_ids, users, scores, durations, finished = [], [], [], [], [], []
+
+    cursor = db.sessions.aggregate(ROWS_PIPELINE, allowDiskUse=True, batchSize=batch_size)
+    async for row in cursor:
+        session_ids.append(row["session_id"])
+        user_ids.append(row["user_id"])
+        users.append(codes.setdefault(row["user_id"], len(codes)))
+        scores.append(row["score"] or 0)
+        durations.append(row["duration"] or 0.0)
+        finished.append(row["finished_at"])
+
+    return {
+        "session_id": np.array(session_ids, dtype=object),
+        "user_id": np.array(user_ids, dtype=object),
+        "user": np.array(users, dtype=np.int64),
+        "score": np.array(scores, dtype=np.float64),
+        "duration": np.array(durations, dtype=np.float64),
+        "finished_at": np.array(finished, dtype=np.float64),
+    }
+
+
+def review_ops(rows: Dict[str, np.ndarray], result: Dict[str, np.ndarray], mask: np.ndarray, now: float):
+    for i in np.flatnonzero(mask):
+        reasons = []
+        if result["high_z"][i]:
+            reasons.append("score_zscore")
+        if result["high_rate"][i]:
+            reasons.append("score_rate")
+        rate = float(result["rate"][i])
+        yield UpdateOne(
+            {"session_id": rows["session_id"][i], "user_id": rows["user_id"][i]},
+            {
+                "$set": {
+                    "score": float(rows["score"][i]),
+                    "finished_at": float(rows["finished_at"][i]),
+                    "zscore": float(result["z"][i]),
+                    # JSON and BSON have no infinity worth storing
+                    "score_rate": rate if np.isfinite(rate) else None,
+                    "reasons": reasons,
+                    "scanned_at": now,
+                },
+                "$setOnInsert": {"status": "open", "flagged_at": now},
+            },
+            upsert=True,
+        )
+
+
+async def scan(db, since: Optional[float] = None, dry_run: bool = False, batch_size: int = ANOMALY_BATCH_SIZE) -> dict:
+    started = time.perf_counter()
+    rows = await load_rows(db, batch_size)
+    loaded = time.perf_counter()
+
+    result = score_anomalies(rows["user"], rows["score"], rows["duration"])
+    mask = result["flagged"]
+    if since is not None:
+        mask = mask & (rows["finished_at"] >= since)
+
+    summary = {
+        "rows": int(len(rows["score"])),
+        "players": int(rows["user"].max()) + 1 if len(rows["user"]) else 0,
+        "flagged": int(mask.sum()),
+        "score_zscore": int((mask & result["high_z"]).sum()),
+        "score_rate": int((mask & result["high_rate"]).sum()),
+        "load_seconds": round(loaded - started, 2),
+        "scan_seconds": round(time.perf_counter() - loaded, 2),
+    }
+    if dry_run or not summary["flagged"]:
+        return summary
+
+    ops = list(review_ops(rows, result, mask, time.time()))
+    for i in range(0, len(ops), batch_size):
+        await db.score_reviews.bulk_write(ops[i:i + batch_size], ordered=False)
+    return summary
+
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Flag anomalous game scores into score_reviews")
+    parser.add_argument("--since", type=float, help="only flag games finished at or after this unix time")
+    parser.add_argument("--dry-run", action="store_true", help="report counts, write nothing")
+    args = parser.parse_args(argv)
+
+    summary = await scan(get_db(), since=args.since, dry_run=args.dry_run)
+    print(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
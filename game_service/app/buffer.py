@@ -0,0 +1,118 @@
+# game_service/app/buffer.py
+"""
+Write-behind buffer for new session documents (opt-in:
+SESSION_WRITE_BEHIND=1).
+
+/game/start hands its document to the buffer and answers right away; the
+buffer sends everything it collected in one insert_many once
+SESSION_BUFFER_MAX_ITEMS are waiting or SESSION_BUFFER_MAX_DELAY seconds
+after the first one arrived, whichever comes first. Lifespan shutdown
+flushes what is left.
+
+Reads and writes of a session that may still be buffered call
+`flush_pending(session_id)` first, which waits until it is in Mongo; for
+sessions that are not buffered it costs nothing. History reads use
+`flush_where(...)` the same way: they only flush when one of the reader's
+own starts is still waiting, so reads under load do not force out everyone
+else's pending starts.
+
+Trade-off: documents that are still buffered when the process dies, or
+that Mongo rejects on flush, are lost, and their finish returns 404.
+"""
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional, Set
+
+from .db import get_db
+
+SESSION_WRITE_BEHIND = os.getenv("SESSION_WRITE_BEHIND", "0") == "1"
+SESSION_BUFFER_MAX_ITEMS = int(os.getenv("SESSION_BUFFER_MAX_ITEMS", "100"))
+SESSION_BUFFER_MAX_DELAY = float(os.getenv("SESSION_BUFFER_MAX_DELAY", "0.05"))
+
+
+class InsertBuffer:
+    def __init__(
+        self,
+        collection: Callable,
+        key: str,
+        max_items: int = SESSION_BUFFER_MAX_ITEMS,
+        max_delay: float = SESSION_BUFFER_MAX_DELAY,
+    ):
+        self._collection = collection
+        self.key = key
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self._queue: List[dict] = []
+        # Queued and in-flight documents by key, until they are in Mongo
+        self._pending: Dict[str, dict] = {}
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.flushes = 0
+        self.inserted = 0
+        self.failed = 0
+
+    def add(self, doc: dict) -> None:
+        self._queue.append(doc)
+        self._pending[doc[self.key]] = doc
+        if len(self._queue) >= self.max_items:
+            self._spawn(self.flush())
+        elif self._timer is None:
+            self._timer = self._spawn(self._flush_later())
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        await self.flush()
+
+    def is_pending(self, key: str) -> bool:
+        return key in self._pending
+
+    async def flush_pending(self, key: str) -> None:
+        if key in self._pending:
+            # Either sends it, or waits for the flush that already has it
+            await self.flush()
+
+    async def flush_where(self, match: Callable[[dict], bool]) -> None:
+        # At most max_items queued plus one flush in flight to look through
+        if any(match(doc) for doc in list(self._pending.values())):
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            batch, self._queue = self._queue, []
+            if not batch:
+                return
+            try:
+                await self._collection().insert_many(batch, ordered=False)
+                self.inserted += len(batch)
+            except Exception as exc:
+                self.failed += len(batch)
+                print("session buffer flush failed:", repr(exc))
+            finally:
+                self.flushes += 1
+                for doc in batch:
+                    self._pending.pop(doc[self.key], None)
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._queue),
+            "flushes": self.flushes,
+            "inserted": self.inserted,
+            "failed": self.failed,
+        }
+
+
+session_buffer = InsertBuffer(lambda: get_db().sessions, key="session_id")
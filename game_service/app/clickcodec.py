@@ -0,0 +1,103 @@
+# game_service/app/clickcodec.py
+"""
+Binary encoding of a chunk of click events, stored as the `data` blob of
+`session_clicks` chunks.
+
+Layout (all integers are unsigned LEB128 varints):
+
+    version | count | t deltas | x deltas | y deltas | hit bitmap
+
+Each of t, x and y is stored column-wise as the difference to the previous
+event's value (the first one to 0), zigzag-mapped so small negative steps
+stay small too. Consecutive clicks are a few ms and a few hundred pixels
+apart, so most values fit in one or two bytes instead of the ~20 bytes per
+field a BSON array element costs. `hit` is one bit per event.
+
+Chunks are only decoded when a replay asks for them.
+"""
+from typing import List, Tuple
+
+VERSION = 1
+
+Event = Tuple[int, int, int, bool]
+
+
+def _zigzag(n: int) -> int:
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def _unzigzag(n: int) -> int:
+    return n >> 1 if not n & 1 else -(n >> 1) - 1
+
+
+def _put_varint(out: bytearray, n: int) -> None:
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _put_deltas(out: bytearray, values) -> None:
+    previous = 0
+    for value in values:
+        _put_varint(out, _zigzag(value - previous))
+        previous = value
+
+
+def encode_events(events: List[Event]) -> bytes:
+    out = bytearray([VERSION])
+    _put_varint(out, len(events))
+    if not events:
+        return bytes(out)
+
+    ts, xs, ys, hits = zip(*events)
+    for column in (ts, xs, ys):
+        _put_deltas(out, column)
+
+    bitmap = bytearray((len(hits) + 7) // 8)
+    for i, hit in enumerate(hits):
+        if hit:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    out += bitmap
+    return bytes(out)
+
+
+def decode_columns(data: bytes) -> Tuple[List[int], List[int], List[int], List[bool]]:
+    """The chunk as (t, x, y, hit) columns. Raises ValueError if it is not one."""
+    if not data or data[0] != VERSION:
+        raise ValueError("Unknown click chunk encoding")
+
+    pos = 1
+
+    def varint() -> int:
+        nonlocal pos
+        n = shift = 0
+        while True:
+            try:
+                byte = data[pos]
+            except IndexError:
+                raise ValueError("Truncated click chunk")
+            pos += 1
+            n |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    count = varint()
+    columns = []
+    for _ in range(3):
+        column, value = [], 0
+        for _ in range(count):
+            value += _unzigzag(varint())
+            column.append(value)
+        columns.append(column)
+
+    bitmap = data[pos:pos + (count + 7) // 8]
+    if len(bitmap) != (count + 7) // 8:
+        raise ValueError("Truncated click chunk")
+    hits = [bool(bitmap[i >> 3] >> (i & 7) & 1) for i in range(count)]
+    return columns[0], columns[1], columns[2], hits
+
+
+def decode_events(data: bytes) -> List[Event]:
+    return list(zip(*decode_columns(data)))
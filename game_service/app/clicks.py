@@ -0,0 +1,191 @@
+# game_service/app/clicks.py
+"""
+Click events of games in progress, streamed in over WebSocket.
+
+Events are collected in memory per (session, player) and written in
+micro-batches:
+every CLICK_FLUSH_INTERVAL seconds (or as soon as CLICK_FLUSH_MAX_EVENTS
+are waiting) everything collected since the last flush goes out in one
+unordered bulk_write, one `session_clicks` chunk document per player of a
+session:
+
+    {session_id, user_id, t0, count, hits, data: <binary>}
+
+`data` holds the events delta-encoded column by column (see clickcodec.py)
+and is only decoded for replays. `t` is milliseconds since the game started
+and `t0` the first of them, which orders a player's chunks (a client that
+reconnects mid-game just continues its timeline). In multiplayer sessions
+every player has their own buffer and timeline.
+Running totals per session (clicks, hits) are kept in memory while the
+session is connected, so the server can follow a game as it is played.
+"""
+import asyncio
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+from pymongo import InsertOne
+
+from .clickcodec import encode_events
+from .db import get_db
+
+CLICK_FLUSH_INTERVAL = float(os.getenv("CLICK_FLUSH_INTERVAL", "0.25"))
+CLICK_FLUSH_MAX_EVENTS = int(os.getenv("CLICK_FLUSH_MAX_EVENTS", "20000"))
+# Events a single session may have waiting; more is a misbehaving client
+CLICK_MAX_PENDING_PER_SESSION = int(os.getenv("CLICK_MAX_PENDING_PER_SESSION", "5000"))
+
+# Bound on t, x and y: keeps chunk fields within BSON's int32/int64 range
+CLICK_VALUE_LIMIT = 2 ** 31
+
+
+def _valid(value) -> bool:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    # json.loads accepts Infinity and NaN; both fail the range check
+    return -CLICK_VALUE_LIMIT < value < CLICK_VALUE_LIMIT
+
+
+def parse_events(message) -> List[tuple]:
+    """
+    One event object or a list of them -> [(t, x, y, hit)]. Raises
+    ValueError for anything malformed.
+    """
+    events = message if isinstance(message, list) else [message]
+    parsed = []
+    for event in events:
+        if not isinstance(event, dict):
+            raise ValueError("Invalid click event")
+        t, x, y, hit = event.get("t"), event.get("x", 0), event.get("y", 0), event.get("hit", False)
+        if not all(_valid(v) for v in (t, x, y)):
+            raise ValueError("Invalid click event")
+        parsed.append((int(t), int(x), int(y), bool(hit)))
+    return parsed
+
+
+class SessionClicks:
+    def __init__(self, session_id: str, user_id: str):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.pending: List[tuple] = []
+        self.clicks = 0
+        self.hits = 0
+        self.dropped = 0
+        # Open sockets feeding this buffer; a reconnect may overlap the old one
+        self.connections = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.connections == 0
+
+    def add(self, events: List[tuple]) -> int:
+        room = CLICK_MAX_PENDING_PER_SESSION - len(self.pending)
+        accepted = events[:max(room, 0)]
+        self.dropped += len(events) - len(accepted)
+        self.pending.extend(accepted)
+        self.clicks += len(accepted)
+        self.hits += sum(1 for event in accepted if event[3])
+        return len(accepted)
+
+    def take_chunk(self) -> Optional[dict]:
+        if not self.pending:
+            return None
+        events, self.pending = self.pending, []
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "t0": events[0][0],
+            "count": len(events),
+            "hits": sum(1 for event in events if event[3]),
+            "data": encode_events(events),
+        }
+
+
+class ClickIngestor:
+    """Per-session click buffers and the flush loop; lifecycle like StandingsWatcher."""
+
+    def __init__(self, interval: float = CLICK_FLUSH_INTERVAL, max_events: int = CLICK_FLUSH_MAX_EVENTS):
+        self.interval = interval
+        self.max_events = max_events
+        # (session_id, user_id) -> that player's buffer
+        self.sessions: Dict[Tuple[str, str], SessionClicks] = {}
+        self._waiting = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self.events = 0
+        self.dropped = 0
+        self.writes = 0
+
+    def open(self, session_id: str, user_id: str) -> SessionClicks:
+        key = (session_id, user_id)
+        if key not in self.sessions:
+            self.sessions[key] = SessionClicks(session_id, user_id)
+        clicks = self.sessions[key]
+        clicks.connections += 1
+        return clicks
+
+    def close(self, session_id: str, user_id: str) -> None:
+        # Once its last socket is gone, dropped by the next flush after its
+        # last events went out
+        clicks = self.sessions.get((session_id, user_id))
+        if clicks is not None:
+            clicks.connections = max(clicks.connections - 1, 0)
+
+    def add(self, session_id: str, user_id: str, events: List[tuple]) -> int:
+        accepted = self.sessions[(session_id, user_id)].add(events)
+        self.events += accepted
+        self.dropped += len(events) - accepted
+        self._waiting += accepted
+        if self._waiting >= self.max_events:
+            task = asyncio.ensure_future(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        return accepted
+
+    async def flush_pending(self, session_id: str) -> None:
+        # A replay of a game still being played includes its latest events
+        if any(sid == session_id for sid, _ in self.sessions):
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            chunks = [chunk for chunk in (s.take_chunk() for s in self.sessions.values()) if chunk]
+            self._waiting = 0
+            for key in [key for key, s in self.sessions.items() if s.closed]:
+                del self.sessions[key]
+            if not chunks:
+                return
+            try:
+                await get_db().session_clicks.bulk_write([InsertOne(c) for c in chunks], ordered=False)
+                self.writes += 1
+            except Exception as exc:
+                print("click flush failed:", repr(exc))
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "events": self.events,
+            "writes": self.writes,
+            "dropped": self.dropped,
+        }
+
+
+click_ingestor = ClickIngestor()
@@ -1,38 +1,145 @@
+import asyncio
+import base64
+import json
+import os
 import time
 import uuid
-from typing import Optional, List, Dict
+from typing import AsyncIterator, Optional, List, Dict, Tuple
+
+from collections import Counter
+
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 from .db import get_db
-from .models import GameSessionInDB, GameSessionPublicResponse
+from .models import GameSessionInDB
+from .rollups import rollup_buckets
+from .histogram import apply_histogram_moves, histogram_moves
+from .buffer import SESSION_WRITE_BEHIND, session_buffer
+from .registry import SESSION_STORE, session_registry
+from .clicks import click_ingestor
+from .clickcodec import decode_columns
+from .ids import new_session_id, normalize_session_id
+
+
+# Seconds a finisher has to record a session's stats before a repeat finish
+# may take the fold over (see _retry_stats)
+STATS_CLAIM_TIMEOUT = float(os.getenv("STATS_CLAIM_TIMEOUT", "60"))
+
+# Position in a player's history: (finished_at, session_id) of the last
+# session of a page; finished_at is None for unfinished sessions
+Cursor = Tuple[Optional[float], str]
+
+
+def encode_cursor(entry: dict) -> str:
+    raw = json.dumps([entry["finished_at"], entry["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        finished_at, session_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if isinstance(finished_at, bool) or not isinstance(finished_at, (int, float, type(None))):
+        raise ValueError("Invalid cursor")
+    if not isinstance(session_id, str):
+        raise ValueError("Invalid cursor")
+    return finished_at, session_id
 
 
-async def list_sessions(user_id: Optional[str] = None, limit: int = 50) -> List[dict]:
+# Only what GameSessionPublicResponse needs, renamed on the server
+HISTORY_PROJECTION = {
+    "_id": 0,
+    "id": "$session_id",
+    "user_id": 1,
+    "scores": 1,
+    "started_at": 1,
+    "finished_at": 1,
+}
+
+
+async def list_sessions(user_id: Optional[str] = None, limit: int = 50, after: Optional[Cursor] = None) -> List[dict]:
+    """
+    A page of game history, most recently finished first (unfinished
+    sessions last), ties broken by session_id.
+
+    Later pages seek from the `after` cursor on the
+    {user_id, finished_at, session_id} index instead of skipping, so a deep
+    page costs the same as the first one.
+    """
     db = get_db()
 
     filter_query = {}
     if user_id:
         filter_query["user_id"] = user_id
 
-    cursor = db.sessions.find(filter_query).sort("finished_at", -1).limit(limit)
+    if after is not None:
+        finished_at, session_id = after
+        if finished_at is None:
+            filter_query.update({"finished_at": None, "session_id": {"$lt": session_id}})
+        else:
+            # null sorts below every number, so unfinished sessions come after
+            filter_query["$or"] = [
+                {"finished_at": {"$lt": finished_at}},
+                {"finished_at": finished_at, "session_id": {"$lt": session_id}},
+                {"finished_at": None},
+            ]
 
-    results = []
+    # Started-but-buffered sessions belong in the list too
+    if user_id:
+        await session_buffer.flush_where(lambda doc: user_id in doc["user_id"])
+    else:
+        await session_buffer.flush()
+
+    cursor = (
+        db.sessions.find(filter_query, HISTORY_PROJECTION)
+        .sort([("finished_at", -1), ("session_id", -1)])
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
+
+async def iter_sessions(
+    user_id: str,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    batch_size: int = 500,
+) -> AsyncIterator[dict]:
+    """
+    Every session of `user_id` in history order, optionally only those
+    finished in [since, until). Documents are pulled from the cursor
+    `batch_size` at a time, so memory stays flat however long the history.
+    """
+    db = get_db()
+
+    filter_query = {"user_id": user_id}
+    finished_range = {}
+    if since is not None:
+        finished_range["$gte"] = since
+    if until is not None:
+        finished_range["$lt"] = until
+    if finished_range:
+        filter_query["finished_at"] = finished_range
+
+    await session_buffer.flush_where(lambda doc: user_id in doc["user_id"])
+
+    cursor = (
+        db.sessions.find(filter_query, HISTORY_PROJECTION)
+        .sort([("finished_at", -1), ("session_id", -1)])
+        .batch_size(batch_size)
+    )
     async for doc in cursor:
-        session_data = {
-            "id": doc["session_id"],
-            "user_id": doc["user_id"],
-            "scores": doc["scores"],
-            "started_at": doc["started_at"],
-            "finished_at": doc.get("finished_at")
-        }
-        results.append(GameSessionPublicResponse(**session_data))
-    return results
+        yield doc
+
 
 async def start_game(user_id: str) -> str:
     """
-    Create a new game session document in MongoDB.
+    Create a new game session document: in the in-memory registry, in
+    MongoDB, or both, depending on SESSION_STORE (see registry.py).
     """
     db = get_db()
-    session_id = str(uuid.uuid4())
+    session_id = new_session_id()
 
     doc = {
         "session_id": session_id,
@@ -42,12 +149,50 @@ async def start_game(user_id: str) -> str:
         "finished_at": None,
     }
 
-    await db.sessions.insert_one(doc)
+    if SESSION_STORE != "mongo":
+        session_registry.add(doc)
+        if SESSION_STORE == "memory":
+            # Only reaches Mongo if it is finished
+            return session_id
+
+    # Copies: the driver adds an _id to the document it inserts
+    if SESSION_WRITE_BEHIND:
+        session_buffer.add(dict(doc))
+    else:
+        await db.sessions.insert_one(dict(doc))
+    return session_id
+
+
+async def start_multiplayer_game(user_id: str, players: List[str], submit_window: float) -> str:
+    """
+    Create a session that several players report into, each with
+    submit_score. It goes straight to Mongo (never the registry): its
+    players may be served by different workers.
+    """
+    db = get_db()
+    session_id = new_session_id()
+    started_at = time.time()
+
+    await db.sessions.insert_one({
+        "session_id": session_id,
+        "user_id": [user_id],
+        "scores": {},
+        "started_at": started_at,
+        "finished_at": None,
+        "expected_players": list(dict.fromkeys([user_id, *players])),
+        "submit_deadline": started_at + submit_window,
+    })
     return session_id
 
 
 async def get_session(session_id: str) -> Optional[GameSessionInDB]:
+    session_id = normalize_session_id(session_id)
+    registered = session_registry.get(session_id)
+    if registered is not None:
+        return GameSessionInDB(**registered)
+
     db = get_db()
+    await session_buffer.flush_pending(session_id)
     doc = await db.sessions.find_one({"session_id": session_id})
     if not doc:
         return None
@@ -56,30 +201,426 @@ async def get_session(session_id: str) -> Optional[GameSessionInDB]:
     return GameSessionInDB(**doc)
 
 
+async def get_click_replay(session_id: str, user_id: str) -> dict:
+    """
+    Every click of one player in a session, in order, as columns: {count,
+    hits, t, x, y, hit}. This is the only place chunks are decoded; the session documents
+    themselves never carry clicks.
+    """
+    db = get_db()
+    session_id = normalize_session_id(session_id)
+    await click_ingestor.flush_pending(session_id)
+
+    replay = {"count": 0, "hits": 0, "t": [], "x": [], "y": [], "hit": []}
+    cursor = db.session_clicks.find(
+        {"session_id": session_id, "user_id": user_id}, {"_id": 0, "count": 1, "hits": 1, "data": 1}
+    ).sort("t0", 1)
+    async for chunk in cursor:
+        for name, column in zip(("t", "x", "y", "hit"), decode_columns(chunk["data"])):
+            replay[name].extend(column)
+        replay["count"] += chunk["count"]
+        replay["hits"] += chunk["hits"]
+    return replay
+
+
 async def finish_game(
         session_id: str,
         final_scores: Dict[str, int] = None,
         finished_at: Optional[float] = None,
+        user_id: Optional[str] = None,
         ) -> Optional[GameSessionInDB]:
     """
     Mark game as finished and set finished_at timestamp.
+
+    One atomic find_one_and_update that only matches an unfinished session
+    (of `user_id`, when given) and returns the finished document. Finishing
+    an already finished session again does not change it and returns the
+    stored result, so client retries are safe.
+
+    Stats are recorded by the call that finished the session, which then
+    marks it `stats_recorded`. If that call fails before the mark, a repeat
+    finish records them instead (see _retry_stats), so a game reaches the
+    stats once the client retries until it gets an answer. A fold that
+    failed half-way is re-run in full, counting its completed part twice.
+    Returns None for unknown sessions and sessions the caller is not in.
+    Raises ValueError, before anything is written, if `finished_at` cannot
+    be rolled up.
     """
     db = get_db()
+    session_id = normalize_session_id(session_id)
 
     if finished_at is None:
         finished_at = time.time()
+    rollup_buckets(finished_at)
 
-    all_users = list(final_scores.keys())
+    # A finish without scores keeps its finisher as the session's player
+    all_users = list(final_scores.keys()) or ([user_id] if user_id else [])
 
-    await db.sessions.update_one(
-        {"session_id": session_id},
+    # Registry entries are only dropped once the finish is in Mongo: a failed
+    # write can be retried, and a concurrent repeat does not find it gone
+    registered = session_registry.get(session_id)
+    owns = registered is not None and (not user_id or user_id in registered["user_id"])
+    if owns and SESSION_STORE == "memory":
+        # First time this session reaches Mongo, already finished
+        doc = {**registered, "scores": final_scores, "user_id": all_users, "finished_at": finished_at,
+               "stats_claim": time.time()}
+        try:
+            await db.sessions.insert_one(dict(doc))
+        except DuplicateKeyError:
+            # A concurrent finish of the same session inserted it first;
+            # answered below from the stored result
+            session_registry.pop(session_id)
+        else:
+            session_registry.pop(session_id)
+            await _fold_stats(session_id, final_scores, finished_at)
+            return GameSessionInDB(**doc)
+
+    # Multiplayer sessions are only finished through submit_score
+    query = {"session_id": session_id, "finished_at": None, "expected_players": {"$exists": False}}
+    if user_id:
+        query["user_id"] = user_id
+
+    # Started with write-behind and not flushed yet: get it into Mongo first
+    await session_buffer.flush_pending(session_id)
+
+    doc = await db.sessions.find_one_and_update(
+        query,
         {
             "$set": {
                 "scores": final_scores,
                 "user_id": all_users,
-                "finished_at": finished_at
+                "finished_at": finished_at,
+                "stats_claim": time.time(),
             }
         },
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+    if doc:
+        if owns:
+            session_registry.pop(session_id)
+        await _fold_stats(session_id, final_scores, finished_at)
+        return GameSessionInDB(**doc)
+
+    # Not finished by this call: a repeat, someone else's session or unknown
+    existing = await get_session(session_id)
+    if existing is None or existing.finished_at is None:
+        return None
+    if user_id and user_id not in existing.user_id:
+        return None
+    await _retry_stats(session_id)
+    return existing
+
+
+async def _fold_stats(session_id: str, final_scores: Dict[str, int], finished_at: float) -> None:
+    """
+    Record the stats of a session whose `stats_claim` this caller holds,
+    then mark them recorded. On failure the claim is given up, so the next
+    repeat finish retries at once instead of after STATS_CLAIM_TIMEOUT.
+    """
+    db = get_db()
+    try:
+        await record_user_stats(final_scores, finished_at)
+    except Exception:
+        await db.sessions.update_one(
+            {"session_id": session_id, "stats_recorded": {"$exists": False}}, {"$set": {"stats_claim": 0}}
+        )
+        raise
+    await db.sessions.update_one(
+        {"session_id": session_id}, {"$set": {"stats_recorded": True}, "$unset": {"stats_claim": ""}}
+    )
+
+
+async def _retry_stats(session_id: str) -> None:
+    """
+    Record the stats of a finished session whose fold never completed: its
+    finisher failed (claim given up) or has held the claim for longer than
+    STATS_CLAIM_TIMEOUT. Taking the claim is a conditional update, so only
+    one of several concurrent repeats runs the fold. Sessions finished
+    before the marker existed carry no claim and are left alone.
+    """
+    now = time.time()
+    doc = await get_db().sessions.find_one_and_update(
+        {
+            "session_id": session_id,
+            "finished_at": {"$ne": None},
+            "stats_recorded": {"$exists": False},
+            "stats_claim": {"$lt": now - STATS_CLAIM_TIMEOUT},
+        },
+        {"$set": {"stats_claim": now}},
+        projection={"_id": 0, "scores": 1, "finished_at": 1},
+    )
+    if doc is not None:
+        await _fold_stats(session_id, doc["scores"], doc["finished_at"])
+
+
+MULTIPLAYER_PROJECTION = {
+    "_id": 0,
+    "session_id": 1,
+    "scores": 1,
+    "finished_at": 1,
+    "expected_players": 1,
+    "submit_deadline": 1,
+}
+
+
+async def submit_score(session_id: str, user_id: str, score: int) -> Optional[Tuple[str, dict]]:
+    """
+    Report one player's score into a multiplayer session.
+
+    Only that player's own fields are written: `scores.<user_id>` is $set
+    (if it is not there yet) and the player is $addToSet onto `user_id`, so
+    players reporting at the same time never overwrite each other. The
+    submission that completes the session finalizes it; so does any call
+    after the deadline. Returns (status, session), or None if the session
+    does not exist or the caller is not one of its players.
+    """
+    db = get_db()
+    session_id = normalize_session_id(session_id)
+    now = time.time()
+
+    doc = await db.sessions.find_one_and_update(
+        {
+            "session_id": session_id,
+            "finished_at": None,
+            "expected_players": user_id,
+            "submit_deadline": {"$gt": now},
+            f"scores.{user_id}": {"$exists": False},
+        },
+        {"$set": {f"scores.{user_id}": score}, "$addToSet": {"user_id": user_id}},
+        projection=MULTIPLAYER_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is not None:
+        if set(doc["expected_players"]) <= set(doc["scores"]):
+            doc = await finalize_session(session_id, now) or await _multiplayer_session(session_id)
+        return "accepted", doc
+
+    # Not stored: a retry, too late, or not this caller's session
+    doc = await _multiplayer_session(session_id)
+    if doc is None or user_id not in doc["expected_players"]:
+        return None
+    if doc["finished_at"] is None and doc["submit_deadline"] <= now:
+        doc = await finalize_session(session_id, now) or await _multiplayer_session(session_id)
+    elif doc["finished_at"] is not None:
+        await _retry_stats(session_id)
+    return ("already_submitted" if user_id in doc["scores"] else "closed"), doc
+
+
+async def _multiplayer_session(session_id: str) -> Optional[dict]:
+    return await get_db().sessions.find_one(
+        {"session_id": session_id, "expected_players": {"$exists": True}}, MULTIPLAYER_PROJECTION
+    )
+
+
+async def finalize_session(session_id: str, finished_at: Optional[float] = None) -> Optional[dict]:
+    """
+    Finish a multiplayer session with the scores reported so far. Only one
+    caller can win the update, so only one of the submissions or sweeps
+    racing for it records the stats; the others get None. A failed fold is
+    retried by the next submission from one of the players (see
+    _retry_stats).
+    """
+    db = get_db()
+    if finished_at is None:
+        finished_at = time.time()
+
+    doc = await db.sessions.find_one_and_update(
+        {"session_id": session_id, "finished_at": None, "expected_players": {"$exists": True}},
+        # No deadline left to sweep for
+        {"$set": {"finished_at": finished_at, "stats_claim": time.time()}, "$unset": {"submit_deadline": ""}},
+        projection=MULTIPLAYER_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is not None:
+        await _fold_stats(session_id, doc["scores"], finished_at)
+    return doc
+
+
+async def finalize_expired_sessions(now: Optional[float] = None) -> int:
+    """Finalize every multiplayer session past its deadline; returns how many this call finished."""
+    db = get_db()
+    if now is None:
+        now = time.time()
+
+    cursor = db.sessions.find(
+        {"submit_deadline": {"$lte": now}, "finished_at": None}, {"_id": 0, "session_id": 1}
+    )
+    expired = [doc["session_id"] async for doc in cursor]
+    finished = await asyncio.gather(*(finalize_session(sid, now) for sid in expired))
+    return sum(1 for doc in finished if doc is not None)
+
+
+async def finish_games(items: List[dict], user_id: str) -> List[dict]:
+    """
+    Finish many of `user_id`'s sessions at once (offline clients replaying
+    their queue). `items` are dicts with session_id, scores and finished_at.
+
+    Every finish is the same conditional update as finish_game (or, for
+    sessions only held in memory, the insert of the finished document), sent
+    in one unordered bulk_write and tagged with a per-batch token; one read-back
+    then tells which sessions this batch finished. Stats are recorded for
+    those, and retried for already finished ones whose fold never completed,
+    exactly as a repeated finish_game would.
+    Returns one {session_id, status} per item, in order. Raises ValueError,
+    before anything is written, if any `finished_at` cannot be rolled up.
+    """
+    db = get_db()
+    token = uuid.uuid4().hex
+    now = time.time()
+    items = [{**item, "session_id": normalize_session_id(item["session_id"])} for item in items]
+    for item in items:
+        if item.get("finished_at") is not None:
+            rollup_buckets(item["finished_at"])
+
+    if any(session_buffer.is_pending(item["session_id"]) for item in items):
+        await session_buffer.flush()
+
+    first = {}
+    ops = []
+    in_registry = []
+    for item in items:
+        if item["session_id"] in first:
+            continue
+        first[item["session_id"]] = item
+        final_scores = item["scores"]
+        finished = {
+            "scores": final_scores,
+            "user_id": list(final_scores.keys()) or [user_id],
+            "finished_at": now if item.get("finished_at") is None else item["finished_at"],
+            "finish_batch": token,
+            "stats_claim": now,
+        }
+
+        registered = session_registry.get(item["session_id"])
+        if registered is not None and user_id in registered["user_id"]:
+            # Dropped from the registry after the read-back shows it finished
+            in_registry.append(item["session_id"])
+            if SESSION_STORE == "memory":
+                ops.append(InsertOne({**registered, **finished}))
+                continue
+
+        ops.append(UpdateOne(
+            {"session_id": item["session_id"], "finished_at": None, "user_id": user_id,
+             "expected_players": {"$exists": False}},
+            {"$set": finished},
+        ))
+
+    try:
+        await db.sessions.bulk_write(ops, ordered=False)
+    except BulkWriteError as exc:
+        # Duplicate inserts are memory sessions a concurrent finish already
+        # stored; the read-back reports them as already_finished
+        if any(error.get("code") != 11000 for error in exc.details.get("writeErrors", [])):
+            raise
+    docs = {
+        doc["session_id"]: doc
+        async for doc in db.sessions.find(
+            {"session_id": {"$in": list(first)}},
+            {"_id": 0, "session_id": 1, "user_id": 1, "scores": 1, "finished_at": 1, "finish_batch": 1,
+             "stats_recorded": 1, "stats_claim": 1},
+        )
+    }
+
+    for session_id in in_registry:
+        if docs.get(session_id, {}).get("finished_at") is not None:
+            session_registry.pop(session_id)
+
+    finished = [doc for doc in docs.values() if doc.get("finish_batch") == token]
+    # Finished earlier, but the fold of that finish never completed
+    unrecorded = [
+        doc["session_id"] for doc in docs.values()
+        if doc.get("finish_batch") != token and doc.get("finished_at") is not None
+        and user_id in doc["user_id"] and not doc.get("stats_recorded")
+        and doc.get("stats_claim", now) < now - STATS_CLAIM_TIMEOUT
+    ]
+    await asyncio.gather(
+        *(_fold_stats(doc["session_id"], doc["scores"], doc["finished_at"]) for doc in finished),
+        *(_retry_stats(session_id) for session_id in unrecorded),
     )
 
-    return await get_session(session_id)
+    results = []
+    seen = set()
+    for item in items:
+        session_id = item["session_id"]
+        doc = docs.get(session_id)
+        if session_id in seen:
+            status = "duplicate"
+        elif doc is not None and doc.get("finish_batch") == token:
+            status = "finished"
+        elif doc is not None and doc.get("finished_at") is not None and user_id in doc["user_id"]:
+            status = "already_finished"
+        else:
+            status = "not_found"
+        seen.add(session_id)
+        results.append({"session_id": session_id, "status": status})
+    return results
+
+
+async def record_user_stats(final_scores: Dict[str, int], finished_at: float) -> None:
+    """
+    Fold the scores of a finished game into the per-user stats documents
+    that the leaderboard service reads from. Each document is updated
+    atomically with $inc/$max, so concurrent finishes never lose a game.
+    The player's display name is copied onto the document so leaderboard
+    reads never have to join `users`.
+
+    The same update goes into the daily/weekly/monthly rollup bucket that
+    `finished_at` falls in, which backs the time-windowed leaderboards, and
+    the standings version is bumped so leaderboard workers notice the change.
+
+    The stats update returns the pre-image so each player's move between
+    score histogram buckets can be applied incrementally.
+    """
+    if not final_scores:
+        return
+
+    db = get_db()
+    names = await lookup_user_names(list(final_scores.keys()))
+
+    buckets = rollup_buckets(finished_at)
+
+    stats_updates, rollup_ops = [], []
+    for uid, score in final_scores.items():
+        update = {
+            "$inc": {"totalGames": 1, "totalScores": score},
+            "$max": {"bestScore": score},
+        }
+        if uid in names:
+            update["$set"] = {"userName": names[uid]}
+        stats_updates.append(db.user_stats.find_one_and_update(
+            {"user_id": uid},
+            update,
+            projection={"_id": 0, "totalScores": 1, "bestScore": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        ))
+
+        for period, (bucket, expires_at) in buckets.items():
+            rollup_ops.append(UpdateOne(
+                {"period": period, "bucket": bucket, "user_id": uid},
+                {**update, "$setOnInsert": {"expires_at": expires_at}},
+                upsert=True,
+            ))
+
+    befores, *_ = await asyncio.gather(
+        asyncio.gather(*stats_updates),
+        db.user_stats_rollups.bulk_write(rollup_ops, ordered=False),
+    )
+
+    moves: Counter = Counter()
+    for before, score in zip(befores, final_scores.values()):
+        moves.update(histogram_moves(before, score))
+    await asyncio.gather(
+        apply_histogram_moves(db, moves),
+        db.leaderboard_meta.update_one(
+            {"_id": "standings"}, {"$inc": {"version": 1}}, upsert=True
+        ),
+    )
+
+
+async def lookup_user_names(user_ids: List[str]) -> Dict[str, str]:
+    db = get_db()
+    cursor = db.users.find({"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1, "loging": 1})
+    return {doc["user_id"]: doc["loging"] async for doc in cursor}
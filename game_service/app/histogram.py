@@ -0,0 +1,117 @@
+"""
+Score histogram buckets kept in the `score_histogram` collection.
+
+Scores below LINEAR_LIMIT get one bucket each (exact); above it buckets grow
+geometrically by 2^(1/BUCKETS_PER_DOUBLING), i.e. each bucket is at most
+~9% of its lower bound wide (plus one for integer rounding). Each bucket
+document stores its own [lo, hi) bounds, so readers never need this module.
+
+Rebuild from user_stats (e.g. after the user_stats backfill):
+
+    python -m game_service.app.histogram
+"""
+import asyncio
+import math
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from .db import get_db
+
+HISTOGRAM_METRICS = ("totalScores", "bestScore")
+LINEAR_LIMIT = 16
+BUCKETS_PER_DOUBLING = 8
+
+
+def bucket_bounds(index: int) -> Tuple[int, int]:
+    """[lo, hi) score range of bucket `index`."""
+    if index < LINEAR_LIMIT:
+        return index, index + 1
+    step = index - LINEAR_LIMIT
+    lo = math.ceil(LINEAR_LIMIT * 2 ** (step / BUCKETS_PER_DOUBLING))
+    hi = math.ceil(LINEAR_LIMIT * 2 ** ((step + 1) / BUCKETS_PER_DOUBLING))
+    return lo, hi
+
+
+def score_bucket(score: int) -> int:
+    if score < LINEAR_LIMIT:
+        return max(score, 0)
+    index = LINEAR_LIMIT + int(BUCKETS_PER_DOUBLING * math.log2(score / LINEAR_LIMIT))
+    # Guard against float rounding at the bucket edges
+    while score < bucket_bounds(index)[0]:
+        index -= 1
+    while score >= bucket_bounds(index)[1]:
+        index += 1
+    return index
+
+
+def _bucket_update(metric: str, index: int, delta: int) -> UpdateOne:
+    lo, hi = bucket_bounds(index)
+    return UpdateOne(
+        {"_id": f"{metric}:{index}"},
+        {
+            "$inc": {"count": delta},
+            "$setOnInsert": {"metric": metric, "bucket": index, "lo": lo, "hi": hi},
+        },
+        upsert=True,
+    )
+
+
+def histogram_moves(before: Optional[dict], score: int) -> Dict[Tuple[str, int], int]:
+    """
+    Bucket count changes caused by adding one game with `score` to a player
+    whose user_stats looked like `before` (None for a new player).
+    """
+    moves: Counter = Counter()
+    old_total = before.get("totalScores") if before else None
+    old_best = before.get("bestScore") if before else None
+
+    new_values = {
+        "totalScores": (old_total or 0) + score,
+        "bestScore": score if old_best is None else max(old_best, score),
+    }
+    old_values = {"totalScores": old_total, "bestScore": old_best}
+
+    for metric in HISTOGRAM_METRICS:
+        new_bucket = score_bucket(new_values[metric])
+        if old_values[metric] is not None:
+            old_bucket = score_bucket(old_values[metric])
+            if old_bucket == new_bucket:
+                continue
+            moves[(metric, old_bucket)] -= 1
+        moves[(metric, new_bucket)] += 1
+    return moves
+
+
+async def apply_histogram_moves(db, moves: Dict[Tuple[str, int], int]) -> None:
+    ops = [_bucket_update(metric, index, delta) for (metric, index), delta in moves.items() if delta]
+    if ops:
+        await db.score_histogram.bulk_write(ops, ordered=False)
+
+
+async def rebuild_histogram(db) -> int:
+    """Recount every bucket from user_stats; returns the number of players."""
+    counts: Counter = Counter()
+    players = 0
+    cursor = db.user_stats.find({}, {"_id": 0, "totalScores": 1, "bestScore": 1}).batch_size(10_000)
+    async for doc in cursor:
+        players += 1
+        for metric in HISTOGRAM_METRICS:
+            if doc.get(metric) is not None:
+                counts[(metric, score_bucket(doc[metric]))] += 1
+
+    await db.score_histogram.delete_many({})
+    ops = [_bucket_update(metric, index, count) for (metric, index), count in counts.items()]
+    if ops:
+        await db.score_histogram.bulk_write(ops, ordered=False)
+    return players
+
+
+async def main():
+    players = await rebuild_histogram(get_db())
+    print(f"score_histogram rebuilt from {players} players")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
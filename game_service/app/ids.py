@@ -0,0 +1,92 @@
+# game_service/app/ids.py
+"""
+Session ids: ULIDs, 26 characters of Crockford base32 (48-bit millisecond
+timestamp, then 80 random bits).
+
+Ids generated close together in time sort close together, so inserts land
+on the right edge of the unique session_id index instead of on a random
+page of it, and the pages being written stay in cache. They also sort by
+creation time as plain strings, which keeps `session_id` usable as the
+tie-break of history pages. Within one millisecond the random part is
+incremented, so the ids of one process are strictly increasing.
+
+Sessions created before this kept their uuid4 ids; `normalize_session_id`
+accepts both forms, so either kind resolves however a client spells it.
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Optional
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_DECODE = {char: value for value, char in enumerate(ALPHABET)}
+# Crockford base32 is case-insensitive and reads I/L as 1 and O as 0
+_DECODE.update({char.lower(): value for char, value in _DECODE.items()})
+_DECODE.update({"I": 1, "i": 1, "L": 1, "l": 1, "O": 0, "o": 0})
+
+_ULID_RE = re.compile(r"[0-9A-Za-z]{26}")
+_RANDOM_BITS = 80
+
+_lock = threading.Lock()
+_last = (0, 0)
+
+
+def _encode(value: int) -> str:
+    chars = []
+    for _ in range(26):
+        chars.append(ALPHABET[value & 0x1F])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_session_id() -> str:
+    global _last
+    now = time.time_ns() // 1_000_000
+    with _lock:
+        last_ms, last_random = _last
+        if now <= last_ms:
+            # Same millisecond (or the clock stepped back): keep the order
+            now, random = last_ms, last_random + 1
+            if random >> _RANDOM_BITS:
+                now, random = last_ms + 1, int.from_bytes(os.urandom(10), "big")
+        else:
+            random = int.from_bytes(os.urandom(10), "big")
+        _last = (now, random)
+    return _encode(now << _RANDOM_BITS | random)
+
+
+def _decode(session_id: str) -> Optional[int]:
+    if not _ULID_RE.fullmatch(session_id) or session_id[0] not in "01234567":
+        return None
+    value = 0
+    for char in session_id:
+        digit = _DECODE.get(char)
+        if digit is None:
+            return None
+        value = value << 5 | digit
+    return value
+
+
+def normalize_session_id(session_id: str) -> str:
+    """
+    The stored spelling of a session id: ULIDs in canonical upper case,
+    legacy uuid4 ids in canonical lower case with hyphens. Anything else is
+    returned unchanged (and simply will not be found).
+    """
+    value = _decode(session_id)
+    if value is not None:
+        return _encode(value)
+    try:
+        return str(uuid.UUID(session_id))
+    except ValueError:
+        return session_id
+
+
+def session_id_time(session_id: str) -> Optional[float]:
+    """Creation time (unix seconds) encoded in a ULID; None for legacy ids."""
+    value = _decode(session_id)
+    if value is None:
+        return None
+    return (value >> _RANDOM_BITS) / 1000
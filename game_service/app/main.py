@@ -1,6 +1,10 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
 from game_service.app.auth_deps import get_current_user, TokenData
+import json
+import os
 import time
 from typing import Optional, List
 
@@ -8,11 +12,40 @@ from .models import (
     StartGameResponse,
     FinishGameRequest,
     FinishGameResponse,
-    GameSessionPublicResponse
+    FinishBatchRequest,
+    FinishBatchResponse,
+    GameSessionPublicResponse,
+    ClickReplayResponse,
+    StartMultiplayerRequest,
+    SubmitScoreRequest,
+    SubmitScoreResponse,
 )
 from . import crud
+from .indexes import APPLY_INDEXES_ON_STARTUP, bootstrap_indexes
+from .buffer import session_buffer
+from .registry import session_registry
+from .clicks import click_ingestor, parse_events
+from .multiplayer import deadline_sweeper
 
-app = FastAPI(title="Aim Clicker Game Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if APPLY_INDEXES_ON_STARTUP:
+        await bootstrap_indexes()
+    click_ingestor.start()
+    deadline_sweeper.start()
+    yield
+    await deadline_sweeper.stop()
+    await click_ingestor.stop()
+    # Write-behind starts that have not reached Mongo yet
+    await session_buffer.close()
+
+
+app = FastAPI(title="Aim Clicker Game Service", lifespan=lifespan)
+
+GAME_HISTORY_MAX_PAGE_SIZE = int(os.getenv("GAME_HISTORY_MAX_PAGE_SIZE", "100"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 
@@ -27,9 +61,69 @@ app.add_middleware(
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "sessions": session_registry.stats(),
+        "session_buffer": session_buffer.stats(),
+        "clicks": click_ingestor.stats(),
+        "multiplayer": deadline_sweeper.stats(),
+    }
+
 @app.get("/game", response_model=List[GameSessionPublicResponse])
-async def get_games(current_user: TokenData = Depends(get_current_user)):
-    return await crud.list_sessions(user_id=current_user.user_id)
+async def get_games(
+    response: Response,
+    limit: int = Query(50, ge=1),
+    cursor: Optional[str] = None,
+    current_user: TokenData = Depends(get_current_user),
+):
+    """
+    The caller's game history, a page at a time. The cursor for the next
+    page is returned in the X-Next-Cursor header.
+    """
+    limit = min(limit, GAME_HISTORY_MAX_PAGE_SIZE)
+    after = None
+    if cursor is not None:
+        try:
+            after = crud.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    sessions = await crud.list_sessions(user_id=current_user.user_id, limit=limit, after=after)
+    if len(sessions) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = crud.encode_cursor(sessions[-1])
+    return sessions
+
+
+@app.get("/game/export")
+async def export_games(
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    current_user: TokenData = Depends(get_current_user),
+):
+    """
+    The caller's whole game history as NDJSON (one session per line),
+    optionally only games finished in [since, until). Streamed straight
+    from the cursor, one batch of lines at a time.
+    """
+    if since is not None and until is not None and since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+
+    async def lines():
+        chunk = []
+        async for doc in crud.iter_sessions(current_user.user_id, since, until, EXPORT_BATCH_SIZE):
+            chunk.append(json.dumps(doc, separators=(",", ":")))
+            if len(chunk) >= EXPORT_BATCH_SIZE:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="games.ndjson"'},
+    )
 
 
 @app.post("/game/start", response_model=StartGameResponse)
@@ -38,13 +132,49 @@ async def start_game(current_user: TokenData = Depends(get_current_user)):
     return StartGameResponse(session_id=session_id)
 
 
+@app.post("/game/start/multiplayer", response_model=StartGameResponse)
+async def start_multiplayer(body: StartMultiplayerRequest, current_user: TokenData = Depends(get_current_user)):
+    """
+    Start a session for the caller and `players`. Each of them reports
+    their own score to /game/{session_id}/scores within `submit_window`
+    seconds.
+    """
+    session_id = await crud.start_multiplayer_game(current_user.user_id, body.players, body.submit_window)
+    return StartGameResponse(session_id=session_id)
+
+
+@app.post("/game/{session_id}/scores", response_model=SubmitScoreResponse)
+async def submit_score(session_id: str, body: SubmitScoreRequest, current_user: TokenData = Depends(get_current_user)):
+    """
+    The caller's score in a multiplayer session. A player's first score
+    stands; the session finishes once every player reported, or at its
+    deadline with the scores it has.
+    """
+    result = await crud.submit_score(session_id, current_user.user_id, body.score)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Invalid session_id")
+
+    status, session = result
+    return SubmitScoreResponse(
+        session_id=session_id,
+        status=status,
+        finished=session["finished_at"] is not None,
+        reported=list(session["scores"]),
+        expected_players=session["expected_players"],
+    )
+
+
 @app.post("/game/finish", response_model=FinishGameResponse)
 async def finish(body: FinishGameRequest, current_user: TokenData = Depends(get_current_user)):
-    session = await crud.finish_game(
-        session_id=body.session_id,
-        final_scores=body.scores,
-        finished_at=body.finished_at
-    )
+    try:
+        session = await crud.finish_game(
+            session_id=body.session_id,
+            final_scores=body.scores,
+            finished_at=body.finished_at,
+            user_id=current_user.user_id,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid finished_at")
 
     if not session:
         raise HTTPException(status_code=404, detail="Invalid session_id")
@@ -52,3 +182,73 @@ async def finish(body: FinishGameRequest, current_user: TokenData = Depends(get_
     return FinishGameResponse(
         session_id=session.session_id
     )
+
+
+@app.post("/game/finish/batch", response_model=FinishBatchResponse)
+async def finish_batch(body: FinishBatchRequest, current_user: TokenData = Depends(get_current_user)):
+    try:
+        results = await crud.finish_games(
+            [item.model_dump() for item in body.items],
+            user_id=current_user.user_id,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid finished_at")
+    return FinishBatchResponse(results=results)
+
+
+@app.get("/game/{session_id}/replay", response_model=ClickReplayResponse)
+async def replay(
+    session_id: str,
+    player: Optional[str] = None,
+    current_user: TokenData = Depends(get_current_user),
+):
+    """
+    The clicks one player recorded in one of the caller's sessions (the
+    caller's own by default), decoded from the stored chunks on request.
+    """
+    session = await crud.get_session(session_id)
+    players = (session.expected_players or session.user_id) if session is not None else []
+    player = player or current_user.user_id
+    if current_user.user_id not in players or player not in players:
+        raise HTTPException(status_code=404, detail="Invalid session_id")
+
+    clicks = await crud.get_click_replay(session_id, player)
+    return ClickReplayResponse(session_id=session_id, user_id=player, **clicks)
+
+
+@app.websocket("/game/{session_id}/clicks")
+async def ingest_clicks(websocket: WebSocket, session_id: str, token: str = ""):
+    """
+    Click events of one of the caller's unfinished sessions. Browsers
+    cannot set headers on a WebSocket, so the bearer token comes as
+    ?token=. Each message is one event or a list of events:
+    {"t": ms since start, "x": int, "y": int, "hit": bool}.
+    """
+    try:
+        current_user = await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    session = await crud.get_session(session_id)
+    if session is None or session.finished_at is not None or \
+            current_user.user_id not in (session.expected_players or session.user_id):
+        await websocket.close(code=1008)
+        return
+
+    # The stored spelling, whichever one the client used
+    session_id = session.session_id
+    await websocket.accept()
+    click_ingestor.open(session_id, current_user.user_id)
+    try:
+        while True:
+            try:
+                events = parse_events(json.loads(await websocket.receive_text()))
+            except ValueError:
+                await websocket.send_json({"error": "Invalid click event"})
+                continue
+            click_ingestor.add(session_id, current_user.user_id, events)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        click_ingestor.close(session_id, current_user.user_id)
@@ -1,5 +1,18 @@
-from pydantic import BaseModel
-from typing import Optional, List, Dict
+import math
+import os
+import time
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, List, Dict, Literal
+
+FINISH_BATCH_MAX_ITEMS = int(os.getenv("FINISH_BATCH_MAX_ITEMS", "100"))
+MULTIPLAYER_MAX_PLAYERS = int(os.getenv("MULTIPLAYER_MAX_PLAYERS", "16"))
+# Seconds the players of a multiplayer session have to report their scores
+MULTIPLAYER_SUBMIT_WINDOW = float(os.getenv("MULTIPLAYER_SUBMIT_WINDOW", "120"))
+MULTIPLAYER_MAX_SUBMIT_WINDOW = float(os.getenv("MULTIPLAYER_MAX_SUBMIT_WINDOW", "3600"))
+# How far a client-reported finished_at may lie in the past (offline clients
+# replay their queue late) and, for clock skew, in the future; in seconds
+FINISHED_AT_MAX_AGE = float(os.getenv("FINISHED_AT_MAX_AGE", str(30 * 24 * 3600)))
+FINISHED_AT_MAX_SKEW = float(os.getenv("FINISHED_AT_MAX_SKEW", "300"))
 
 
 class GameSessionPublicResponse(BaseModel):
@@ -18,16 +31,73 @@ class StartGameResponse(BaseModel):
     session_id: str
 
 
+class StartMultiplayerRequest(BaseModel):
+    # Everyone but the caller, who always plays
+    players: List[str] = Field(..., min_length=1, max_length=MULTIPLAYER_MAX_PLAYERS - 1)
+    submit_window: float = Field(MULTIPLAYER_SUBMIT_WINDOW, gt=0, le=MULTIPLAYER_MAX_SUBMIT_WINDOW)
+
+
+class SubmitScoreRequest(BaseModel):
+    score: int
+
+
+class SubmitScoreResponse(BaseModel):
+    session_id: str
+    # accepted: stored by this call; already_submitted: stored earlier, the
+    # first score stands; closed: the session was finished without it
+    status: Literal["accepted", "already_submitted", "closed"]
+    finished: bool
+    reported: List[str]
+    expected_players: List[str]
+
+
 class FinishGameRequest(BaseModel):
     session_id: str
     scores: Dict[str, int]
     finished_at: Optional[float] = None
 
+    @field_validator("finished_at")
+    @classmethod
+    def finished_at_near_now(cls, value: Optional[float]) -> Optional[float]:
+        if value is None:
+            return value
+        now = time.time()
+        if not math.isfinite(value) or not now - FINISHED_AT_MAX_AGE <= value <= now + FINISHED_AT_MAX_SKEW:
+            raise ValueError("finished_at must be a unix time close to now")
+        return value
+
 
 class FinishGameResponse(BaseModel):
     session_id: str
 
 
+class FinishBatchRequest(BaseModel):
+    items: List[FinishGameRequest] = Field(..., min_length=1, max_length=FINISH_BATCH_MAX_ITEMS)
+
+
+class FinishBatchItemResult(BaseModel):
+    session_id: str
+    # finished: by this batch; already_finished: earlier, result unchanged;
+    # duplicate: same session_id earlier in the batch; not_found: unknown
+    # session or not one of the caller's
+    status: Literal["finished", "already_finished", "duplicate", "not_found"]
+
+
+class FinishBatchResponse(BaseModel):
+    results: List[FinishBatchItemResult]
+
+
+class ClickReplayResponse(BaseModel):
+    session_id: str
+    user_id: str
+    count: int
+    hits: int
+    # Column-wise, one entry per click: ms since start, position, hit
+    t: List[int]
+    x: List[int]
+    y: List[int]
+    hit: List[bool]
+
 
 class GameSessionInDB(BaseModel):
     session_id: str
@@ -35,3 +105,6 @@ class GameSessionInDB(BaseModel):
     scores: Dict[str, int]
     started_at: float
     finished_at: Optional[float] = None
+    # Multiplayer sessions only
+    expected_players: Optional[List[str]] = None
+    submit_deadline: Optional[float] = None
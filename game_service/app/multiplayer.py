@@ -0,0 +1,62 @@
+# game_service/app/multiplayer.py
+"""
+Finalizes multiplayer sessions whose submit deadline passed before every
+player reported.
+
+A session also gets finalized by the submission that completes it, or by
+any submission after its deadline; the sweeper covers sessions nobody
+reports into any more. Every MULTIPLAYER_SWEEP_INTERVAL seconds it
+finishes the expired ones with the scores they have. Finalizing is a
+conditional update, so sweepers of several workers can run side by side.
+"""
+import asyncio
+import os
+from typing import Optional
+
+from . import crud
+
+MULTIPLAYER_SWEEP_INTERVAL = float(os.getenv("MULTIPLAYER_SWEEP_INTERVAL", "5"))
+
+
+class DeadlineSweeper:
+    """Lifecycle like ClickIngestor."""
+
+    def __init__(self, interval: float = MULTIPLAYER_SWEEP_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.finalized = 0
+
+    async def sweep(self) -> int:
+        try:
+            finalized = await crud.finalize_expired_sessions()
+        except Exception as exc:
+            print("multiplayer sweep failed:", repr(exc))
+            return 0
+        self.sweeps += 1
+        self.finalized += finalized
+        return finalized
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.sweep()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"sweeps": self.sweeps, "finalized": self.finalized}
+
+
+deadline_sweeper = DeadlineSweeper()
@@ -0,0 +1,92 @@
+# game_service/app/registry.py
+"""
+In-progress game sessions kept in memory instead of Mongo.
+
+Most started games are never finished; with SESSION_STORE=memory (the
+default) a session only reaches Mongo when it is finished, so abandoned
+ones never bloat `sessions` or its indexes. Sessions expire SESSION_TTL
+seconds after they were started, and at most SESSION_REGISTRY_MAX_SESSIONS
+are kept (the oldest is dropped to make room); both are counted in
+/metrics.
+
+SESSION_STORE=write-through also inserts every started session into Mongo
+(durable across restarts, at the old cost), SESSION_STORE=mongo turns the
+registry off entirely.
+
+The registry lives in one process, so a session has to be finished by the
+worker that started it; run more than one worker per service only with
+write-through or mongo.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_REGISTRY_MAX_SESSIONS = int(os.getenv("SESSION_REGISTRY_MAX_SESSIONS", "100000"))
+
+
+class SessionRegistry:
+    def __init__(
+        self,
+        ttl: float = SESSION_TTL,
+        max_sessions: int = SESSION_REGISTRY_MAX_SESSIONS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._clock = clock
+        # session_id -> (expires_at, doc), oldest first; a fixed TTL keeps
+        # insertion order and expiry order the same
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+
+    def add(self, doc: dict) -> None:
+        self.sweep()
+        while len(self._sessions) >= self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+        self._sessions[doc["session_id"]] = (self._clock() + self.ttl, doc)
+
+    def get(self, session_id: str) -> Optional[dict]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        if entry[0] <= self._clock():
+            del self._sessions[session_id]
+            self.expired += 1
+            return None
+        return entry[1]
+
+    def pop(self, session_id: str) -> Optional[dict]:
+        doc = self.get(session_id)
+        if doc is not None:
+            del self._sessions[session_id]
+        return doc
+
+    def sweep(self) -> None:
+        now = self._clock()
+        while self._sessions:
+            session_id, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[session_id]
+            self.expired += 1
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> dict:
+        self.sweep()
+        return {
+            "mode": SESSION_STORE,
+            "active": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+session_registry = SessionRegistry()
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Tuple
+
+# Leaderboard windows and how long a bucket is kept once it has closed.
+# Expiry is done by the TTL index on `expires_at` (see the leaderboard
+# service's index spec).
+ROLLUP_RETENTION = {
+    "daily": timedelta(days=7),
+    "weekly": timedelta(weeks=5),
+    "monthly": timedelta(days=93),
+}
+
+
+def bucket_bounds(period: str, ts: float) -> Tuple[str, datetime]:
+    """
+    Key of the `period` bucket that the unix timestamp `ts` falls in (UTC),
+    and the moment that bucket closes.
+    """
+    dt = datetime.fromtimestamp(ts, tz=timezone.utc)
+    day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if period == "daily":
+        return day.strftime("%Y-%m-%d"), day + timedelta(days=1)
+    if period == "weekly":
+        year, week, weekday = day.isocalendar()
+        start = day - timedelta(days=weekday - 1)
+        return f"{year}-W{week:02d}", start + timedelta(weeks=1)
+    if period == "monthly":
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        return start.strftime("%Y-%m"), end
+    raise ValueError("Invalid period")
+
+
+def bucket_expiry(period: str, ts: float) -> Tuple[str, datetime]:
+    """Bucket key for `ts` and the date its rollup documents expire."""
+    key, closes_at = bucket_bounds(period, ts)
+    return key, closes_at + ROLLUP_RETENTION[period]
+
+
+def rollup_buckets(ts: float) -> Dict[str, Tuple[str, datetime]]:
+    """
+    Bucket key and expiry of every rollup period for `ts`. Raises ValueError
+    for timestamps no bucket can hold (not finite, or past year 9999).
+    """
+    try:
+        return {period: bucket_expiry(period, ts) for period in ROLLUP_RETENTION}
+    except (OverflowError, OSError):
+        raise ValueError("Timestamp out of range")
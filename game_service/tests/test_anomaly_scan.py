@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from game_service.app import anomaly_scan
+from game_service.app.anomaly_scan import score_anomalies
+
+
+def test_score_far_above_own_history_is_flagged():
+    users = np.array([0] * 10 + [1] * 10)
+    scores = np.array([50, 52, 48, 51, 49, 50, 53, 47, 50, 300] + [300, 310, 290, 305, 295, 300, 302, 298, 301, 299])
+    durations = np.full(20, 60.0)
+
+    result = score_anomalies(users, scores, durations, z_threshold=4, max_rate=15, min_history=5)
+
+    # 300 is normal for player 1, not for player 0
+    assert result["flagged"].tolist() == [False] * 9 + [True] + [False] * 10
+    assert result["z"][9] > 4
+
+
+def test_short_history_is_not_judged_by_zscore():
+    users = np.array([0, 0, 0])
+    scores = np.array([10, 10, 500])
+
+    result = score_anomalies(users, scores, np.full(3, 60.0), min_history=5)
+
+    assert not result["high_z"].any()
+
+
+def test_impossible_score_rate_is_flagged():
+    users = np.array([0, 1, 2])
+    scores = np.array([100, 100, 5])
+    durations = np.array([60.0, 2.0, 0.0])
+
+    result = score_anomalies(users, scores, durations, max_rate=15)
+
+    assert result["high_rate"].tolist() == [False, True, True]
+    assert result["rate"][1] == 50
+
+
+def _cursor(rows):
+    cursor = MagicMock()
+    cursor.__aiter__.return_value = rows
+    return cursor
+
+
+@pytest.mark.asyncio
+async def test_scan_upserts_reviews_keeping_status():
+    rows = [
+        {"session_id": f"s{i}", "user_id": "u1", "score": 50 + i % 3, "duration": 60.0, "finished_at": float(i)}
+        for i in range(8)
+    ] + [{"session_id": "cheat", "user_id": "u1", "score": 5000, "duration": 60.0, "finished_at": 100.0}]
+    db = MagicMock()
+    db.sessions.aggregate = MagicMock(return_value=_cursor(rows))
+    db.score_reviews.bulk_write = AsyncMock()
+
+    summary = await anomaly_scan.scan(db)
+
+    assert summary["rows"] == 9 and summary["flagged"] == 1
+    assert summary["score_zscore"] == 1 and summary["score_rate"] == 1
+    op = db.score_reviews.bulk_write.call_args[0][0][0]
+    assert op._filter == {"session_id": "cheat", "user_id": "u1"}
+    assert op._doc["$set"]["reasons"] == ["score_zscore", "score_rate"]
+    assert op._doc["$setOnInsert"]["status"] == "open"
+
+
+@pytest.mark.asyncio
+async def test_scan_since_and_dry_run_write_nothing():
+    rows = [{"session_id": "s1", "user_id": "u1", "score": 900, "duration": 1.0, "finished_at": 5.0}]
+    db = MagicMock()
+    db.sessions.aggregate = MagicMock(return_value=_cursor(rows))
+    db.score_reviews.bulk_write = AsyncMock()
+
+    assert (await anomaly_scan.scan(db, since=10.0))["flagged"] == 0
+    db.sessions.aggregate = MagicMock(return_value=_cursor(rows))
+    assert (await anomaly_scan.scan(db, dry_run=True))["flagged"] == 1
+    db.score_reviews.bulk_write.assert_not_awaited()
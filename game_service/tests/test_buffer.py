@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from game_service.app.buffer import InsertBuffer
+
+
+def _buffer(max_items=3, max_delay=60.0):
+    collection = MagicMock()
+    collection.insert_many = AsyncMock()
+    return InsertBuffer(lambda: collection, key="session_id", max_items=max_items, max_delay=max_delay), collection
+
+
+@pytest.mark.asyncio
+async def test_flushes_when_full():
+    buffer, collection = _buffer(max_items=2)
+    buffer.add({"session_id": "s1"})
+    buffer.add({"session_id": "s2"})
+    await asyncio.sleep(0)
+
+    collection.insert_many.assert_awaited_once_with(
+        [{"session_id": "s1"}, {"session_id": "s2"}], ordered=False
+    )
+    assert not buffer.is_pending("s1")
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_flushes_after_delay():
+    buffer, collection = _buffer(max_delay=0.01)
+    buffer.add({"session_id": "s1"})
+    collection.insert_many.assert_not_awaited()
+
+    await asyncio.sleep(0.05)
+
+    collection.insert_many.assert_awaited_once()
+    assert buffer.stats()["inserted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_pending_only_for_buffered_keys():
+    buffer, collection = _buffer()
+    await buffer.flush_pending("unknown")
+    collection.insert_many.assert_not_awaited()
+
+    buffer.add({"session_id": "s1"})
+    assert buffer.is_pending("s1")
+    await buffer.flush_pending("s1")
+
+    collection.insert_many.assert_awaited_once()
+    assert not buffer.is_pending("s1")
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_flush_where_only_when_a_pending_doc_matches():
+    buffer, collection = _buffer()
+    buffer.add({"session_id": "s1", "user_id": ["u1"]})
+
+    await buffer.flush_where(lambda doc: "u2" in doc["user_id"])
+    collection.insert_many.assert_not_awaited()
+
+    await buffer.flush_where(lambda doc: "u1" in doc["user_id"])
+    collection.insert_many.assert_awaited_once()
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_leftovers():
+    buffer, collection = _buffer()
+    buffer.add({"session_id": "s1"})
+
+    await buffer.close()
+
+    collection.insert_many.assert_awaited_once()
+    assert buffer.stats()["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_counted_and_released():
+    buffer, collection = _buffer()
+    collection.insert_many.side_effect = RuntimeError("down")
+    buffer.add({"session_id": "s1"})
+
+    await buffer.close()
+
+    assert buffer.stats()["failed"] == 1
+    assert not buffer.is_pending("s1")
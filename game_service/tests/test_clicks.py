@@ -0,0 +1,283 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from game_service.app import clicks
+from game_service.app.clicks import ClickIngestor, parse_events
+from game_service.app.clickcodec import decode_columns, decode_events, encode_events
+
+
+def test_parse_events_accepts_one_or_many():
+    assert parse_events({"t": 5, "x": 1, "y": 2, "hit": True}) == [(5, 1, 2, True)]
+    assert parse_events([{"t": 5}, {"t": 9.7, "x": 3}]) == [(5, 0, 0, False), (9, 3, 0, False)]
+
+
+@pytest.mark.parametrize("message", [
+    {"x": 1}, {"t": "5"}, {"t": True}, [1, 2], "click",
+    {"t": float("inf")}, {"t": 1, "x": float("nan")}, {"t": 1e300}, {"t": 1, "y": -(2 ** 40)},
+])
+def test_parse_events_rejects_malformed(message):
+    with pytest.raises(ValueError):
+        parse_events(message)
+
+
+def test_codec_round_trips_events():
+    events = [(0, 400, 300, True), (16, 402, 297, False), (15, 10, 900, True), (10**6, -5, 0, False)]
+    data = encode_events(events)
+
+    assert decode_events(data) == events
+    assert decode_columns(data) == ([0, 16, 15, 10**6], [400, 402, 10, -5], [300, 297, 900, 0], [True, False, True, False])
+    assert decode_events(encode_events([])) == []
+
+
+def test_codec_is_compact_for_small_steps():
+    events = [(i * 16, 400 + i % 7, 300 - i % 5, i % 3 == 0) for i in range(1000)]
+    # One byte per delta (the first x and y take two) plus a bit per hit
+    assert len(encode_events(events)) <= 3 * 1000 + 1000 // 8 + 8
+
+
+@pytest.mark.parametrize("data", [b"", b"\x09\x01", encode_events([(1, 2, 3, True)])[:-2]])
+def test_codec_rejects_garbage(data):
+    with pytest.raises(ValueError):
+        decode_columns(data)
+
+
+def _db():
+    db = MagicMock()
+    db.session_clicks.bulk_write = AsyncMock()
+    return db
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_one_chunk_per_session():
+    db = _db()
+    ingestor = ClickIngestor(interval=60, max_events=1000)
+    ingestor.open("s1", "u1")
+    ingestor.open("s2", "u2")
+    ingestor.add("s1", "u1", [(10, 1, 1, True), (20, 2, 2, False)])
+    ingestor.add("s2", "u2", [(5, 0, 0, True)])
+
+    with patch("game_service.app.clicks.get_db", return_value=db):
+        await ingestor.flush()
+        await ingestor.flush()
+
+    db.session_clicks.bulk_write.assert_awaited_once()
+    ops = db.session_clicks.bulk_write.call_args[0][0]
+    assert db.session_clicks.bulk_write.call_args[1] == {"ordered": False}
+    chunk = ops[0]._doc
+    assert chunk["session_id"] == "s1"
+    assert decode_events(chunk["data"]) == [(10, 1, 1, True), (20, 2, 2, False)]
+    assert chunk["t0"] == 10 and chunk["count"] == 2 and chunk["hits"] == 1
+    assert ingestor.sessions[("s1", "u1")].clicks == 2
+
+
+@pytest.mark.asyncio
+async def test_closed_session_is_dropped_after_its_last_flush():
+    db = _db()
+    ingestor = ClickIngestor(interval=60, max_events=1000)
+    ingestor.open("s1", "u1")
+    ingestor.add("s1", "u1", [(10, 1, 1, True)])
+    ingestor.close("s1", "u1")
+
+    with patch("game_service.app.clicks.get_db", return_value=db):
+        await ingestor.flush()
+
+    assert db.session_clicks.bulk_write.call_args[0][0][0]._doc["count"] == 1
+    assert ("s1", "u1") not in ingestor.sessions
+
+
+def test_pending_events_per_session_are_capped():
+    ingestor = ClickIngestor(interval=60, max_events=10**6)
+    ingestor.open("s1", "u1")
+
+    with patch.object(clicks, "CLICK_MAX_PENDING_PER_SESSION", 3):
+        accepted = ingestor.add("s1", "u1", [(i, 0, 0, False) for i in range(5)])
+
+    assert accepted == 3
+    assert ingestor.stats()["dropped"] == 2
+
+
+def test_click_websocket_ingests_events():
+    from fastapi.testclient import TestClient
+    from game_service.app.auth_deps import TokenData
+    from game_service.app.main import app
+    from game_service.app.models import GameSessionInDB
+
+    session = GameSessionInDB(session_id="s1", user_id=["u1"], scores={"u1": 0}, started_at=1.0)
+    ingestor = ClickIngestor(interval=60, max_events=1000)
+
+    with patch("game_service.app.main.get_current_user", new=AsyncMock(return_value=TokenData(user_id="u1", loging="p"))), \
+            patch("game_service.app.main.crud.get_session", new=AsyncMock(return_value=session)), \
+            patch("game_service.app.main.click_ingestor", ingestor):
+        client = TestClient(app)
+        with client.websocket_connect("/game/s1/clicks?token=t") as ws:
+            ws.send_json([{"t": 1, "x": 2, "y": 3, "hit": True}, {"t": 2}])
+            ws.send_text("not json")
+            assert ws.receive_json() == {"error": "Invalid click event"}
+
+    assert ingestor.events == 2
+    assert ingestor.sessions[("s1", "u1")].closed is True
+
+
+def test_click_websocket_answers_infinity_with_an_error():
+    from fastapi.testclient import TestClient
+    from game_service.app.auth_deps import TokenData
+    from game_service.app.main import app
+    from game_service.app.models import GameSessionInDB
+
+    session = GameSessionInDB(session_id="s1", user_id=["u1"], scores={"u1": 0}, started_at=1.0)
+    ingestor = ClickIngestor(interval=60, max_events=1000)
+
+    with patch("game_service.app.main.get_current_user", new=AsyncMock(return_value=TokenData(user_id="u1", loging="p"))), \
+            patch("game_service.app.main.crud.get_session", new=AsyncMock(return_value=session)), \
+            patch("game_service.app.main.click_ingestor", ingestor):
+        client = TestClient(app)
+        with client.websocket_connect("/game/s1/clicks?token=t") as ws:
+            ws.send_text('{"t": Infinity}')
+            assert ws.receive_json() == {"error": "Invalid click event"}
+            # Still connected
+            ws.send_json({"t": 3})
+            ws.send_text("{}")
+            assert ws.receive_json() == {"error": "Invalid click event"}
+
+    assert ingestor.events == 1
+
+
+@pytest.mark.asyncio
+async def test_reconnect_overlapping_old_socket_keeps_the_buffer():
+    db = _db()
+    ingestor = ClickIngestor(interval=60, max_events=1000)
+    ingestor.open("s1", "u1")
+    ingestor.open("s1", "u1")  # new socket before the old one noticed
+    ingestor.close("s1", "u1")
+
+    with patch("game_service.app.clicks.get_db", return_value=db):
+        await ingestor.flush()
+        # The remaining socket keeps ingesting
+        ingestor.add("s1", "u1", [(10, 1, 1, True)])
+        ingestor.close("s1", "u1")
+        await ingestor.flush()
+
+    assert db.session_clicks.bulk_write.call_args[0][0][0]._doc["count"] == 1
+    assert ("s1", "u1") not in ingestor.sessions
+
+
+def test_click_websocket_rejects_other_players_session():
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+    from game_service.app.auth_deps import TokenData
+    from game_service.app.main import app
+    from game_service.app.models import GameSessionInDB
+
+    session = GameSessionInDB(session_id="s1", user_id=["u1"], scores={"u1": 0}, started_at=1.0)
+
+    with patch("game_service.app.main.get_current_user", new=AsyncMock(return_value=TokenData(user_id="u2", loging="p"))), \
+            patch("game_service.app.main.crud.get_session", new=AsyncMock(return_value=session)):
+        client = TestClient(app)
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect("/game/s1/clicks?token=t") as ws:
+                ws.receive_json()
+
+    assert exc.value.code == 1008
+
+
+@pytest.mark.asyncio
+async def test_replay_decodes_chunks_in_order():
+    from game_service.app import crud
+
+    db = MagicMock()
+    cursor = MagicMock()
+    cursor.sort.return_value = cursor
+    cursor.__aiter__.return_value = [
+        {"count": 2, "hits": 1, "data": encode_events([(10, 1, 1, True), (20, 2, 2, False)])},
+        {"count": 1, "hits": 1, "data": encode_events([(30, 3, 3, True)])},
+    ]
+    db.session_clicks.find = MagicMock(return_value=cursor)
+
+    with patch("game_service.app.crud.get_db", return_value=db):
+        replay = await crud.get_click_replay("s1", "u1")
+
+    assert replay == {"count": 3, "hits": 2, "t": [10, 20, 30], "x": [1, 2, 3], "y": [1, 2, 3], "hit": [True, False, True]}
+    cursor.sort.assert_called_once_with("t0", 1)
+    assert db.session_clicks.find.call_args[0][0] == {"session_id": "s1", "user_id": "u1"}
+
+
+@pytest.mark.asyncio
+async def test_replay_route_is_only_for_the_sessions_players():
+    from httpx import AsyncClient, ASGITransport
+    from game_service.app.auth_deps import TokenData, get_current_user
+    from game_service.app.main import app
+    from game_service.app.models import GameSessionInDB
+
+    session = GameSessionInDB(session_id="s1", user_id=["u1"], scores={"u1": 3}, started_at=1.0, finished_at=2.0)
+    replay = {"count": 1, "hits": 1, "t": [5], "x": [1], "y": [2], "hit": [True]}
+
+    with patch("game_service.app.main.crud.get_session", new=AsyncMock(return_value=session)), \
+            patch("game_service.app.main.crud.get_click_replay", new=AsyncMock(return_value=replay)):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            app.dependency_overrides[get_current_user] = lambda: TokenData(user_id="u1", loging="p")
+            mine = await ac.get("/game/s1/replay")
+            stranger = await ac.get("/game/s1/replay?player=u9")
+            app.dependency_overrides[get_current_user] = lambda: TokenData(user_id="u2", loging="q")
+            theirs = await ac.get("/game/s1/replay")
+        app.dependency_overrides = {}
+
+    assert mine.status_code == 200
+    assert mine.json() == {"session_id": "s1", "user_id": "u1", **replay}
+    assert theirs.status_code == 404
+    assert stranger.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_players_of_one_session_have_their_own_buffers():
+    db = _db()
+    ingestor = ClickIngestor(interval=60, max_events=1000)
+    ingestor.open("S", "alice")
+    ingestor.open("S", "bob")
+    ingestor.add("S", "alice", [(10, 1, 1, True)])
+    ingestor.add("S", "bob", [(12, 5, 5, False), (20, 6, 6, True)])
+    ingestor.close("S", "alice")
+
+    with patch("game_service.app.clicks.get_db", return_value=db):
+        await ingestor.flush()
+        # alice left; bob keeps clicking
+        assert ingestor.add("S", "bob", [(30, 7, 7, True)]) == 1
+        await ingestor.flush()
+
+    first, second = (call[0][0] for call in db.session_clicks.bulk_write.call_args_list)
+    chunks = {op._doc["user_id"]: op._doc for op in first}
+    assert decode_events(chunks["alice"]["data"]) == [(10, 1, 1, True)]
+    assert decode_events(chunks["bob"]["data"]) == [(12, 5, 5, False), (20, 6, 6, True)]
+    assert [op._doc["user_id"] for op in second] == ["bob"]
+    assert list(ingestor.sessions) == [("S", "bob")]
+
+
+def test_two_sockets_share_one_session():
+    from fastapi.testclient import TestClient
+    from game_service.app.auth_deps import TokenData
+    from game_service.app.main import app
+    from game_service.app.models import GameSessionInDB
+
+    session = GameSessionInDB(session_id="S", user_id=["alice"], scores={}, started_at=1.0,
+                              expected_players=["alice", "bob"], submit_deadline=1e12)
+    ingestor = ClickIngestor(interval=60, max_events=1000)
+
+    async def user_for(token):
+        return TokenData(user_id=token, loging=token)
+
+    with patch("game_service.app.main.get_current_user", new=user_for), \
+            patch("game_service.app.main.crud.get_session", new=AsyncMock(return_value=session)), \
+            patch("game_service.app.main.click_ingestor", ingestor):
+        client = TestClient(app)
+        with client.websocket_connect("/game/S/clicks?token=bob") as bob:
+            with client.websocket_connect("/game/S/clicks?token=alice") as alice:
+                alice.send_json({"t": 1, "x": 1, "y": 1, "hit": True})
+                alice.send_text("{}")
+                assert alice.receive_json() == {"error": "Invalid click event"}
+            # alice is gone; bob's socket still works
+            bob.send_json([{"t": 2}, {"t": 3}])
+            bob.send_text("{}")
+            assert bob.receive_json() == {"error": "Invalid click event"}
+
+    assert ingestor.sessions[("S", "alice")].clicks == 1
+    assert ingestor.sessions[("S", "bob")].clicks == 2
+    assert all(clicks.closed for clicks in ingestor.sessions.values())
@@ -1,3 +1,4 @@
+import time
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from game_service.app import crud
@@ -8,6 +9,16 @@ def mock_db():
     # Setup a mock database structure: db.sessions
     mock_database = MagicMock()
     mock_database.sessions = AsyncMock()
+    mock_database.user_stats = AsyncMock()
+    # Pre-image of a player's stats: None means a first game
+    mock_database.user_stats.find_one_and_update.return_value = None
+    mock_database.score_histogram = AsyncMock()
+    mock_database.user_stats_rollups = AsyncMock()
+    mock_database.leaderboard_meta = AsyncMock()
+    mock_database.users = MagicMock()
+    mock_database.users.find.return_value.__aiter__.return_value = [
+        {"user_id": "u1", "loging": "player1"},
+    ]
     return mock_database
 
 
@@ -17,7 +28,8 @@ async def test_crud_start_game_wraps_id_in_list(mock_db):
     Ensures that when we pass a single string ID,
     it is saved as a List and Dict in MongoDB.
     """
-    with patch("game_service.app.crud.get_db", return_value=mock_db):
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.SESSION_STORE", "mongo"):
         session_id = await crud.start_game("uuid-123")
 
         assert isinstance(session_id, str)
@@ -39,19 +51,553 @@ async def test_crud_finish_game_updates_all(mock_db):
         "finished_at": 200.0
     }
 
-    mock_db.sessions.update_one.return_value = AsyncMock()
-    mock_db.sessions.find_one.return_value = fake_doc
+    mock_db.sessions.find_one_and_update.return_value = fake_doc
 
     with patch("game_service.app.crud.get_db", return_value=mock_db):
         final_scores = {"u1": 10, "u2": 20}
 
-        result = await crud.finish_game("sess_abc", final_scores, finished_at=200.0)
+        result = await crud.finish_game("sess_abc", final_scores, finished_at=200.0, user_id="u1")
 
-        mock_db.sessions.update_one.assert_called_once()
-        call_args = mock_db.sessions.update_one.call_args
+        # One round trip: conditional update returning the post-image
+        mock_db.sessions.find_one_and_update.assert_called_once()
+        call_args = mock_db.sessions.find_one_and_update.call_args
 
-        update_op = call_args[0][1]
+        query, update_op = call_args[0]
+        assert query == {"session_id": "sess_abc", "finished_at": None, "user_id": "u1",
+                         "expected_players": {"$exists": False}}
+        assert call_args[1]["return_document"] is crud.ReturnDocument.AFTER
 
         assert update_op["$set"]["scores"] == final_scores
         assert update_op["$set"]["user_id"] == ["u1", "u2"]
-        assert result.session_id == "sess_abc"
\ No newline at end of file
+        assert result.session_id == "sess_abc"
+        mock_db.sessions.find_one.assert_not_called()
+
+        # Per-user stats are folded in atomically, one upsert per player
+        calls = mock_db.user_stats.find_one_and_update.call_args_list
+        assert len(calls) == 2
+        u1_filter, u1_update = calls[0][0]
+        assert u1_filter == {"user_id": "u1"}
+        assert u1_update["$inc"] == {"totalGames": 1, "totalScores": 10}
+        assert u1_update["$max"] == {"bestScore": 10}
+        assert calls[0][1]["upsert"] is True
+
+        # Display names are denormalized for the leaderboard
+        assert u1_update["$set"] == {"userName": "player1"}
+        assert "$set" not in calls[1][0][1]
+
+        # Two new players land in the histogram, once per metric
+        histogram_ops = mock_db.score_histogram.bulk_write.call_args[0][0]
+        assert {op._filter["_id"]: op._doc["$inc"]["count"] for op in histogram_ops} == {
+            "totalScores:10": 1, "bestScore:10": 1, "totalScores:18": 1, "bestScore:18": 1,
+        }
+
+        # ...and into the daily/weekly/monthly buckets of finished_at
+        rollup_ops = mock_db.user_stats_rollups.bulk_write.call_args[0][0]
+        assert len(rollup_ops) == 6
+        buckets = {op._filter["period"]: op._filter["bucket"] for op in rollup_ops}
+        assert buckets == {"daily": "1970-01-01", "weekly": "1970-W01", "monthly": "1970-01"}
+        assert "expires_at" in rollup_ops[0]._doc["$setOnInsert"]
+
+        # Leaderboard workers watch this version for changes
+        mock_db.leaderboard_meta.update_one.assert_awaited_once_with(
+            {"_id": "standings"}, {"$inc": {"version": 1}}, upsert=True
+        )
+
+
+@pytest.mark.asyncio
+async def test_crud_finish_game_unknown_session_skips_stats(mock_db):
+    mock_db.sessions.find_one_and_update.return_value = None
+    mock_db.sessions.find_one.return_value = None
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db):
+        result = await crud.finish_game("missing", {"u1": 10})
+
+    assert result is None
+    mock_db.user_stats.find_one_and_update.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_crud_finish_rejects_unrollable_time_before_writing(mock_db):
+    with patch("game_service.app.crud.get_db", return_value=mock_db):
+        with pytest.raises(ValueError):
+            await crud.finish_game("sess_abc", {"u1": 10}, finished_at=1e20, user_id="u1")
+        with pytest.raises(ValueError):
+            await crud.finish_games([{"session_id": "s1", "scores": {"u1": 10}, "finished_at": float("inf")}], "u1")
+
+    mock_db.sessions.find_one_and_update.assert_not_called()
+    mock_db.sessions.insert_one.assert_not_called()
+    mock_db.sessions.bulk_write.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_crud_finish_game_repeat_is_idempotent(mock_db):
+    stored = {
+        "session_id": "sess_abc", "user_id": ["u1"], "scores": {"u1": 10},
+        "started_at": 100.0, "finished_at": 200.0,
+    }
+    mock_db.sessions.find_one_and_update.return_value = None
+    mock_db.sessions.find_one.return_value = dict(stored)
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db):
+        result = await crud.finish_game("sess_abc", {"u1": 99}, finished_at=300.0, user_id="u1")
+
+    # The first result stands and nothing is counted twice
+    assert result.scores == {"u1": 10}
+    assert result.finished_at == 200.0
+    mock_db.user_stats.find_one_and_update.assert_not_called()
+    mock_db.leaderboard_meta.update_one.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_crud_finish_game_retry_records_stats_a_failed_finish_lost(mock_db):
+    stored = {
+        "session_id": "sess_abc", "user_id": ["u1"], "scores": {"u1": 10},
+        "started_at": 100.0, "finished_at": 200.0,
+    }
+    mock_db.sessions.find_one_and_update.side_effect = [
+        dict(stored),  # the finish
+        None,  # the retry's finish matches nothing...
+        {"scores": {"u1": 10}, "finished_at": 200.0},  # ...but it takes over the fold
+    ]
+    mock_db.sessions.find_one.return_value = dict(stored)
+    record = AsyncMock(side_effect=[RuntimeError("primary stepped down"), None])
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.record_user_stats", new=record):
+        with pytest.raises(RuntimeError):
+            await crud.finish_game("sess_abc", {"u1": 10}, finished_at=200.0, user_id="u1")
+        # The claim is given up so the retry need not wait for it to expire
+        mock_db.sessions.update_one.assert_awaited_once_with(
+            {"session_id": "sess_abc", "stats_recorded": {"$exists": False}}, {"$set": {"stats_claim": 0}}
+        )
+
+        result = await crud.finish_game("sess_abc", {"u1": 10}, finished_at=300.0, user_id="u1")
+
+    assert result.finished_at == 200.0
+    assert record.await_count == 2
+    record.assert_awaited_with({"u1": 10}, 200.0)
+    claim_query = mock_db.sessions.find_one_and_update.call_args[0][0]
+    assert claim_query["stats_recorded"] == {"$exists": False}
+    assert "$lt" in claim_query["stats_claim"]
+    mock_db.sessions.update_one.assert_awaited_with(
+        {"session_id": "sess_abc"}, {"$set": {"stats_recorded": True}, "$unset": {"stats_claim": ""}}
+    )
+
+
+@pytest.mark.asyncio
+async def test_crud_finish_game_rejects_other_players_session(mock_db):
+    mock_db.sessions.find_one_and_update.return_value = None
+    mock_db.sessions.find_one.return_value = {
+        "session_id": "sess_abc", "user_id": ["u1"], "scores": {"u1": 0},
+        "started_at": 100.0, "finished_at": None,
+    }
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db):
+        result = await crud.finish_game("sess_abc", {"u2": 50}, user_id="u2")
+
+    assert result is None
+    mock_db.user_stats.find_one_and_update.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_crud_finish_games_single_bulk_write(mock_db):
+    stored = []
+
+    async def bulk_write(ops, ordered):
+        assert ordered is False
+        token = ops[0]._doc["$set"]["finish_batch"]
+        # s1 gets finished by this batch, s2 was finished before, s3 is unknown
+        stored.extend([
+            {"session_id": "s1", "user_id": ["u1"], "scores": {"u1": 10},
+             "finished_at": 5.0, "finish_batch": token},
+            {"session_id": "s2", "user_id": ["u1"], "scores": {"u1": 3}, "finished_at": 1.0},
+        ])
+        return MagicMock()
+
+    mock_db.sessions.bulk_write = AsyncMock(side_effect=bulk_write)
+    mock_db.sessions.find = MagicMock()
+    mock_db.sessions.find.return_value.__aiter__.return_value = stored
+
+    items = [
+        {"session_id": "s1", "scores": {"u1": 10}, "finished_at": 5.0},
+        {"session_id": "s2", "scores": {"u1": 7}, "finished_at": None},
+        {"session_id": "s3", "scores": {"u1": 1}, "finished_at": None},
+        {"session_id": "s1", "scores": {"u1": 99}, "finished_at": None},
+    ]
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db):
+        results = await crud.finish_games(items, user_id="u1")
+
+    assert [r["status"] for r in results] == ["finished", "already_finished", "not_found", "duplicate"]
+
+    ops = mock_db.sessions.bulk_write.call_args[0][0]
+    assert len(ops) == 3
+    assert ops[0]._filter == {"session_id": "s1", "finished_at": None, "user_id": "u1",
+                              "expected_players": {"$exists": False}}
+
+    # Stats only for the session this batch finished
+    calls = mock_db.user_stats.find_one_and_update.call_args_list
+    assert len(calls) == 1
+    assert calls[0][0][1]["$inc"] == {"totalGames": 1, "totalScores": 10}
+
+
+
+@pytest.mark.asyncio
+async def test_crud_finish_games_retries_unrecorded_stats(mock_db):
+    stored = [
+        # Finished an hour ago, its fold never completed
+        {"session_id": "s1", "user_id": ["u1"], "scores": {"u1": 10}, "finished_at": 5.0, "stats_claim": 0},
+        # Finishing right now elsewhere, or finished before the marker existed
+        {"session_id": "s2", "user_id": ["u1"], "scores": {"u1": 3}, "finished_at": 1.0,
+         "stats_claim": time.time()},
+        {"session_id": "s3", "user_id": ["u1"], "scores": {"u1": 4}, "finished_at": 1.0},
+    ]
+    mock_db.sessions.find = MagicMock()
+    mock_db.sessions.find.return_value.__aiter__.return_value = stored
+    mock_db.sessions.find_one_and_update.return_value = {"scores": {"u1": 10}, "finished_at": 5.0}
+    items = [{"session_id": sid, "scores": {"u1": 1}, "finished_at": None} for sid in ("s1", "s2", "s3")]
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.record_user_stats", new=AsyncMock()) as record:
+        results = await crud.finish_games(items, user_id="u1")
+
+    assert [r["status"] for r in results] == ["already_finished"] * 3
+    mock_db.sessions.find_one_and_update.assert_awaited_once()
+    assert mock_db.sessions.find_one_and_update.call_args[0][0]["session_id"] == "s1"
+    record.assert_awaited_once_with({"u1": 10}, 5.0)
+
+
+@pytest.mark.asyncio
+async def test_crud_write_behind_start_is_flushed_before_finish(mock_db):
+    from game_service.app.buffer import InsertBuffer
+    buffer = InsertBuffer(lambda: mock_db.sessions, key="session_id", max_items=100, max_delay=60)
+    mock_db.sessions.find_one_and_update.return_value = None
+    mock_db.sessions.find_one.return_value = None
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.SESSION_STORE", "mongo"), \
+            patch("game_service.app.crud.SESSION_WRITE_BEHIND", True), \
+            patch("game_service.app.crud.session_buffer", buffer):
+        session_id = await crud.start_game("u1")
+        mock_db.sessions.insert_one.assert_not_called()
+        assert buffer.is_pending(session_id)
+
+        await crud.finish_game(session_id, {"u1": 5}, user_id="u1")
+
+    # The insert reached Mongo before the conditional update ran
+    mock_db.sessions.insert_many.assert_awaited_once()
+    assert mock_db.sessions.insert_many.call_args[0][0][0]["session_id"] == session_id
+    mock_db.sessions.find_one_and_update.assert_awaited_once()
+    await buffer.close()
+
+
+@pytest.fixture
+def registry():
+    from game_service.app.registry import SessionRegistry
+    registry = SessionRegistry(ttl=60, max_sessions=10)
+    with patch("game_service.app.crud.session_registry", registry):
+        yield registry
+
+
+@pytest.mark.asyncio
+async def test_crud_memory_session_persisted_only_on_finish(mock_db, registry):
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.SESSION_STORE", "memory"):
+        session_id = await crud.start_game("u1")
+        mock_db.sessions.insert_one.assert_not_called()
+        assert (await crud.get_session(session_id)).scores == {"u1": 0}
+
+        result = await crud.finish_game(session_id, {"u1": 12}, finished_at=50.0, user_id="u1")
+
+    inserted = mock_db.sessions.insert_one.call_args[0][0]
+    assert inserted["session_id"] == session_id
+    assert inserted["finished_at"] == 50.0
+    assert result.scores == {"u1": 12}
+    assert len(registry) == 0
+    mock_db.sessions.find_one_and_update.assert_not_called()
+    mock_db.user_stats.find_one_and_update.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_crud_memory_session_of_other_player_is_not_finished(mock_db, registry):
+    mock_db.sessions.find_one_and_update.return_value = None
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.SESSION_STORE", "memory"):
+        session_id = await crud.start_game("u1")
+        result = await crud.finish_game(session_id, {"u2": 12}, user_id="u2")
+
+    assert result is None
+    assert len(registry) == 1
+    mock_db.sessions.insert_one.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_crud_write_through_inserts_on_start(mock_db, registry):
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.SESSION_STORE", "write-through"):
+        session_id = await crud.start_game("u1")
+
+    mock_db.sessions.insert_one.assert_awaited_once()
+    assert "_id" not in registry.get(session_id)
+
+
+@pytest.mark.asyncio
+async def test_crud_finish_games_inserts_memory_sessions(mock_db, registry):
+    registry.add({"session_id": "m1", "user_id": ["u1"], "scores": {"u1": 0},
+                  "started_at": 1.0, "finished_at": None})
+    mock_db.sessions.bulk_write = AsyncMock()
+    mock_db.sessions.find = MagicMock()
+    mock_db.sessions.find.return_value.__aiter__.return_value = [
+        {"session_id": "m1", "user_id": ["u1"], "scores": {"u1": 4}, "finished_at": 9.0, "finish_batch": "other"},
+    ]
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.SESSION_STORE", "memory"):
+        await crud.finish_games([{"session_id": "m1", "scores": {"u1": 4}, "finished_at": 9.0}], user_id="u1")
+
+    op = mock_db.sessions.bulk_write.call_args[0][0][0]
+    assert op._doc["session_id"] == "m1"
+    assert op._doc["finished_at"] == 9.0
+    assert len(registry) == 0
+
+
+@pytest.mark.asyncio
+async def test_crud_finish_games_keeps_memory_session_when_write_fails(mock_db, registry):
+    registry.add({"session_id": "m1", "user_id": ["u1"], "scores": {"u1": 0},
+                  "started_at": 1.0, "finished_at": None})
+    mock_db.sessions.bulk_write = AsyncMock(side_effect=RuntimeError("primary stepped down"))
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.SESSION_STORE", "memory"):
+        with pytest.raises(RuntimeError):
+            await crud.finish_games([{"session_id": "m1", "scores": {"u1": 4}, "finished_at": 9.0}], user_id="u1")
+
+    assert registry.get("m1") is not None
+
+
+@pytest.mark.asyncio
+async def test_crud_memory_finish_keeps_session_when_insert_fails(mock_db, registry):
+    mock_db.sessions.insert_one.side_effect = [RuntimeError("timeout"), None]
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.SESSION_STORE", "memory"):
+        registry.add({"session_id": "m1", "user_id": ["u1"], "scores": {"u1": 0},
+                      "started_at": 1.0, "finished_at": None})
+        with pytest.raises(RuntimeError):
+            await crud.finish_game("m1", {"u1": 12}, user_id="u1")
+        assert registry.get("m1") is not None
+
+        # The retry still finds it
+        result = await crud.finish_game("m1", {"u1": 12}, user_id="u1")
+
+    assert result.scores == {"u1": 12}
+    assert len(registry) == 0
+
+
+@pytest.mark.asyncio
+async def test_crud_concurrent_memory_finish_returns_the_stored_result(mock_db, registry):
+    from pymongo.errors import DuplicateKeyError
+    stored = {"session_id": "m1", "user_id": ["u1"], "scores": {"u1": 12},
+              "started_at": 1.0, "finished_at": 50.0}
+    mock_db.sessions.insert_one.side_effect = DuplicateKeyError("E11000")
+    mock_db.sessions.find_one_and_update.return_value = None
+    mock_db.sessions.find_one.return_value = dict(stored)
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.SESSION_STORE", "memory"):
+        registry.add({"session_id": "m1", "user_id": ["u1"], "scores": {"u1": 0},
+                      "started_at": 1.0, "finished_at": None})
+        result = await crud.finish_game("m1", {"u1": 99}, user_id="u1")
+
+    assert result.scores == {"u1": 12} and result.finished_at == 50.0
+    assert len(registry) == 0
+    mock_db.user_stats.find_one_and_update.assert_not_called()
+
+
+def _history_cursor(rows):
+    cursor = MagicMock()
+    cursor.sort.return_value = cursor
+    cursor.limit.return_value = cursor
+    cursor.to_list = AsyncMock(return_value=rows)
+    return cursor
+
+
+@pytest.mark.asyncio
+async def test_crud_list_sessions_only_flushes_the_readers_starts(mock_db):
+    from game_service.app.buffer import InsertBuffer
+    buffer = InsertBuffer(lambda: mock_db.sessions, key="session_id", max_items=100, max_delay=60)
+    buffer.add({"session_id": "s-other", "user_id": ["u2"]})
+    mock_db.sessions.find = MagicMock(return_value=_history_cursor([]))
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.session_buffer", buffer):
+        await crud.list_sessions(user_id="u1", limit=20)
+        mock_db.sessions.insert_many.assert_not_awaited()
+
+        buffer.add({"session_id": "s-mine", "user_id": ["u1"]})
+        await crud.list_sessions(user_id="u1", limit=20)
+        mock_db.sessions.insert_many.assert_awaited_once()
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_crud_list_sessions_first_page_is_projected(mock_db):
+    mock_db.sessions.find = MagicMock(return_value=_history_cursor([]))
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db):
+        await crud.list_sessions(user_id="u1", limit=20)
+
+    query, projection = mock_db.sessions.find.call_args[0]
+    assert query == {"user_id": "u1"}
+    assert projection["id"] == "$session_id"
+    assert projection["_id"] == 0
+    cursor = mock_db.sessions.find.return_value
+    cursor.sort.assert_called_once_with([("finished_at", -1), ("session_id", -1)])
+    cursor.limit.assert_called_once_with(20)
+
+
+@pytest.mark.asyncio
+async def test_crud_list_sessions_seeks_from_cursor(mock_db):
+    mock_db.sessions.find = MagicMock(return_value=_history_cursor([]))
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db):
+        await crud.list_sessions(user_id="u1", limit=20, after=(200.0, "s5"))
+        await crud.list_sessions(user_id="u1", limit=20, after=(None, "s5"))
+
+    finished_query = mock_db.sessions.find.call_args_list[0][0][0]
+    assert finished_query["$or"] == [
+        {"finished_at": {"$lt": 200.0}},
+        {"finished_at": 200.0, "session_id": {"$lt": "s5"}},
+        {"finished_at": None},
+    ]
+    unfinished_query = mock_db.sessions.find.call_args_list[1][0][0]
+    assert unfinished_query == {"user_id": "u1", "finished_at": None, "session_id": {"$lt": "s5"}}
+
+
+def test_history_cursor_round_trip():
+    cursor = crud.encode_cursor({"finished_at": 200.5, "id": "s5"})
+    assert crud.decode_cursor(cursor) == (200.5, "s5")
+    assert crud.decode_cursor(crud.encode_cursor({"finished_at": None, "id": "s6"})) == (None, "s6")
+    with pytest.raises(ValueError):
+        crud.decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_crud_iter_sessions_streams_with_time_range(mock_db):
+    rows = [{"id": "s2", "finished_at": 20.0}, {"id": "s1", "finished_at": 10.0}]
+    cursor = MagicMock()
+    cursor.sort.return_value = cursor
+    cursor.batch_size.return_value = cursor
+    cursor.__aiter__.return_value = rows
+    mock_db.sessions.find = MagicMock(return_value=cursor)
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db):
+        streamed = [doc async for doc in crud.iter_sessions("u1", since=5.0, until=25.0, batch_size=100)]
+
+    assert streamed == rows
+    query = mock_db.sessions.find.call_args[0][0]
+    assert query == {"user_id": "u1", "finished_at": {"$gte": 5.0, "$lt": 25.0}}
+    cursor.batch_size.assert_called_once_with(100)
+    cursor.to_list.assert_not_called()
+
+
+def _multiplayer_doc(scores, finished_at=None, deadline=1e12):
+    return {
+        "session_id": "m1",
+        "scores": scores,
+        "finished_at": finished_at,
+        "expected_players": ["u1", "u2"],
+        "submit_deadline": deadline,
+    }
+
+
+@pytest.mark.asyncio
+async def test_crud_submit_score_writes_only_the_players_fields(mock_db):
+    mock_db.sessions.find_one_and_update.return_value = _multiplayer_doc({"u1": 10})
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db):
+        status, doc = await crud.submit_score("m1", "u1", 10)
+
+    assert status == "accepted"
+    query, update = mock_db.sessions.find_one_and_update.call_args[0]
+    assert query["expected_players"] == "u1"
+    assert query["scores.u1"] == {"$exists": False}
+    assert update == {"$set": {"scores.u1": 10}, "$addToSet": {"user_id": "u1"}}
+    # u2 has not reported: not finalized
+    mock_db.sessions.find_one_and_update.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_crud_last_submission_finalizes_once(mock_db):
+    finished = _multiplayer_doc({"u1": 10, "u2": 7}, finished_at=5.0)
+    mock_db.sessions.find_one_and_update.side_effect = [_multiplayer_doc({"u1": 10, "u2": 7}), finished]
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.record_user_stats", new=AsyncMock()) as record:
+        status, doc = await crud.submit_score("m1", "u2", 7)
+
+    assert status == "accepted" and doc["finished_at"] == 5.0
+    query, update = mock_db.sessions.find_one_and_update.call_args[0]
+    assert query == {"session_id": "m1", "finished_at": None, "expected_players": {"$exists": True}}
+    assert update["$unset"] == {"submit_deadline": ""}
+    record.assert_awaited_once_with({"u1": 10, "u2": 7}, update["$set"]["finished_at"])
+
+
+@pytest.mark.asyncio
+async def test_crud_submit_score_retry_late_and_foreign(mock_db):
+    mock_db.sessions.find_one_and_update.return_value = None
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db):
+        mock_db.sessions.find_one.return_value = _multiplayer_doc({"u1": 10})
+        assert (await crud.submit_score("m1", "u1", 99))[0] == "already_submitted"
+
+        mock_db.sessions.find_one.return_value = _multiplayer_doc({"u1": 10}, finished_at=5.0)
+        assert (await crud.submit_score("m1", "u2", 7))[0] == "closed"
+
+        assert await crud.submit_score("m1", "u3", 7) is None
+
+
+@pytest.mark.asyncio
+async def test_crud_submit_after_deadline_finalizes(mock_db):
+    mock_db.sessions.find_one.return_value = _multiplayer_doc({"u1": 10}, deadline=1.0)
+    mock_db.sessions.find_one_and_update.side_effect = [None, _multiplayer_doc({"u1": 10}, finished_at=2.0)]
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.record_user_stats", new=AsyncMock()) as record:
+        status, doc = await crud.submit_score("m1", "u2", 7)
+
+    assert status == "closed" and doc["finished_at"] == 2.0
+    record.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_crud_finalize_expired_sessions_counts_only_its_own_wins(mock_db):
+    mock_db.sessions.find = MagicMock()
+    mock_db.sessions.find.return_value.__aiter__.return_value = [{"session_id": "m1"}, {"session_id": "m2"}]
+    # m2 was finalized by someone else in between
+    mock_db.sessions.find_one_and_update.side_effect = [_multiplayer_doc({"u1": 1}, finished_at=9.0), None]
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.record_user_stats", new=AsyncMock()):
+        assert await crud.finalize_expired_sessions(now=9.0) == 1
+
+    assert mock_db.sessions.find.call_args[0][0] == {"submit_deadline": {"$lte": 9.0}, "finished_at": None}
+
+
+@pytest.mark.asyncio
+async def test_crud_finish_games_duplicate_insert_is_already_finished(mock_db, registry):
+    from pymongo.errors import BulkWriteError
+    registry.add({"session_id": "m1", "user_id": ["u1"], "scores": {"u1": 0},
+                  "started_at": 1.0, "finished_at": None})
+    mock_db.sessions.bulk_write = AsyncMock(side_effect=BulkWriteError({"writeErrors": [{"code": 11000, "index": 0}]}))
+    mock_db.sessions.find = MagicMock()
+    mock_db.sessions.find.return_value.__aiter__.return_value = [
+        {"session_id": "m1", "user_id": ["u1"], "scores": {"u1": 4}, "finished_at": 9.0, "finish_batch": "earlier"},
+    ]
+
+    with patch("game_service.app.crud.get_db", return_value=mock_db), \
+            patch("game_service.app.crud.SESSION_STORE", "memory"):
+        results = await crud.finish_games([{"session_id": "m1", "scores": {"u1": 4}, "finished_at": 9.0}], user_id="u1")
+
+    assert results == [{"session_id": "m1", "status": "already_finished"}]
+    assert len(registry) == 0
@@ -0,0 +1,54 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from game_service.app import histogram
+from game_service.app.histogram import bucket_bounds, score_bucket, histogram_moves
+
+
+def test_buckets_are_contiguous_and_bounded():
+    previous_hi = 0
+    for index in range(200):
+        lo, hi = bucket_bounds(index)
+        assert lo == previous_hi
+        assert hi > lo
+        if lo >= histogram.LINEAR_LIMIT:
+            # Relative width stays under 2^(1/8) - 1, plus integer rounding
+            assert hi - lo <= lo * (2 ** (1 / 8) - 1) + 1
+        previous_hi = hi
+
+
+@pytest.mark.parametrize("score", [0, 1, 15, 16, 17, 99, 100, 12345, 10**9])
+def test_score_lands_inside_its_bucket(score):
+    lo, hi = bucket_bounds(score_bucket(score))
+    assert lo <= score < hi
+
+
+def test_negative_scores_use_first_bucket():
+    assert score_bucket(-5) == 0
+
+
+def test_moves_for_new_player():
+    assert histogram_moves(None, 12) == {("totalScores", 12): 1, ("bestScore", 12): 1}
+
+
+def test_moves_for_existing_player():
+    before = {"totalScores": 10, "bestScore": 8}
+    moves = histogram_moves(before, 5)
+
+    # Total 10 -> 15 changes bucket, best stays at 8
+    assert moves == {("totalScores", 10): -1, ("totalScores", 15): 1}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_histogram_counts_players():
+    mock_db = MagicMock()
+    docs = [{"totalScores": 3, "bestScore": 3}, {"totalScores": 3, "bestScore": 2}]
+    mock_db.user_stats.find.return_value.batch_size.return_value.__aiter__.return_value = docs
+    mock_db.score_histogram = AsyncMock()
+
+    players = await histogram.rebuild_histogram(mock_db)
+
+    assert players == 2
+    mock_db.score_histogram.delete_many.assert_awaited_once_with({})
+    ops = mock_db.score_histogram.bulk_write.call_args[0][0]
+    counts = {op._filter["_id"]: op._doc["$inc"]["count"] for op in ops}
+    assert counts == {"totalScores:3": 2, "bestScore:3": 1, "bestScore:2": 1}
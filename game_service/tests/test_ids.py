@@ -0,0 +1,44 @@
+import uuid
+from unittest.mock import patch
+
+from game_service.app import ids
+from game_service.app.ids import new_session_id, normalize_session_id, session_id_time
+
+
+def test_ids_are_compact_and_strictly_increasing():
+    generated = [new_session_id() for _ in range(5000)]
+
+    assert all(len(sid) == 26 for sid in generated)
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+
+
+def test_ids_keep_order_when_the_clock_steps_back():
+    with patch.object(ids, "_last", (0, 0)):
+        with patch("game_service.app.ids.time.time_ns", return_value=2_000_000_000_000_000_000):
+            first = new_session_id()
+        with patch("game_service.app.ids.time.time_ns", return_value=1_000_000_000_000_000_000):
+            second = new_session_id()
+
+    assert second > first
+
+
+def test_id_encodes_creation_time():
+    with patch.object(ids, "_last", (0, 0)), \
+            patch("game_service.app.ids.time.time_ns", return_value=1_767_225_600_123_000_000):
+        sid = new_session_id()
+
+    assert session_id_time(sid) == 1_767_225_600.123
+    assert session_id_time(str(uuid.uuid4())) is None
+
+
+def test_normalize_accepts_new_and_legacy_ids():
+    sid = new_session_id()
+    legacy = str(uuid.uuid4())
+
+    assert normalize_session_id(sid) == sid
+    assert normalize_session_id(sid.lower()) == sid
+    assert normalize_session_id(legacy) == legacy
+    assert normalize_session_id(legacy.upper()) == legacy
+    assert normalize_session_id(legacy.replace("-", "")) == legacy
+    assert normalize_session_id("sess_abc") == "sess_abc"
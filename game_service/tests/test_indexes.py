@@ -0,0 +1,87 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from game_service.app import indexes
+
+
+def _db(index_info):
+    """Mock database whose collections report `index_info[name]`."""
+    collections = {}
+    for name in indexes.INDEXES:
+        collection = MagicMock()
+        collection.create_indexes = AsyncMock()
+        collection.index_information = AsyncMock(return_value=index_info.get(name, {}))
+        collections[name] = collection
+    db = MagicMock()
+    db.__getitem__.side_effect = collections.__getitem__
+    return db, collections
+
+
+def _info(models):
+    return {
+        f"ix{i}": {"key": list(model.document["key"].items()), **{
+            k: v for k, v in model.document.items() if k in ("unique", "sparse", "expireAfterSeconds")
+        }}
+        for i, model in enumerate(models)
+    }
+
+
+def test_spec_has_unique_session_id():
+    keys = {
+        tuple(model.document["key"].items()): model.document.get("unique", False)
+        for model in indexes.INDEXES["sessions"]
+    }
+    assert keys[(("session_id", 1),)] is True
+    assert (("user_id", 1), ("finished_at", -1), ("session_id", -1)) in keys
+
+
+@pytest.mark.asyncio
+async def test_no_drift_when_everything_matches():
+    db, _ = _db({name: _info(models) for name, models in indexes.INDEXES.items()})
+
+    assert await indexes.index_drift(db) == {}
+
+
+@pytest.mark.asyncio
+async def test_drift_reports_missing_conflicting_and_extra():
+    info = {name: _info(models) for name, models in indexes.INDEXES.items()}
+    info["sessions"] = {
+        "_id_": {"key": [("_id", 1)]},
+        # Declared unique, exists without it
+        "session_id_1": {"key": [("session_id", 1.0)]},
+        "legacy": {"key": [("started_at", -1)]},
+    }
+    db, collections = _db(info)
+
+    drift = await indexes.index_drift(db)
+
+    assert drift == {"sessions": {
+        "missing": [[("user_id", 1), ("finished_at", -1), ("session_id", -1)], [("submit_deadline", 1)]],
+        "conflicting": [[("session_id", 1)]],
+        "extra": [[("started_at", -1)]],
+    }}
+    assert indexes.needs_attention(drift)
+    collections["sessions"].create_indexes.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_apply_creates_and_reports_errors_per_collection():
+    db, collections = _db({name: _info(models) for name, models in indexes.INDEXES.items()})
+    collections["user_stats"].create_indexes.side_effect = RuntimeError("duplicate key")
+
+    drift = await indexes.index_drift(db, apply=True)
+
+    collections["sessions"].create_indexes.assert_awaited_once_with(indexes.INDEXES["sessions"])
+    assert list(drift) == ["user_stats"]
+    assert "duplicate key" in drift["user_stats"]["error"]
+
+
+@pytest.mark.asyncio
+async def test_cli_check_exit_code():
+    db, _ = _db({})
+
+    with patch("game_service.app.indexes.get_db", return_value=db):
+        assert await indexes.main(["--check"]) == 1
+
+    db, _ = _db({name: _info(models) for name, models in indexes.INDEXES.items()})
+    with patch("game_service.app.indexes.get_db", return_value=db):
+        assert await indexes.main(["--check"]) == 0
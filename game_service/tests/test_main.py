@@ -1,3 +1,4 @@
+import time
 import pytest
 from types import SimpleNamespace
 from httpx import AsyncClient, ASGITransport
@@ -36,6 +37,7 @@ async def test_start_game_calls_crud_and_returns_session_id():
 
 @pytest.mark.asyncio
 async def test_finish_calls_crud_and_returns_finishresponse():
+    finished_at = time.time()
     fake_session = SimpleNamespace(
         session_id="sessionXYZ",
         scores={"user_uuid_123": 100},
@@ -53,7 +55,7 @@ async def test_finish_calls_crud_and_returns_finishresponse():
         body = FinishGameRequest(
             session_id="sessionXYZ",
             scores={"user_uuid_123": 100},
-            finished_at=20.0,
+            finished_at=finished_at,
         )
 
         response = await finish(body, current_user=fake_user)
@@ -64,7 +66,8 @@ async def test_finish_calls_crud_and_returns_finishresponse():
         mock_finish.assert_awaited_once_with(
             session_id="sessionXYZ",
             final_scores={"user_uuid_123": 100},
-            finished_at=20.0
+            finished_at=finished_at,
+            user_id="user_uuid_123",
         )
 
 
@@ -135,4 +138,144 @@ async def test_auth_deps_invalid_token():
             patch.object(auth_deps, "ALGORITHM", "HS256"):
         with pytest.raises(HTTPException) as exc:
             await auth_deps.get_current_user("invalid_token")
-        assert exc.value.status_code == 401
\ No newline at end of file
+        assert exc.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_finish_batch_returns_per_item_status():
+    fake_user = TokenData(user_id="u1", loging="test")
+    results = [
+        {"session_id": "s1", "status": "finished"},
+        {"session_id": "s2", "status": "not_found"},
+    ]
+
+    finished_at = time.time() - 3600
+    with patch("game_service.app.main.crud.finish_games", new=AsyncMock(return_value=results)) as mock_batch:
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        body = {"items": [
+            {"session_id": "s1", "scores": {"u1": 10}, "finished_at": finished_at},
+            {"session_id": "s2", "scores": {"u1": 20}},
+        ]}
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.post("/game/finish/batch", json=body)
+
+        app.dependency_overrides = {}
+
+    assert response.status_code == 200
+    assert response.json() == {"results": results}
+    items = mock_batch.await_args.args[0]
+    assert items[0] == {"session_id": "s1", "scores": {"u1": 10}, "finished_at": finished_at}
+    assert mock_batch.await_args.kwargs["user_id"] == "u1"
+
+
+@pytest.mark.parametrize("finished_at", [1e20, 253402300800, 5.0, "Infinity", "NaN"])
+@pytest.mark.asyncio
+async def test_finish_rejects_unusable_finished_at(finished_at):
+    fake_user = TokenData(user_id="u1", loging="test")
+
+    with patch("game_service.app.main.crud.finish_game", new=AsyncMock()) as mock_finish, \
+            patch("game_service.app.main.crud.finish_games", new=AsyncMock()) as mock_batch:
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        item = {"session_id": "s1", "scores": {"u1": 10}, "finished_at": finished_at}
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            single = await ac.post("/game/finish", json=item)
+            batch = await ac.post("/game/finish/batch", json={"items": [item]})
+
+        app.dependency_overrides = {}
+
+    assert single.status_code == 422
+    assert batch.status_code == 422
+    mock_finish.assert_not_awaited()
+    mock_batch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_metrics_reports_session_registry():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/metrics")
+
+    assert response.status_code == 200
+    assert {"active", "expired", "evicted"} <= set(response.json()["sessions"])
+
+
+@pytest.mark.asyncio
+async def test_get_games_pages_with_cursor_header():
+    fake_user = TokenData(user_id="u1", loging="test")
+    page = [
+        {"id": f"s{i}", "user_id": ["u1"], "scores": {"u1": i}, "started_at": 1.0, "finished_at": 10.0 - i}
+        for i in range(2)
+    ]
+    mock_list = AsyncMock(return_value=page)
+
+    with patch("game_service.app.main.crud.list_sessions", new=mock_list):
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            first = await ac.get("/game?limit=2")
+            second = await ac.get(f"/game?limit=2&cursor={first.headers['X-Next-Cursor']}")
+            bad = await ac.get("/game?cursor=%%%")
+
+        app.dependency_overrides = {}
+
+    assert first.status_code == 200
+    assert mock_list.await_args_list[1].kwargs["after"] == (9.0, "s1")
+    assert second.status_code == 200
+    assert bad.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_export_streams_ndjson():
+    import json
+    fake_user = TokenData(user_id="u1", loging="test")
+    rows = [
+        {"id": f"s{i}", "user_id": ["u1"], "scores": {"u1": i}, "started_at": 1.0, "finished_at": 2.0}
+        for i in range(3)
+    ]
+
+    async def fake_iter(user_id, since, until, batch_size):
+        for row in rows:
+            yield row
+
+    with patch("game_service.app.main.crud.iter_sessions", new=fake_iter), \
+            patch("game_service.app.main.EXPORT_BATCH_SIZE", 2):
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.get("/game/export")
+            bad_range = await ac.get("/game/export?since=10&until=5")
+
+        app.dependency_overrides = {}
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == rows
+    assert bad_range.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_multiplayer_start_and_submit():
+    fake_user = TokenData(user_id="u1", loging="test")
+    session = {"scores": {"u1": 10}, "finished_at": None, "expected_players": ["u1", "u2"]}
+
+    with patch("game_service.app.main.crud.start_multiplayer_game", new=AsyncMock(return_value="m1")) as start, \
+            patch("game_service.app.main.crud.submit_score",
+                  new=AsyncMock(side_effect=[("accepted", session), None])):
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            started = await ac.post("/game/start/multiplayer", json={"players": ["u2"], "submit_window": 30})
+            submitted = await ac.post("/game/m1/scores", json={"score": 10})
+            unknown = await ac.post("/game/nope/scores", json={"score": 10})
+            no_players = await ac.post("/game/start/multiplayer", json={"players": []})
+
+        app.dependency_overrides = {}
+
+    assert started.json() == {"session_id": "m1"}
+    start.assert_awaited_once_with("u1", ["u2"], 30.0)
+    assert submitted.json() == {
+        "session_id": "m1", "status": "accepted", "finished": False,
+        "reported": ["u1"], "expected_players": ["u1", "u2"],
+    }
+    assert unknown.status_code == 404
+    assert no_players.status_code == 422
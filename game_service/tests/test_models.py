@@ -26,4 +26,14 @@ def test_finish_game_request_validates_dict():
         FinishGameRequest(
             session_id="sess_1",
             scores=[10, 20]
-        )
\ No newline at end of file
+        )
+
+def test_finish_batch_request_limits():
+    from game_service.app.models import FinishBatchRequest, FINISH_BATCH_MAX_ITEMS
+
+    with pytest.raises(ValidationError):
+        FinishBatchRequest(items=[])
+
+    too_many = [{"session_id": f"s{i}", "scores": {}} for i in range(FINISH_BATCH_MAX_ITEMS + 1)]
+    with pytest.raises(ValidationError):
+        FinishBatchRequest(items=too_many)
@@ -0,0 +1,57 @@
+from game_service.app.registry import SessionRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _doc(session_id):
+    return {"session_id": session_id, "user_id": ["u1"], "scores": {"u1": 0}}
+
+
+def test_sessions_expire_after_ttl():
+    clock = FakeClock()
+    registry = SessionRegistry(ttl=10, max_sessions=10, clock=clock)
+    registry.add(_doc("s1"))
+
+    clock.now = 9
+    assert registry.get("s1") is not None
+
+    clock.now = 10
+    assert registry.get("s1") is None
+    assert registry.stats()["expired"] == 1
+
+
+def test_sweep_drops_expired_sessions_on_add():
+    clock = FakeClock()
+    registry = SessionRegistry(ttl=10, max_sessions=10, clock=clock)
+    registry.add(_doc("s1"))
+    registry.add(_doc("s2"))
+
+    clock.now = 11
+    registry.add(_doc("s3"))
+
+    assert len(registry) == 1
+    assert registry.expired == 2
+
+
+def test_oldest_session_is_evicted_when_full():
+    registry = SessionRegistry(ttl=10, max_sessions=2, clock=FakeClock())
+    for session_id in ("s1", "s2", "s3"):
+        registry.add(_doc(session_id))
+
+    assert registry.get("s1") is None
+    assert registry.get("s3") is not None
+    assert registry.stats()["evicted"] == 1
+
+
+def test_pop_removes_session():
+    registry = SessionRegistry(ttl=10, max_sessions=2, clock=FakeClock())
+    registry.add(_doc("s1"))
+
+    assert registry.pop("s1")["session_id"] == "s1"
+    assert registry.pop("s1") is None
@@ -0,0 +1,50 @@
+import pytest
+from datetime import datetime, timezone
+from game_service.app.rollups import bucket_bounds, bucket_expiry, rollup_buckets, ROLLUP_RETENTION
+
+# Wednesday 2026-10-14 13:45 UTC
+TS = datetime(2026, 10, 14, 13, 45, tzinfo=timezone.utc).timestamp()
+
+
+def test_daily_bucket():
+    key, closes_at = bucket_bounds("daily", TS)
+    assert key == "2026-10-14"
+    assert closes_at == datetime(2026, 10, 15, tzinfo=timezone.utc)
+
+
+def test_weekly_bucket_is_iso_week():
+    key, closes_at = bucket_bounds("weekly", TS)
+    assert key == "2026-W42"
+    # ISO weeks close on Monday 00:00
+    assert closes_at == datetime(2026, 10, 19, tzinfo=timezone.utc)
+
+
+def test_monthly_bucket():
+    key, closes_at = bucket_bounds("monthly", TS)
+    assert key == "2026-10"
+    assert closes_at == datetime(2026, 11, 1, tzinfo=timezone.utc)
+
+
+def test_december_rolls_into_next_year():
+    ts = datetime(2026, 12, 31, 23, 59, tzinfo=timezone.utc).timestamp()
+    assert bucket_bounds("monthly", ts)[1] == datetime(2027, 1, 1, tzinfo=timezone.utc)
+
+
+def test_expiry_adds_retention():
+    key, expires_at = bucket_expiry("weekly", TS)
+    assert expires_at == datetime(2026, 10, 19, tzinfo=timezone.utc) + ROLLUP_RETENTION["weekly"]
+
+
+def test_invalid_period():
+    with pytest.raises(ValueError):
+        bucket_bounds("yearly", TS)
+
+
+def test_rollup_buckets_covers_every_period():
+    assert set(rollup_buckets(TS)) == set(ROLLUP_RETENTION)
+
+
+@pytest.mark.parametrize("ts", [1e20, 253402300800, float("inf"), float("nan"), -1e20])
+def test_rollup_buckets_rejects_unrepresentable_times(ts):
+    with pytest.raises(ValueError):
+        rollup_buckets(ts)
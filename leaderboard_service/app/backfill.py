@@ -0,0 +1,79 @@
+# leaderboard_service/app/backfill.py
+"""
+One-off backfill of the `user_stats` collection from existing sessions.
+
+The game service keeps `user_stats` (and the windowed `user_stats_rollups`)
+up to date as games finish, so this only needs to run once (before the new
+game service goes live) to fold in the history that predates it. The
+indexes come from indexes.py and are created here as well, since $merge
+needs the unique one on user_id:
+
+    python -m leaderboard_service.app.backfill
+"""
+import asyncio
+
+from .db import get_db
+from .indexes import INDEXES
+
+USER_STATS_INDEXES = INDEXES["user_stats"]
+ROLLUP_INDEXES = INDEXES["user_stats_rollups"]
+
+
+async def ensure_user_stats_indexes(db) -> None:
+    # create_indexes is a no-op for indexes that already exist
+    await db.user_stats.create_indexes(USER_STATS_INDEXES)
+    await db.user_stats_rollups.create_indexes(ROLLUP_INDEXES)
+
+
+async def backfill_user_stats(db) -> int:
+    """
+    Rebuild every user_stats document from the finished sessions and
+    return the number of users written.
+    """
+    # $merge needs the unique index on user_id
+    await ensure_user_stats_indexes(db)
+
+    pipeline = [
+        {"$match": {"finished_at": {"$ne": None}}},
+        {"$project": {"user_id": 1, "scores": 1}},
+        {"$unwind": "$user_id"},
+        {"$set": {"user_score": {"$getField": {"field": "$user_id", "input": "$scores"}}}},
+        {"$group": {
+            "_id": "$user_id",
+            "totalGames": {"$sum": 1},
+            "totalScores": {"$sum": "$user_score"},
+            "bestScore": {"$max": "$user_score"},
+        }},
+        # Display names are denormalized onto user_stats (one join, here only)
+        {"$lookup": {
+            "from": "users",
+            "localField": "_id",
+            "foreignField": "user_id",
+            "as": "user",
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id",
+            "userName": {"$first": "$user.loging"},
+            "totalGames": 1,
+            "totalScores": 1,
+            "bestScore": 1,
+        }},
+        {"$merge": {
+            "into": "user_stats",
+            "on": "user_id",
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+    await db.sessions.aggregate(pipeline).to_list(length=None)
+    return await db.user_stats.count_documents({})
+
+
+async def main():
+    written = await backfill_user_stats(get_db())
+    print(f"user_stats backfilled for {written} users")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
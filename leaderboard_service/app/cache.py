@@ -0,0 +1,115 @@
+# leaderboard_service/app/cache.py
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+LEADERBOARD_CACHE_TTL = float(os.getenv("LEADERBOARD_CACHE_TTL", "5"))
+LEADERBOARD_CACHE_STALE_TTL = float(os.getenv("LEADERBOARD_CACHE_STALE_TTL", "30"))
+LEADERBOARD_CACHE_MAX_ENTRIES = int(os.getenv("LEADERBOARD_CACHE_MAX_ENTRIES", "256"))
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class TTLCache:
+    """
+    In-process cache for leaderboard reads.
+
+    - entries younger than `ttl` are served as-is
+    - entries younger than `ttl + stale_ttl` are served stale while a single
+      background task reloads them (stale-while-revalidate)
+    - anything older is a miss; concurrent misses for the same key share one
+      in-flight load instead of each hitting Mongo
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        max_entries: int = 256,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Tuple[Hashable, int], asyncio.Task] = {}
+        # Bumped on invalidate() so loads started earlier are not stored
+        self._generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    async def get(self, key: Hashable, loader: Loader) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = self._clock() - stored_at
+            if age < self.ttl:
+                self.hits += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._load(key, loader)
+                return value
+
+        self.misses += 1
+        # shield: a cancelled request must not cancel the load other callers wait on
+        return await asyncio.shield(self._load(key, loader))
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one key, or everything when no key is given."""
+        self._generation += 1
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "entries": len(self._entries),
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+        }
+
+    def _load(self, key: Hashable, loader: Loader) -> asyncio.Task:
+        # Keyed by generation too: a caller arriving after invalidate() must
+        # not join a load that started before it
+        inflight = (key, self._generation)
+        task = self._inflight.get(inflight)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, loader, self._generation))
+            self._inflight[inflight] = task
+            # Background refreshes may fail with nobody awaiting them
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _run(self, key: Hashable, loader: Loader, generation: int) -> Any:
+        self.refreshes += 1
+        try:
+            value = await loader()
+            if generation == self._generation:
+                self._store(key, value)
+            return value
+        finally:
+            self._inflight.pop((key, generation), None)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._entries.pop(key, None)
+        while self._entries and len(self._entries) >= self.max_entries:
+            # dicts keep insertion order, so this is the least recently stored
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (self._clock(), value)
+
+
+leaderboard_cache = TTLCache(
+    ttl=LEADERBOARD_CACHE_TTL,
+    stale_ttl=LEADERBOARD_CACHE_STALE_TTL,
+    max_entries=LEADERBOARD_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,62 @@
+# leaderboard_service/app/conditional.py
+"""
+Conditional GET for leaderboard reads.
+
+A leaderboard response only changes when the standings version changes
+(bumped by the game service on every finished game) or, for the
+daily/weekly/monthly windows, when a new rollup bucket starts. ETags are
+built from those, so a client or proxy that already holds the current one
+gets an empty 304 before the route touches Mongo.
+"""
+import os
+from typing import Optional
+
+from fastapi import Request, Response
+
+LEADERBOARD_HTTP_MAX_AGE = int(os.getenv("LEADERBOARD_HTTP_MAX_AGE", "5"))
+LEADERBOARD_HTTP_STALE = int(os.getenv("LEADERBOARD_HTTP_STALE", "30"))
+
+# Public boards are the same for everyone, so a shared proxy may serve them
+PUBLIC_CACHE_CONTROL = (
+    f"public, max-age={LEADERBOARD_HTTP_MAX_AGE}, stale-while-revalidate={LEADERBOARD_HTTP_STALE}"
+)
+# Per-user reads: browser cache only, always revalidated via the ETag
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(version: Optional[int], *parts) -> Optional[str]:
+    if version is None:
+        return None
+    return 'W/"' + ".".join(str(p) for p in (version, *parts)) + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def conditional_response(
+    request: Request, response: Response, etag: Optional[str], private: bool = False
+) -> Optional[Response]:
+    """
+    Sets the caching headers on `response`. Returns a bare 304 to send
+    instead when the client's If-None-Match already matches `etag`.
+    """
+    headers = {"Cache-Control": PRIVATE_CACHE_CONTROL if private else PUBLIC_CACHE_CONTROL}
+    if private:
+        headers["Vary"] = "Authorization"
+    if etag is not None:
+        # No ETag until the standings watcher has read the version once
+        headers["ETag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -1,88 +1,419 @@
-from typing import List, Optional
+import asyncio
+import base64
+import json
+from typing import List, Optional, Tuple, Union
 from .db import get_db
 from .models import LeaderboardEntry
+from .windows import WINDOWS, current_bucket
+from .sketch import EXACT_RANK_TOP_N, KLLSketch
+
+# Score fields maintained on every user_stats document (see backfill.py)
+SCORE_FIELDS = ("totalScores", "bestScore")
+
+# URL slug of each board -> score field it ranks by
+METRICS = {"total-score": "totalScores", "best-single-run": "bestScore"}
+
+# Position on a board: (score, user_id) of the last entry of a page, then
+# its place and how many entries up to it share that place. Cursors issued
+# before places were carried have no place (None, None).
+Cursor = Tuple[Union[int, float], str, Optional[int], Optional[int]]
+
+
+def encode_cursor(page: List[dict], group_by: str, after: Optional[Cursor] = None) -> str:
+    """
+    Cursor past the last entry of `page`, which was read after `after`
+    (None for the first page).
+    """
+    last = page[-1]
+    state = [last[group_by], last["id"]]
+    tied = sum(1 for entry in page if entry["place"] == last["place"])
+    if tied == len(page) and after is not None and after[0] == last[group_by]:
+        # The tie started on an earlier page
+        if after[3] is not None:
+            state += [last["place"], tied + after[3]]
+    else:
+        state += [last["place"], tied]
+    raw = json.dumps(state, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) == 2:
+            (score, user_id), place, tied = values, None, None
+        else:
+            score, user_id, place, tied = values
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not isinstance(user_id, str):
+        raise ValueError("Invalid cursor")
+    if place is not None and not all(type(n) is int and n > 0 for n in (place, tied)):
+        raise ValueError("Invalid cursor")
+    return score, user_id, place, tied
+
 
 async def get_leaderboard(
     group_by: str = "totalScores",
     me_only: bool = False,
     current_user_id: Optional[str] = None,
-    limit: int = 10
+    limit: int = 10,
+    window: str = "all",
+    sketch: Optional[KLLSketch] = None,
 ) -> List[LeaderboardEntry]:
     db = get_db()
 
-    # Determine the score calculation
-    if group_by == "totalScores":
-        score_field = {"totalScores": {"$sum": "$user_score"}}
-        sort_field = "totalScores"
-    elif group_by == "bestScore":
-        score_field = {"bestScore": {"$max": "$user_score"}}
-        sort_field = "bestScore"
-    else:
+    if group_by not in SCORE_FIELDS:
         raise ValueError("Invalid group_by value")
+    sort_field = group_by
 
-    pipeline = [
-        # 1️⃣ Only finished sessions
-        {"$match": {"finished_at": {"$ne": None}}},
-
-        # 2️⃣ Convert user_id array and scores dict into one document per user
-        {"$project": {
-            "user_id": 1,
-            "scores": 1,
-            "finished_at": 1
-        }},
-        {"$unwind": "$user_id"},
-        {"$set": {"user_score": {"$getField": {"field": "$user_id", "input": "$scores"}}}},
-
-        # 3️⃣ Group by user
-        {"$group": {
-            "_id": "$user_id",
-            "totalGames": {"$sum": 1},
-            **score_field
-        }},
-
-        # 🔹 Join users collection to get loging
-        {
-            "$lookup": {
-              "from": "users",
-              "localField": "_id",
-              "foreignField": "user_id",
-              "as": "user"
-          }
-        },
-        {"$unwind": "$user"},
-
-        # 5️⃣ Sort by score descending
-        {"$sort": {sort_field: -1}},
-
-        # 6️⃣ Rank users
-        {"$setWindowFields": {
-            "sortBy": {sort_field: -1},
-            "output": {"place": {"$rank": {}}}
-        }},
-    ]
-
-    # 7️⃣ Apply limit for public leaderboard
-    if limit and not me_only:
-        pipeline.append({"$limit": limit})
-
-    # 8️⃣ Filter for current user if me_only
+    # A single user's rank never needs the whole board
     if me_only:
         if not current_user_id:
             raise ValueError("current_user_id must be provided when me_only is True")
-        pipeline.append({"$match": {"_id": current_user_id}})
-
-    # 9️⃣ Final projection
-    pipeline.append({
-        "$project": {
-            "id": "$_id",
-            "userName": "$user.loging",
-            "totalGames": 1,
-            group_by: 1,
-            "place": 1,
-            "_id": 0
-        }
-    })
-
-    cursor = db.sessions.aggregate(pipeline)
-    data = await cursor.to_list(length=limit if not me_only else 1)
-    return data
\ No newline at end of file
+        entry = await get_user_rank(group_by, current_user_id, window=window, sketch=sketch)
+        return [entry] if entry else []
+
+    # Walk the {score: -1, user_id: 1} index of the per-user stats; names
+    # are stored on the stats documents, so there is no join on users
+    collection, base = _source(db, window)
+    rows = await (
+        collection.find(base, _projection(sort_field))
+        .sort([(sort_field, -1), ("user_id", 1)])
+        .limit(limit)
+        .to_list(length=limit)
+    )
+    return _places_after(rows, group_by, None, 1, 0)
+
+
+def _source(db, window: str):
+    """
+    Collection and filter holding the board for `window`: all-time stats,
+    or only the current period's rollup bucket.
+    """
+    if window == "all":
+        return db.user_stats, {}
+    if window not in WINDOWS:
+        raise ValueError("Invalid window")
+    return db.user_stats_rollups, {"period": window, "bucket": current_bucket(window)}
+
+
+def _projection(group_by: str) -> dict:
+    return {"_id": 0, "user_id": 1, "userName": 1, "totalGames": 1, group_by: 1}
+
+
+async def get_user_rank(
+    group_by: str, user_id: str, window: str = "all", sketch: Optional[KLLSketch] = None
+) -> Optional[dict]:
+    """
+    Leaderboard entry of a single user without ranking everyone else.
+
+    The place is 1 + the number of users with a strictly higher score,
+    which is exactly what $rank assigns, and the count is answered from
+    the {score: -1, user_id: 1} index.
+
+    With an all-time `sketch` the count is estimated from it instead, unless
+    the user might be within the top EXACT_RANK_TOP_N; such entries are
+    marked "approximate".
+    """
+    if group_by not in SCORE_FIELDS:
+        raise ValueError("Invalid group_by value")
+
+    if sketch is not None and window == "all":
+        return await _approximate_rank(group_by, user_id, sketch)
+
+    standings = await get_user_standings(user_id, window, group_bys=(group_by,))
+    return standings.get(group_by)
+
+
+async def _approximate_rank(group_by: str, user_id: str, sketch: KLLSketch) -> Optional[dict]:
+    collection = get_db().user_stats
+    stats = await collection.find_one({"user_id": user_id}, _projection(group_by))
+    if not stats:
+        return None
+
+    higher = sketch.count_greater(stats.get(group_by))
+    if higher < EXACT_RANK_TOP_N + sketch.error_bound():
+        # Near the top the sketch error is as large as the place itself
+        higher = await collection.count_documents({group_by: {"$gt": stats.get(group_by)}})
+        return _entry(stats, group_by, higher + 1)
+    return {**_entry(stats, group_by, higher + 1), "approximate": True}
+
+
+async def get_user_standings(
+    user_id: str, window: str = "all", group_bys: Tuple[str, ...] = SCORE_FIELDS
+) -> dict:
+    """
+    The user's entry on every board in `group_bys`, keyed by score field.
+
+    All boards rank the same per-user stats document, so it is read once
+    and only the per-board index counts run (concurrently). Empty if the
+    user has no stats.
+    """
+    for group_by in group_bys:
+        if group_by not in SCORE_FIELDS:
+            raise ValueError("Invalid group_by value")
+
+    collection, base = _source(get_db(), window)
+    projection = {"_id": 0, "user_id": 1, "userName": 1, "totalGames": 1, **{g: 1 for g in group_bys}}
+    stats = await collection.find_one({**base, "user_id": user_id}, projection)
+    if not stats:
+        return {}
+
+    counts = await asyncio.gather(*(
+        collection.count_documents({**base, group_by: {"$gt": stats.get(group_by)}})
+        for group_by in group_bys
+    ))
+    return {
+        group_by: _entry(stats, group_by, higher + 1)
+        for group_by, higher in zip(group_bys, counts)
+    }
+
+
+async def get_user_ranks(group_by: str, user_ids: List[str], window: str = "all") -> List[dict]:
+    """
+    Leaderboard entries for many users at once, in the order asked for.
+
+    One $in read fetches every score, then one index count per distinct
+    score runs concurrently, so a whole results screen is a single round
+    of lookups. Unknown users are left out.
+    """
+    if group_by not in SCORE_FIELDS:
+        raise ValueError("Invalid group_by value")
+
+    collection, base = _source(get_db(), window)
+    user_ids = list(dict.fromkeys(user_ids))
+    rows = await collection.find(
+        {**base, "user_id": {"$in": user_ids}}, _projection(group_by)
+    ).to_list(length=len(user_ids))
+    by_id = {row["user_id"]: row for row in rows}
+
+    scores = list({row[group_by] for row in rows})
+    counts = await asyncio.gather(*(
+        collection.count_documents({**base, group_by: {"$gt": score}}) for score in scores
+    ))
+    higher = dict(zip(scores, counts))
+
+    return [
+        _entry(by_id[uid], group_by, higher[by_id[uid][group_by]] + 1)
+        for uid in user_ids
+        if uid in by_id
+    ]
+
+
+async def get_user_score(group_by: str, user_id: str) -> Optional[int]:
+    if group_by not in SCORE_FIELDS:
+        raise ValueError("Invalid group_by value")
+    stats = await get_db().user_stats.find_one({"user_id": user_id}, {"_id": 0, group_by: 1})
+    return stats.get(group_by) if stats else None
+
+
+async def get_score_histogram(group_by: str) -> dict:
+    """
+    Score distribution from the bucket counts the game service maintains
+    (game_service/app/histogram.py). Reads a fixed number of bucket
+    documents, however many players there are.
+    """
+    if group_by not in SCORE_FIELDS:
+        raise ValueError("Invalid group_by value")
+
+    buckets = await (
+        get_db().score_histogram.find(
+            {"metric": group_by, "count": {"$gt": 0}},
+            {"_id": 0, "lo": 1, "hi": 1, "count": 1},
+        )
+        .sort("lo", 1)
+        .to_list(length=None)
+    )
+    return {"metric": group_by, "total": sum(b["count"] for b in buckets), "buckets": buckets}
+
+
+def percentile_from_histogram(buckets: List[dict], score: int) -> dict:
+    """
+    Share (in %) of players with a strictly lower score than `score`.
+
+    Buckets entirely below `score` are counted exactly. The other players in
+    the caller's own bucket may or may not be below, so the exact value lies
+    in [lower, upper] and `percentile` is their midpoint: the error is at
+    most half the share of players in that bucket. Width-1 buckets (low
+    scores) hold a single score, so there the answer is exact.
+    """
+    total = below = same = 0
+    same_width = 1
+    for bucket in buckets:
+        total += bucket["count"]
+        if bucket["hi"] <= score:
+            below += bucket["count"]
+        elif bucket["lo"] <= score:
+            same = bucket["count"]
+            same_width = bucket["hi"] - bucket["lo"]
+
+    if not total:
+        return {"percentile": 0.0, "lower": 0.0, "upper": 0.0, "totalPlayers": 0}
+
+    # The caller is one of the players in their bucket
+    others = max(same - 1, 0) if same_width > 1 else 0
+    lower = 100.0 * below / total
+    upper = 100.0 * (below + others) / total
+    return {
+        "percentile": (lower + upper) / 2,
+        "lower": lower,
+        "upper": upper,
+        "totalPlayers": total,
+    }
+
+
+async def get_leaderboard_page(group_by: str, after: Cursor, limit: int, window: str = "all") -> List[dict]:
+    """
+    The `limit` entries that follow `after` on the board.
+
+    Seeks the {score: -1, user_id: 1} index from the cursor position instead
+    of skipping, and continues the places from the place and tie count the
+    cursor carries, so every page costs the same as the first one. Places
+    are those of the walk: a user who moves past the cursor meanwhile does
+    not shift the pages after it. Cursors without a place fall back to
+    counting the users above the page.
+    """
+    if group_by not in SCORE_FIELDS:
+        raise ValueError("Invalid group_by value")
+
+    collection, base = _source(get_db(), window)
+    score, user_id, place, tied = after
+    query = {**base, "$or": [
+        {group_by: {"$lt": score}},
+        {group_by: score, "user_id": {"$gt": user_id}},
+    ]}
+    rows = await (
+        collection.find(query, _projection(group_by))
+        .sort([(group_by, -1), ("user_id", 1)])
+        .limit(limit)
+        .to_list(length=limit)
+    )
+    if place is None:
+        return await _finalize_rows(collection, base, group_by, rows)
+    return _places_after(rows, group_by, score, place, tied)
+
+
+async def get_leaderboard_around(group_by: str, user_id: str, radius: int, window: str = "all") -> List[dict]:
+    """
+    The `radius` users directly above and below `user_id`, plus the user.
+
+    Both sides are index range scans that seek from the caller's
+    (score, user_id) position and read `radius` entries each. Places need
+    one count of the users scoring higher than the caller, which walks the
+    index down to the caller's score and so grows with their rank, like the
+    /me place does. Every other place follows from that count, the slice
+    itself, and two bounded counts: the users between the caller's score and
+    the highest one shown, and the users tied with the caller.
+    """
+    if group_by not in SCORE_FIELDS:
+        raise ValueError("Invalid group_by value")
+
+    collection, base = _source(get_db(), window)
+    projection = _projection(group_by)
+    me = await collection.find_one({**base, "user_id": user_id}, projection)
+    if not me:
+        return []
+
+    score = me.get(group_by)
+    above_query = {**base, "$or": [
+        {group_by: {"$gt": score}},
+        {group_by: score, "user_id": {"$lt": user_id}},
+    ]}
+    below_query = {**base, "$or": [
+        {group_by: {"$lt": score}},
+        {group_by: score, "user_id": {"$gt": user_id}},
+    ]}
+
+    above, below = await asyncio.gather(
+        collection.find(above_query, projection)
+        .sort([(group_by, 1), ("user_id", -1)])
+        .limit(radius)
+        .to_list(length=radius),
+        collection.find(below_query, projection)
+        .sort([(group_by, -1), ("user_id", 1)])
+        .limit(radius)
+        .to_list(length=radius),
+    )
+
+    # Scores other than the caller's, nearest first on both sides
+    higher_scores = [row[group_by] for row in above if row[group_by] != score]
+    lower_scores = [row[group_by] for row in below if row[group_by] != score]
+    top = higher_scores[-1] if higher_scores else score
+
+    counts = [collection.count_documents({**base, group_by: {"$gt": score}})]
+    if higher_scores:
+        # Users at the top score may continue above the slice
+        counts.append(collection.count_documents({**base, group_by: {"$gt": score, "$lte": top}}))
+    if lower_scores:
+        counts.append(collection.count_documents({**base, group_by: score}))
+    counts = await asyncio.gather(*counts)
+    higher = counts[0]
+
+    # place = 1 + number of users with a strictly higher score
+    places = {score: higher + 1}
+    for s in set(higher_scores):
+        between = counts[1] if s == top else sum(1 for x in higher_scores if x <= s)
+        places[s] = higher + 1 - between
+    for s in set(lower_scores):
+        places[s] = higher + counts[-1] + 1 + sum(1 for x in lower_scores if x > s)
+
+    rows = list(reversed(above)) + [me] + below
+    return [_entry(row, group_by, places[row[group_by]]) for row in rows]
+
+
+def _places_after(rows: List[dict], group_by: str, score, place: int, tied: int) -> List[dict]:
+    """
+    Leaderboard entries for rows that directly follow an entry at `score`
+    and `place`, `tied` entries having had that place so far.
+    """
+    entries = []
+    for row in rows:
+        if row[group_by] == score:
+            tied += 1
+        else:
+            score, place, tied = row[group_by], place + tied, 1
+        entries.append(_entry(row, group_by, place))
+    return entries
+
+
+async def _finalize_rows(collection, base: dict, group_by: str, rows: List[dict]) -> List[dict]:
+    """
+    Turn a contiguous slice of a board (sorted by score desc) into
+    leaderboard entries with tie-aware places, anchored on two index
+    counts around the first row's score.
+    """
+    if not rows:
+        return []
+
+    top = rows[0][group_by]
+    higher, at_least_top = await asyncio.gather(
+        collection.count_documents({**base, group_by: {"$gt": top}}),
+        collection.count_documents({**base, group_by: {"$gte": top}}),
+    )
+
+    entries = []
+    place = higher + 1
+    below_top = 0
+    previous = top
+    for row in rows:
+        row_score = row[group_by]
+        if row_score != top:
+            # Everything between the top score and this one is inside the slice
+            if row_score != previous:
+                place = at_least_top + 1 + below_top
+            below_top += 1
+        previous = row_score
+        entries.append(_entry(row, group_by, place))
+    return entries
+
+
+def _entry(row: dict, group_by: str, place: int) -> dict:
+    return {
+        "id": row["user_id"],
+        "userName": row.get("userName") or "Unknown",
+        "totalGames": row["totalGames"],
+        group_by: row[group_by],
+        "place": place,
+    }
@@ -0,0 +1,109 @@
+# leaderboard_service/app/live.py
+"""
+Live top-N leaderboards pushed to WebSocket subscribers.
+
+Every board is computed once per standings change and fanned out to all of
+its subscribers as a compact diff against the previous board:
+
+    {"type": "snapshot", "version": 7, "entries": [...]}
+    {"type": "diff", "version": 8,
+     "entered": [entry, ...],           # new in the top N
+     "left": ["user_id", ...],          # dropped out of the top N
+     "moved": [entry, ...]}             # still in, place or score changed
+
+Slow consumers: each subscriber has a bounded queue (LIVE_QUEUE_SIZE). When
+a diff arrives and the queue is full, the pending messages are dropped and
+replaced by a single snapshot of the current board, so a lagging client
+catches up with one message instead of replaying every diff it missed.
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Optional, Set
+
+LIVE_TOP_N = int(os.getenv("LIVE_TOP_N", "10"))
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "8"))
+
+BoardLoader = Callable[[], Awaitable[List[dict]]]
+
+
+def diff_boards(old: List[dict], new: List[dict], group_by: str) -> dict:
+    old_by_id = {entry["id"]: entry for entry in old}
+    new_ids = {entry["id"] for entry in new}
+
+    entered, moved = [], []
+    for entry in new:
+        previous = old_by_id.get(entry["id"])
+        if previous is None:
+            entered.append(entry)
+        elif previous["place"] != entry["place"] or previous.get(group_by) != entry.get(group_by):
+            moved.append(entry)
+
+    left = [entry["id"] for entry in old if entry["id"] not in new_ids]
+    return {"entered": entered, "left": left, "moved": moved}
+
+
+class Subscriber:
+    def __init__(self, maxsize: int = LIVE_QUEUE_SIZE):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.coalesced = 0
+
+    def offer(self, message: dict, snapshot: Callable[[], dict]) -> None:
+        if self.queue.full():
+            # Coalesce: the client gets the current board instead of the backlog
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.coalesced += 1
+            message = snapshot()
+        self.queue.put_nowait(message)
+
+
+class LiveBoard:
+    """One shared top-N board for a score field, fanned out to subscribers."""
+
+    def __init__(self, group_by: str, loader: BoardLoader):
+        self.group_by = group_by
+        self._loader = loader
+        self._board: Optional[List[dict]] = None
+        self._version: Optional[int] = None
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = asyncio.Lock()
+
+    def snapshot(self) -> dict:
+        return {"type": "snapshot", "version": self._version, "entries": self._board or []}
+
+    async def subscribe(self) -> Subscriber:
+        subscriber = Subscriber()
+        async with self._lock:
+            if self._board is None:
+                self._board = await self._loader()
+        subscriber.offer(self.snapshot(), self.snapshot)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    async def on_standings_changed(self, version: int) -> None:
+        self._version = version
+        if not self._subscribers:
+            # Nobody is watching; the next subscriber loads a fresh board
+            self._board = None
+            return
+
+        async with self._lock:
+            new_board = await self._loader()
+            changes = diff_boards(self._board or [], new_board, self.group_by)
+            self._board = new_board
+
+        if not any(changes.values()):
+            return
+        message = {"type": "diff", "version": version, **changes}
+        for subscriber in list(self._subscribers):
+            subscriber.offer(message, self.snapshot)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "coalesced": sum(s.coalesced for s in self._subscribers),
+        }
+
@@ -1,12 +1,51 @@
 # leaderboard_service/app/main.py
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-from .models import LeaderboardEntry
-from .crud import get_leaderboard
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+import asyncio
+import os
+from .models import LeaderboardEntry, RankEntry, RanksRequest, HistogramResponse, PercentileResponse
+from .crud import (
+    get_leaderboard,
+    get_leaderboard_around,
+    get_leaderboard_page,
+    get_user_ranks,
+    get_user_standings,
+    get_user_score,
+    get_score_histogram,
+    percentile_from_histogram,
+    encode_cursor,
+    decode_cursor,
+    METRICS,
+)
+from .cache import leaderboard_cache
+from .windows import Window, current_bucket
+from .conditional import make_etag, conditional_response
+from .standings import standings_watcher
+from .sketch import RANK_SKETCHES, rank_sketches
+from .indexes import APPLY_INDEXES_ON_STARTUP, bootstrap_indexes
+from .live import LiveBoard, LIVE_TOP_N
 from leaderboard_service.app.auth_deps import get_current_user, TokenData
 
-app = FastAPI(title="Aim Clicker Leaderboard Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if APPLY_INDEXES_ON_STARTUP:
+        await bootstrap_indexes()
+    standings_watcher.start()
+    if RANK_SKETCHES:
+        rank_sketches.start()
+    yield
+    await rank_sketches.stop()
+    await standings_watcher.stop()
+
+
+app = FastAPI(title="Aim Clicker Leaderboard Service", lifespan=lifespan)
+
+AROUND_ME_MAX_RADIUS = 50
+LEADERBOARD_MAX_PAGE_SIZE = int(os.getenv("LEADERBOARD_MAX_PAGE_SIZE", "100"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,32 +53,249 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "leaderboard_cache": leaderboard_cache.stats(),
+        "standings_version": standings_watcher.version,
+        "rank_sketches": rank_sketches.stats(),
+        "live": {group_by: board.stats() for group_by, board in live_boards.items()},
+    }
+
+def resolve_metric(metric: str) -> str:
+    group_by = METRICS.get(metric)
+    if not group_by:
+        raise HTTPException(status_code=404, detail="Unknown leaderboard")
+    return group_by
+
+async def cached_leaderboard(group_by: str, limit: int, window: str = "all"):
+    # Public boards are identical for every caller, so they share one cache entry
+    return await leaderboard_cache.get(
+        (group_by, window, limit),
+        lambda: get_leaderboard(group_by=group_by, limit=limit, me_only=False, window=window),
+    )
+
+# One shared top-N board per metric for all live subscribers
+live_boards = {
+    group_by: LiveBoard(group_by, lambda g=group_by: cached_leaderboard(g, LIVE_TOP_N))
+    for group_by in METRICS.values()
+}
+
+async def on_standings_changed(version: int):
+    # Invalidate first so the live boards below recompute from Mongo
+    leaderboard_cache.invalidate()
+    for board in live_boards.values():
+        await board.on_standings_changed(version)
+
+standings_watcher.add_listener(on_standings_changed)
+
+def not_modified(request: Request, response: Response, window: str = "all", private: bool = False, extra: tuple = ()):
+    # Windowed boards also change when a new day/week/month bucket starts
+    parts = () if window == "all" else (current_bucket(window),)
+    etag = make_etag(standings_watcher.version, *parts, *extra)
+    return conditional_response(request, response, etag, private)
+
+def sketch_etag(sketch) -> tuple:
+    # Approximate places move when the sketch is rebuilt, not per game
+    return ("approx", int(rank_sketches.built_at or 0)) if sketch is not None else ()
+
+async def leaderboard_page(
+    request: Request, response: Response, group_by: str, limit: int, cursor: Optional[str], window: str = "all"
+):
+    """
+    First page comes from the cache, later pages seek from the cursor.
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    cached = not_modified(request, response, window)
+    if cached is not None:
+        return cached
+
+    limit = min(limit, LEADERBOARD_MAX_PAGE_SIZE)
+
+    after = None
+    if cursor is None:
+        data = await cached_leaderboard(group_by, limit, window)
+    else:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        data = await get_leaderboard_page(group_by, after, limit, window)
+
+    if len(data) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(data, group_by, after)
+    return data
+
 @app.get("/leaderboard/total-score", response_model=List[LeaderboardEntry])
-async def leaderboard_total_score(limit: int = 10):
-    return await get_leaderboard(group_by="totalScores", limit=limit, me_only=False)
+async def leaderboard_total_score(
+    request: Request,
+    response: Response,
+    limit: int = Query(10, ge=1),
+    cursor: Optional[str] = None,
+    window: Window = "all",
+):
+    return await leaderboard_page(request, response, "totalScores", limit, cursor, window)
+
+@app.get("/leaderboard/total-score/me", response_model=RankEntry)
+async def leaderboard_total_score_me(
+    request: Request,
+    response: Response,
+    window: Window = "all",
+    approximate: bool = False,
+    current_user: TokenData = Depends(get_current_user),
+):
+    sketch = rank_sketches.get("totalScores") if approximate else None
+    cached = not_modified(request, response, window, private=True, extra=sketch_etag(sketch))
+    if cached is not None:
+        return cached
 
-@app.get("/leaderboard/total-score/me", response_model=LeaderboardEntry)
-async def leaderboard_total_score_me(current_user: TokenData = Depends(get_current_user)):
-    data = await get_leaderboard(group_by="totalScores", me_only=True, current_user_id=current_user.user_id)
+    data = await get_leaderboard(
+        group_by="totalScores", me_only=True, current_user_id=current_user.user_id, window=window, sketch=sketch
+    )
     if not data:
         raise HTTPException(status_code=404, detail="User not found")
     else:
         return data[0]
 
 @app.get("/leaderboard/best-single-run", response_model=List[LeaderboardEntry])
-async def leaderboard_best_single_run(limit: int = 10):
-    return await get_leaderboard(group_by="bestScore", limit=limit, me_only=False) 
+async def leaderboard_best_single_run(
+    request: Request,
+    response: Response,
+    limit: int = Query(10, ge=1),
+    cursor: Optional[str] = None,
+    window: Window = "all",
+):
+    return await leaderboard_page(request, response, "bestScore", limit, cursor, window)
 
-@app.get("/leaderboard/best-single-run/me", response_model=LeaderboardEntry)
-async def leaderboard_best_single_run_me(current_user: TokenData = Depends(get_current_user)):
-    data = await get_leaderboard(group_by="bestScore", me_only=True, current_user_id=current_user.user_id)
+@app.get("/leaderboard/best-single-run/me", response_model=RankEntry)
+async def leaderboard_best_single_run_me(
+    request: Request,
+    response: Response,
+    window: Window = "all",
+    approximate: bool = False,
+    current_user: TokenData = Depends(get_current_user),
+):
+    sketch = rank_sketches.get("bestScore") if approximate else None
+    cached = not_modified(request, response, window, private=True, extra=sketch_etag(sketch))
+    if cached is not None:
+        return cached
+
+    data = await get_leaderboard(
+        group_by="bestScore", me_only=True, current_user_id=current_user.user_id, window=window, sketch=sketch
+    )
     if not data:
         raise HTTPException(status_code=404, detail="User not found")
     else:
         return data[0]
+
+
+@app.get("/leaderboard/me", response_model=Dict[str, LeaderboardEntry])
+async def leaderboard_me(
+    request: Request,
+    response: Response,
+    window: Window = "all",
+    current_user: TokenData = Depends(get_current_user),
+):
+    """The caller's entry on every board, keyed by board slug, from one stats read."""
+    cached = not_modified(request, response, window, private=True)
+    if cached is not None:
+        return cached
+
+    standings = await get_user_standings(current_user.user_id, window)
+    if not standings:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {metric: standings[group_by] for metric, group_by in METRICS.items()}
+
+
+@app.get("/leaderboard/{metric}/around-me", response_model=List[LeaderboardEntry])
+async def leaderboard_around_me(
+    request: Request,
+    response: Response,
+    metric: str,
+    radius: int = Query(5, ge=1, le=AROUND_ME_MAX_RADIUS),
+    window: Window = "all",
+    current_user: TokenData = Depends(get_current_user),
+):
+    group_by = resolve_metric(metric)
+    cached = not_modified(request, response, window, private=True)
+    if cached is not None:
+        return cached
+
+    data = await get_leaderboard_around(group_by, current_user.user_id, radius, window)
+    if not data:
+        raise HTTPException(status_code=404, detail="User not found")
+    return data
+
+
+@app.post("/leaderboard/{metric}/ranks", response_model=List[LeaderboardEntry])
+async def leaderboard_ranks(
+    metric: str,
+    body: RanksRequest,
+    window: Window = "all",
+    current_user: TokenData = Depends(get_current_user),
+):
+    # Signed-in only: each distinct score costs a walk over the keys above it
+    return await get_user_ranks(resolve_metric(metric), body.user_ids, window)
+
+async def cached_histogram(group_by: str):
+    return await leaderboard_cache.get(("histogram", group_by), lambda: get_score_histogram(group_by))
+
+@app.get("/leaderboard/{metric}/histogram", response_model=HistogramResponse)
+async def leaderboard_histogram(request: Request, response: Response, metric: str):
+    group_by = resolve_metric(metric)
+    cached = not_modified(request, response)
+    if cached is not None:
+        return cached
+    return await cached_histogram(group_by)
+
+@app.get("/leaderboard/{metric}/percentile", response_model=PercentileResponse)
+async def leaderboard_percentile(
+    request: Request,
+    response: Response,
+    metric: str,
+    current_user: TokenData = Depends(get_current_user),
+):
+    group_by = resolve_metric(metric)
+    cached = not_modified(request, response, private=True)
+    if cached is not None:
+        return cached
+
+    score = await get_user_score(group_by, current_user.user_id)
+    if score is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    histogram = await cached_histogram(group_by)
+    return {"id": current_user.user_id, "score": score, **percentile_from_histogram(histogram["buckets"], score)}
+
+@app.websocket("/leaderboard/{metric}/live")
+async def leaderboard_live(websocket: WebSocket, metric: str):
+    group_by = METRICS.get(metric)
+    if not group_by:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    board = live_boards[group_by]
+    subscriber = await board.subscribe()
+
+    async def pump():
+        while True:
+            await websocket.send_json(await subscriber.queue.get())
+
+    sender = asyncio.ensure_future(pump())
+    try:
+        # Clients never send anything; this returns when they disconnect
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        board.unsubscribe(subscriber)
@@ -1,6 +1,10 @@
-from pydantic import BaseModel
+import os
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
+# Every distinct score in a ranks request is its own O(rank) index count
+RANKS_MAX_USER_IDS = int(os.getenv("RANKS_MAX_USER_IDS", "20"))
+
 class LeaderboardEntry(BaseModel):
     id: str
     userName: str
@@ -8,3 +12,28 @@ class LeaderboardEntry(BaseModel):
     totalScores: Optional[int] = None
     bestScore: Optional[int] = None
     place: int
+
+class RankEntry(LeaderboardEntry):
+    # True when the place was estimated from the rank sketch
+    approximate: bool = False
+
+class RanksRequest(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1, max_length=RANKS_MAX_USER_IDS)
+
+class HistogramBucket(BaseModel):
+    lo: int
+    hi: int
+    count: int
+
+class HistogramResponse(BaseModel):
+    metric: str
+    total: int
+    buckets: List[HistogramBucket]
+
+class PercentileResponse(BaseModel):
+    id: str
+    score: int
+    percentile: float
+    lower: float
+    upper: float
+    totalPlayers: int
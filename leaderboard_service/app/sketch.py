@@ -0,0 +1,236 @@
+# leaderboard_service/app/sketch.py
+"""
+Approximate ranks for the long tail of the all-time boards.
+
+One KLL quantile sketch per score field summarizes every player's score in
+a few hundred retained values: levels of compactors, where a value kept at
+level h stands for 2^h players. With high probability the rank error is
+about RANK_ERROR_FACTOR * n / k, whatever the number of players. Two
+sketches merge into one with the same guarantee.
+
+Scores are not insert-only (totals grow and best scores move up), so the
+sketches are not fed game by game. They are rebuilt by one streaming pass
+over user_stats every RANK_SKETCH_REFRESH_INTERVAL seconds and persisted
+in `rank_sketches`. A worker that starts up, or finds a fresh persisted
+sketch, loads it instead of rescanning.
+
+The sketches are optional: set RANK_SKETCHES=1 to keep them. Otherwise
+nothing is scanned, and `/me?approximate=true` falls back to exact ranks.
+With several workers, only the one holding the rebuild lease (a document
+in `rank_sketches`, valid for one interval) rescans. The others load what
+it persisted.
+"""
+import asyncio
+import math
+import os
+import random
+import time
+import uuid
+from bisect import bisect_right
+from typing import Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from .db import get_db
+
+RANK_SKETCHES = os.getenv("RANK_SKETCHES", "0") == "1"
+
+RANK_SKETCH_K = int(os.getenv("RANK_SKETCH_K", "200"))
+RANK_SKETCH_REFRESH_INTERVAL = float(os.getenv("RANK_SKETCH_REFRESH_INTERVAL", "300"))
+# Places up to here are always counted exactly
+EXACT_RANK_TOP_N = int(os.getenv("EXACT_RANK_TOP_N", "1000"))
+
+# user_stats score fields (crud.SCORE_FIELDS)
+SKETCH_FIELDS = ("totalScores", "bestScore")
+RANK_ERROR_FACTOR = 1.7
+CAPACITY_DECAY = 2 / 3
+
+
+class KLLSketch:
+    def __init__(self, k: int = RANK_SKETCH_K, seed: Optional[int] = None):
+        self.k = k
+        self.n = 0
+        self.levels: List[List[float]] = [[]]
+        self._rng = random.Random(seed)
+        self._size = 0
+        self._max_size = self._capacity(0)
+        self._cdf = None
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * CAPACITY_DECAY ** depth)), 2)
+
+    def update(self, value: float) -> None:
+        self.levels[0].append(value)
+        self.n += 1
+        self._size += 1
+        self._cdf = None
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self._cdf = None
+        self._resize()
+        self._compress()
+
+    def _resize(self) -> None:
+        self._size = sum(len(items) for items in self.levels)
+        self._max_size = sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def _compress(self) -> None:
+        while self._size >= self._max_size:
+            for level, items in enumerate(self.levels):
+                if len(items) < self._capacity(level):
+                    continue
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items.sort()
+                # An odd one out stays behind so no weight is lost
+                keep = [items.pop()] if len(items) % 2 else []
+                # Every other value moves up with twice the weight
+                self.levels[level + 1].extend(items[self._rng.randint(0, 1)::2])
+                self.levels[level] = keep
+                break
+            self._resize()
+
+    def count_greater(self, value: float) -> int:
+        """Estimated number of items strictly greater than `value`."""
+        if self._cdf is None:
+            weighted = sorted(
+                (item, 1 << level) for level, items in enumerate(self.levels) for item in items
+            )
+            values = [item for item, _ in weighted]
+            above = [0] * (len(weighted) + 1)
+            for i in range(len(weighted) - 1, -1, -1):
+                above[i] = above[i + 1] + weighted[i][1]
+            self._cdf = (values, above)
+
+        values, above = self._cdf
+        return above[bisect_right(values, value)]
+
+    def error_bound(self) -> int:
+        return int(math.ceil(RANK_ERROR_FACTOR * self.n / self.k))
+
+    def retained(self) -> int:
+        return self._size
+
+    def to_doc(self) -> dict:
+        return {"k": self.k, "n": self.n, "levels": self.levels}
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "KLLSketch":
+        sketch = cls(doc["k"])
+        sketch.n = doc["n"]
+        sketch.levels = [list(items) for items in doc["levels"]] or [[]]
+        sketch._resize()
+        return sketch
+
+
+class RankSketches:
+    """Keeps the per-field sketches fresh; same lifecycle as StandingsWatcher."""
+
+    def __init__(self, interval: float = RANK_SKETCH_REFRESH_INTERVAL, k: int = RANK_SKETCH_K):
+        self.interval = interval
+        self.k = k
+        self.sketches: Dict[str, KLLSketch] = {}
+        self.built_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._holder = uuid.uuid4().hex
+        self.rebuilds = 0
+
+    def get(self, group_by: str) -> Optional[KLLSketch]:
+        return self.sketches.get(group_by)
+
+    async def load(self, db) -> bool:
+        docs = await db.rank_sketches.find({"_id": {"$in": list(SKETCH_FIELDS)}}).to_list(length=None)
+        if len(docs) < len(SKETCH_FIELDS):
+            return False
+        self.sketches = {doc["_id"]: KLLSketch.from_doc(doc) for doc in docs}
+        self.built_at = min(doc["built_at"] for doc in docs)
+        return True
+
+    async def rebuild(self, db) -> int:
+        """One streaming pass over user_stats; returns the number of players."""
+        sketches = {field: KLLSketch(self.k) for field in SKETCH_FIELDS}
+        players = 0
+        cursor = db.user_stats.find({}, {"_id": 0, **{field: 1 for field in SKETCH_FIELDS}}).batch_size(10_000)
+        async for doc in cursor:
+            players += 1
+            for field, sketch in sketches.items():
+                if doc.get(field) is not None:
+                    sketch.update(doc[field])
+
+        built_at = time.time()
+        await asyncio.gather(*(
+            db.rank_sketches.replace_one(
+                {"_id": field}, {**sketch.to_doc(), "built_at": built_at}, upsert=True
+            )
+            for field, sketch in sketches.items()
+        ))
+        self.sketches, self.built_at = sketches, built_at
+        return players
+
+    async def acquire_lease(self, db) -> bool:
+        """
+        Take (or extend) the rebuild lease for one interval. When another
+        worker holds an unexpired lease, the filter does not match, and the
+        upsert then fails on the _id.
+        """
+        now = time.time()
+        try:
+            await db.rank_sketches.find_one_and_update(
+                {"_id": "rebuild_lease", "$or": [{"expires_at": {"$lte": now}}, {"holder": self._holder}]},
+                {"$set": {"holder": self._holder, "expires_at": now + self.interval}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def refresh(self) -> None:
+        db = get_db()
+        if await self.load(db) and time.time() - self.built_at < self.interval:
+            return
+        if not await self.acquire_lease(db):
+            # Another worker is rebuilding; its sketches are loaded next round
+            return
+        await self.rebuild(db)
+        self.rebuilds += 1
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as exc:
+                print("rank sketch refresh failed:", repr(exc))
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": RANK_SKETCHES,
+            "built_at": self.built_at,
+            "rebuilds": self.rebuilds,
+            "players": {field: sketch.n for field, sketch in self.sketches.items()},
+            "retained": {field: sketch.retained() for field, sketch in self.sketches.items()},
+        }
+
+
+rank_sketches = RankSketches()
@@ -0,0 +1,67 @@
+# leaderboard_service/app/standings.py
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Optional
+
+from .db import get_db
+
+STANDINGS_POLL_INTERVAL = float(os.getenv("STANDINGS_POLL_INTERVAL", "1"))
+
+Listener = Callable[[int], Awaitable[None]]
+
+
+class StandingsWatcher:
+    """
+    Tracks the standings version that the game service bumps on every
+    finished game (`leaderboard_meta` document `standings`).
+
+    One poll of a single _id lookup per interval per worker; listeners are
+    called once per observed change, however many games finished in between.
+    """
+
+    def __init__(self, interval: float = STANDINGS_POLL_INTERVAL):
+        self.interval = interval
+        self.version: Optional[int] = None
+        self._listeners: List[Listener] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add_listener(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    async def poll_once(self) -> Optional[int]:
+        doc = await get_db().leaderboard_meta.find_one({"_id": "standings"})
+        version = doc.get("version", 0) if doc else 0
+        if version != self.version:
+            for listener in self._listeners:
+                try:
+                    await listener(version)
+                except Exception as exc:
+                    print("standings listener failed:", repr(exc))
+            # Published only after listeners ran (cache invalidated), so an
+            # ETag built from it never labels a response from the old standings
+            self.version = version
+        return self.version
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as exc:
+                print("standings poll failed:", repr(exc))
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+standings_watcher = StandingsWatcher()
@@ -0,0 +1,23 @@
+# leaderboard_service/app/windows.py
+import time
+from datetime import datetime, timezone
+from typing import Literal, Optional, get_args
+
+# "all" is served from user_stats, every other window from the rollup bucket
+# the game service writes for the current period (game_service/app/rollups.py)
+Window = Literal["all", "daily", "weekly", "monthly"]
+WINDOWS = get_args(Window)
+
+
+def current_bucket(period: str, now: Optional[float] = None) -> str:
+    """Key of the rollup bucket for `period` that contains `now` (UTC)."""
+    dt = datetime.fromtimestamp(time.time() if now is None else now, tz=timezone.utc)
+
+    if period == "daily":
+        return dt.strftime("%Y-%m-%d")
+    if period == "weekly":
+        year, week, _ = dt.isocalendar()
+        return f"{year}-W{week:02d}"
+    if period == "monthly":
+        return dt.strftime("%Y-%m")
+    raise ValueError("Invalid window")
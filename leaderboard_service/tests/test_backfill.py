@@ -0,0 +1,45 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from leaderboard_service.app import backfill
+
+
+@pytest.mark.asyncio
+async def test_backfill_merges_into_user_stats():
+    mock_db = MagicMock()
+    mock_db.user_stats.create_indexes = AsyncMock()
+    mock_db.user_stats_rollups.create_indexes = AsyncMock()
+    mock_db.user_stats.count_documents = AsyncMock(return_value=3)
+    mock_db.sessions.aggregate.return_value.to_list = AsyncMock(return_value=[])
+
+    written = await backfill.backfill_user_stats(mock_db)
+
+    assert written == 3
+    mock_db.user_stats.create_indexes.assert_awaited_once_with(backfill.USER_STATS_INDEXES)
+    mock_db.user_stats_rollups.create_indexes.assert_awaited_once_with(backfill.ROLLUP_INDEXES)
+
+    pipeline = mock_db.sessions.aggregate.call_args[0][0]
+    assert pipeline[0] == {"$match": {"finished_at": {"$ne": None}}}
+
+    group = next(stage["$group"] for stage in pipeline if "$group" in stage)
+    assert set(group) == {"_id", "totalGames", "totalScores", "bestScore"}
+
+    project = pipeline[-2]["$project"]
+    assert project["userName"] == {"$first": "$user.loging"}
+
+    merge = pipeline[-1]["$merge"]
+    assert merge["into"] == "user_stats"
+    assert merge["on"] == "user_id"
+
+
+def test_user_stats_indexes_cover_score_fields():
+    keys = [index.document["key"] for index in backfill.USER_STATS_INDEXES]
+    assert {"user_id": 1} in [dict(k) for k in keys]
+    assert {"totalScores": -1, "user_id": 1} in [dict(k) for k in keys]
+    assert {"bestScore": -1, "user_id": 1} in [dict(k) for k in keys]
+
+
+
+def test_rollup_buckets_expire():
+    ttl = [index.document for index in backfill.ROLLUP_INDEXES if "expireAfterSeconds" in index.document]
+    assert len(ttl) == 1
+    assert dict(ttl[0]["key"]) == {"expires_at": 1}
@@ -0,0 +1,146 @@
+import asyncio
+import pytest
+from leaderboard_service.app.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def counting_loader(values):
+    calls = {"n": 0}
+
+    async def loader():
+        calls["n"] += 1
+        return values[min(calls["n"], len(values)) - 1]
+
+    return loader, calls
+
+
+@pytest.mark.asyncio
+async def test_fresh_entries_are_hits():
+    clock = FakeClock()
+    cache = TTLCache(ttl=5, clock=clock)
+    loader, calls = counting_loader(["board"])
+
+    assert await cache.get("k", loader) == "board"
+    clock.now = 4
+    assert await cache.get("k", loader) == "board"
+
+    assert calls["n"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_while_refreshing():
+    clock = FakeClock()
+    cache = TTLCache(ttl=5, stale_ttl=10, clock=clock)
+    loader, calls = counting_loader(["old", "new"])
+
+    await cache.get("k", loader)
+    clock.now = 8
+    # Stale value comes back immediately, refresh runs in the background
+    assert await cache.get("k", loader) == "old"
+    await asyncio.sleep(0)
+    assert calls["n"] == 2
+    assert await cache.get("k", loader) == "new"
+    assert cache.stats()["stale_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_a_miss():
+    clock = FakeClock()
+    cache = TTLCache(ttl=5, stale_ttl=10, clock=clock)
+    loader, calls = counting_loader(["old", "new"])
+
+    await cache.get("k", loader)
+    clock.now = 20
+    assert await cache.get("k", loader) == "new"
+    assert cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    cache = TTLCache(ttl=5)
+    release = asyncio.Event()
+    calls = {"n": 0}
+
+    async def slow_loader():
+        calls["n"] += 1
+        await release.wait()
+        return "board"
+
+    waiters = [asyncio.ensure_future(cache.get("k", slow_loader)) for _ in range(20)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ["board"] * 20
+    assert calls["n"] == 1
+    assert cache.stats()["refreshes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_load_propagates_and_is_not_cached():
+    cache = TTLCache(ttl=5)
+
+    async def broken():
+        raise RuntimeError("mongo down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get("k", broken)
+
+    loader, calls = counting_loader(["board"])
+    assert await cache.get("k", loader) == "board"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_forces_reload():
+    cache = TTLCache(ttl=60)
+    loader, calls = counting_loader(["v1", "v2"])
+
+    await cache.get(("totalScores", 10), loader)
+    cache.invalidate()
+    assert await cache.get(("totalScores", 10), loader) == "v2"
+    assert calls["n"] == 2
+
+
+@pytest.mark.asyncio
+async def test_load_after_invalidate_does_not_join_the_earlier_one():
+    cache = TTLCache(ttl=5)
+    release = asyncio.Event()
+    values = iter(["old", "new"])
+
+    async def loader():
+        value = next(values)
+        if value == "old":
+            await release.wait()
+        return value
+
+    before = asyncio.ensure_future(cache.get("k", loader))
+    await asyncio.sleep(0)
+    cache.invalidate()
+    after = asyncio.ensure_future(cache.get("k", loader))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await before == "old"
+    assert await after == "new"
+    # Only the post-invalidate load was stored
+    assert await cache.get("k", loader) == "new"
+
+
+@pytest.mark.asyncio
+async def test_max_entries_evicts_oldest():
+    cache = TTLCache(ttl=60, max_entries=2)
+    loader, _ = counting_loader(["x"])
+
+    for key in ("a", "b", "c"):
+        await cache.get(key, loader)
+
+    assert cache.stats()["entries"] == 2
+    assert "a" not in cache._entries
@@ -0,0 +1,17 @@
+from leaderboard_service.app.conditional import etag_matches, make_etag
+
+
+def test_make_etag():
+    assert make_etag(None) is None
+    assert make_etag(7) == 'W/"7"'
+    assert make_etag(7, "2026-W42") == 'W/"7.2026-W42"'
+
+
+def test_etag_matches_uses_weak_comparison():
+    etag = make_etag(7)
+    assert etag_matches('W/"7"', etag)
+    assert etag_matches('"7"', etag)
+    assert etag_matches('"3", W/"7"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"6"', etag)
+    assert not etag_matches(None, etag)
@@ -1,15 +1,23 @@
+import base64
+import json
 import pytest
 from unittest.mock import MagicMock, AsyncMock, patch
 from leaderboard_service.app import crud
 
 
+def _cursor(rows):
+    cursor = MagicMock()
+    cursor.sort.return_value = cursor
+    cursor.limit.return_value = cursor
+    cursor.to_list = AsyncMock(return_value=rows)
+    return cursor
+
+
 @pytest.fixture
 def mock_db():
     mock = MagicMock()
-    mock.sessions = MagicMock()
-    mock.sessions.aggregate.return_value = AsyncMock()
-    # Mock to_list execution
-    mock.sessions.aggregate.return_value.to_list.return_value = []
+    mock.user_stats = MagicMock()
+    mock.user_stats.find.return_value = _cursor([])
     return mock
 
 
@@ -18,12 +26,12 @@ async def test_get_leaderboard_total_scores(mock_db):
     with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
         await crud.get_leaderboard(group_by="totalScores", limit=5)
 
-        mock_db.sessions.aggregate.assert_called_once()
-        pipeline = mock_db.sessions.aggregate.call_args[0][0]
+        mock_db.user_stats.find.assert_called_once()
+        cursor = mock_db.user_stats.find.return_value
 
-        sort_stage = next((stage for stage in pipeline if "$sort" in stage), None)
-        assert sort_stage is not None
-        assert "totalScores" in sort_stage["$sort"]
+        # The top N is cut straight off the {score, user_id} index
+        cursor.sort.assert_called_once_with([("totalScores", -1), ("user_id", 1)])
+        cursor.limit.assert_called_once_with(5)
 
 
 @pytest.mark.asyncio
@@ -31,33 +39,132 @@ async def test_get_leaderboard_best_score(mock_db):
     with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
         await crud.get_leaderboard(group_by="bestScore", limit=5)
 
-        pipeline = mock_db.sessions.aggregate.call_args[0][0]
+        cursor = mock_db.user_stats.find.return_value
+        cursor.sort.assert_called_once_with([("bestScore", -1), ("user_id", 1)])
+
+
+@pytest.mark.asyncio
+async def test_get_leaderboard_places_without_joining_users(mock_db):
+    mock_db.user_stats.find.return_value = _cursor([
+        {"user_id": "u1", "userName": "p1", "totalGames": 3, "totalScores": 90},
+        {"user_id": "u2", "userName": "p2", "totalGames": 2, "totalScores": 90},
+        {"user_id": "u3", "totalGames": 1, "totalScores": 40},
+    ])
+    mock_db.user_stats.count_documents = AsyncMock()
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        data = await crud.get_leaderboard(group_by="totalScores", limit=3)
 
-        sort_stage = next((stage for stage in pipeline if "$sort" in stage), None)
-        assert sort_stage is not None
-        assert "bestScore" in sort_stage["$sort"]
+    assert [row["place"] for row in data] == [1, 1, 3]
+    assert data[2]["userName"] == "Unknown"
+    projection = mock_db.user_stats.find.call_args[0][1]
+    assert projection["userName"] == 1
+    # The top page needs neither a join nor rank counts
+    mock_db.users.find.assert_not_called()
+    mock_db.user_stats.count_documents.assert_not_called()
 
 
 @pytest.mark.asyncio
 async def test_get_leaderboard_me_only_success(mock_db):
     current_uid = "user_123"
+    mock_db.user_stats.find_one = AsyncMock(return_value={
+        "user_id": current_uid, "userName": "me", "totalGames": 4, "totalScores": 250
+    })
+    mock_db.user_stats.count_documents = AsyncMock(return_value=6)
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        data = await crud.get_leaderboard(me_only=True, current_user_id=current_uid)
+
+    # No ranking over every user and no join
+    mock_db.user_stats.aggregate.assert_not_called()
+    mock_db.users.find_one.assert_not_called()
+
+    # Place is derived from an index count of strictly higher scores
+    mock_db.user_stats.count_documents.assert_awaited_once_with({"totalScores": {"$gt": 250}})
+    assert data == [{
+        "id": current_uid, "userName": "me", "totalGames": 4, "totalScores": 250, "place": 7
+    }]
+
+
+@pytest.mark.asyncio
+async def test_get_user_rank_best_score(mock_db):
+    mock_db.user_stats.find_one = AsyncMock(return_value={
+        "user_id": "u1", "userName": "p1", "totalGames": 2, "bestScore": 20
+    })
+    mock_db.user_stats.count_documents = AsyncMock(return_value=0)
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        entry = await crud.get_user_rank("bestScore", "u1")
+
+    mock_db.user_stats.count_documents.assert_awaited_once_with({"bestScore": {"$gt": 20}})
+    assert entry["place"] == 1
+    assert entry["bestScore"] == 20
+
+
+@pytest.mark.asyncio
+async def test_get_user_standings_reads_stats_once(mock_db):
+    mock_db.user_stats.find_one = AsyncMock(return_value={
+        "user_id": "u1", "userName": "p1", "totalGames": 3, "totalScores": 90, "bestScore": 40
+    })
+    mock_db.user_stats.count_documents = AsyncMock(side_effect=[4, 0])
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        standings = await crud.get_user_standings("u1")
+
+    mock_db.user_stats.find_one.assert_awaited_once()
+    assert mock_db.user_stats.find_one.call_args[0][1]["totalScores"] == 1
+    assert mock_db.user_stats.find_one.call_args[0][1]["bestScore"] == 1
+    assert standings["totalScores"]["place"] == 5
+    assert standings["bestScore"] == {
+        "id": "u1", "userName": "p1", "totalGames": 3, "bestScore": 40, "place": 1
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_user_rank_approximate_long_tail(mock_db):
+    sketch = MagicMock()
+    sketch.count_greater.return_value = 48_199
+    sketch.error_bound.return_value = 100
+    mock_db.user_stats.find_one = AsyncMock(return_value={
+        "user_id": "u1", "userName": "p1", "totalGames": 2, "totalScores": 20
+    })
+    mock_db.user_stats.count_documents = AsyncMock()
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        entry = await crud.get_user_rank("totalScores", "u1", sketch=sketch)
+
+    mock_db.user_stats.count_documents.assert_not_called()
+    assert entry["place"] == 48_200
+    assert entry["approximate"] is True
+
+
+@pytest.mark.asyncio
+async def test_get_user_rank_approximate_near_top_is_exact(mock_db):
+    sketch = MagicMock()
+    sketch.count_greater.return_value = 40
+    sketch.error_bound.return_value = 100
+    mock_db.user_stats.find_one = AsyncMock(return_value={
+        "user_id": "u1", "userName": "p1", "totalGames": 2, "totalScores": 900
+    })
+    mock_db.user_stats.count_documents = AsyncMock(return_value=37)
+
     with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
-        await crud.get_leaderboard(me_only=True, current_user_id=current_uid)
+        entry = await crud.get_user_rank("totalScores", "u1", sketch=sketch)
+
+    assert entry["place"] == 38
+    assert "approximate" not in entry
 
-        pipeline = mock_db.sessions.aggregate.call_args[0][0]
 
-        # Verify the pipeline contains the specific match for the user ID
-        # We look for all $match stages
-        match_stages = [stage for stage in pipeline if "$match" in stage]
+@pytest.mark.asyncio
+async def test_get_leaderboard_me_only_unknown_user(mock_db):
+    mock_db.user_stats.find_one = AsyncMock(return_value=None)
+    mock_db.user_stats.count_documents = AsyncMock()
 
-        # There should be at least two:
-        # 1. finished_at != None
-        # 2. _id == current_uid
-        assert len(match_stages) >= 2
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        data = await crud.get_leaderboard(me_only=True, current_user_id="ghost")
 
-        # Check the last match stage is our ID filter
-        user_filter = match_stages[-1]["$match"]
-        assert user_filter == {"_id": current_uid}
+    assert data == []
+    mock_db.user_stats.count_documents.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -71,4 +178,241 @@ async def test_get_leaderboard_invalid_group_by(mock_db):
 async def test_get_leaderboard_me_only_requires_id(mock_db):
     with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
         with pytest.raises(ValueError):
-            await crud.get_leaderboard(me_only=True, current_user_id=None)
\ No newline at end of file
+            await crud.get_leaderboard(me_only=True, current_user_id=None)
+
+@pytest.mark.asyncio
+async def test_get_leaderboard_around_places_and_order(mock_db):
+    me = {"user_id": "u3", "userName": "p3", "totalGames": 1, "totalScores": 50}
+    # Above comes back nearest-first (ascending score)
+    above = [
+        {"user_id": "u2", "userName": "p2", "totalGames": 1, "totalScores": 50},
+        {"user_id": "u1", "userName": "p1", "totalGames": 1, "totalScores": 80},
+    ]
+    below = [
+        {"user_id": "u4", "userName": "p4", "totalGames": 1, "totalScores": 40},
+        {"user_id": "u5", "userName": "p5", "totalGames": 1, "totalScores": 40},
+        {"user_id": "u6", "userName": "p6", "totalGames": 1, "totalScores": 10},
+    ]
+    mock_db.user_stats.find_one = AsyncMock(return_value=me)
+    mock_db.user_stats.find.side_effect = [_cursor(above), _cursor(below)]
+    # Board: u0 (90), u9 (80) above the window, then u1 .. u6
+    counts = {
+        '{"totalScores": {"$gt": 50}}': 3,
+        '{"totalScores": {"$gt": 50, "$lte": 80}}': 2,
+        '{"totalScores": 50}': 2,
+    }
+    mock_db.user_stats.count_documents = AsyncMock(side_effect=lambda q: counts[json.dumps(q)])
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        data = await crud.get_leaderboard_around("totalScores", "u3", radius=3)
+
+    assert [row["id"] for row in data] == ["u1", "u2", "u3", "u4", "u5", "u6"]
+    assert [row["place"] for row in data] == [2, 4, 4, 6, 6, 8]
+    # Only the count above the caller grows with rank; the others are bounded
+    assert mock_db.user_stats.count_documents.await_count == 3
+
+    above_query = mock_db.user_stats.find.call_args_list[0][0][0]
+    assert above_query["$or"][1] == {"totalScores": 50, "user_id": {"$lt": "u3"}}
+
+
+@pytest.mark.asyncio
+async def test_get_leaderboard_around_unknown_user(mock_db):
+    mock_db.user_stats.find_one = AsyncMock(return_value=None)
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        assert await crud.get_leaderboard_around("bestScore", "ghost", radius=3) == []
+
+    mock_db.user_stats.find.assert_not_called()
+
+
+def test_cursor_round_trip():
+    page = [
+        {"id": "u8", "totalScores": 150, "place": 8},
+        {"id": "u9", "totalScores": 120, "place": 9},
+        {"id": "u10", "totalScores": 120, "place": 9},
+    ]
+    cursor = crud.encode_cursor(page, "totalScores")
+    assert crud.decode_cursor(cursor) == (120, "u10", 9, 2)
+
+
+def test_cursor_counts_ties_across_pages():
+    page = [{"id": "u12", "totalScores": 120, "place": 9}, {"id": "u13", "totalScores": 120, "place": 9}]
+    cursor = crud.encode_cursor(page, "totalScores", after=(120, "u10", 9, 2))
+    assert crud.decode_cursor(cursor) == (120, "u13", 9, 4)
+
+
+def test_legacy_cursor_has_no_place():
+    legacy = base64.urlsafe_b64encode(b'[120,"u9"]').decode().rstrip("=")
+    assert crud.decode_cursor(legacy) == (120, "u9", None, None)
+
+
+@pytest.mark.parametrize("bad", [
+    "!!!",
+    "bm90LWpzb24",
+    crud.encode_cursor([{"id": 5, "bestScore": 1, "place": 1}], "bestScore"),
+    base64.urlsafe_b64encode(b'[1,"u1",0,1]').decode(),
+    base64.urlsafe_b64encode(b'[1,"u1",2]').decode(),
+])
+def test_decode_cursor_rejects_garbage(bad):
+    with pytest.raises(ValueError):
+        crud.decode_cursor(bad)
+
+
+@pytest.mark.asyncio
+async def test_get_leaderboard_page_seeks_from_cursor(mock_db):
+    rows = [
+        {"user_id": "u8", "userName": "p8", "totalGames": 2, "bestScore": 30},
+        {"user_id": "u9", "userName": "p9", "totalGames": 1, "bestScore": 25},
+        {"user_id": "u10", "userName": "p10", "totalGames": 1, "bestScore": 25},
+        {"user_id": "u11", "userName": "p11", "totalGames": 1, "bestScore": 20},
+    ]
+    mock_db.user_stats.find.return_value = _cursor(rows)
+    mock_db.user_stats.count_documents = AsyncMock()
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        # u7 is the second user at place 41
+        data = await crud.get_leaderboard_page("bestScore", (30, "u7", 41, 2), limit=20)
+
+    query = mock_db.user_stats.find.call_args[0][0]
+    assert query == {"$or": [
+        {"bestScore": {"$lt": 30}},
+        {"bestScore": 30, "user_id": {"$gt": "u7"}},
+    ]}
+    cursor = mock_db.user_stats.find.return_value
+    cursor.limit.assert_called_once_with(20)
+    assert data[0] == {"id": "u8", "userName": "p8", "totalGames": 2, "bestScore": 30, "place": 41}
+    assert [row["place"] for row in data] == [41, 44, 44, 46]
+    # Places continue from the cursor, nothing is counted
+    mock_db.user_stats.count_documents.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_leaderboard_page_legacy_cursor_counts(mock_db):
+    rows = [{"user_id": "u8", "userName": "p8", "totalGames": 2, "bestScore": 30}]
+    mock_db.user_stats.find.return_value = _cursor(rows)
+    mock_db.user_stats.count_documents = AsyncMock(side_effect=[41, 43])
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        data = await crud.get_leaderboard_page("bestScore", (30, "u7", None, None), limit=20)
+
+    assert data == [{"id": "u8", "userName": "p8", "totalGames": 2, "bestScore": 30, "place": 42}]
+
+
+
+@pytest.mark.asyncio
+async def test_windowed_leaderboard_reads_current_bucket(mock_db):
+    mock_db.user_stats_rollups.find.return_value = _cursor([])
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db), \
+            patch("leaderboard_service.app.crud.current_bucket", return_value="2026-W42"):
+        await crud.get_leaderboard(group_by="bestScore", limit=5, window="weekly")
+
+    mock_db.user_stats.find.assert_not_called()
+    query = mock_db.user_stats_rollups.find.call_args[0][0]
+    assert query == {"period": "weekly", "bucket": "2026-W42"}
+
+
+@pytest.mark.asyncio
+async def test_windowed_rank_counts_within_bucket(mock_db):
+    mock_db.user_stats_rollups.find_one = AsyncMock(return_value={
+        "user_id": "u1", "userName": "p1", "totalGames": 2, "totalScores": 70
+    })
+    mock_db.user_stats_rollups.count_documents = AsyncMock(return_value=3)
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db), \
+            patch("leaderboard_service.app.crud.current_bucket", return_value="2026-10-18"):
+        entry = await crud.get_user_rank("totalScores", "u1", window="daily")
+
+    mock_db.user_stats_rollups.count_documents.assert_awaited_once_with(
+        {"period": "daily", "bucket": "2026-10-18", "totalScores": {"$gt": 70}}
+    )
+    assert entry["place"] == 4
+
+
+@pytest.mark.asyncio
+async def test_invalid_window(mock_db):
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        with pytest.raises(ValueError):
+            await crud.get_leaderboard(window="yearly")
+
+
+@pytest.mark.asyncio
+async def test_get_user_ranks_one_count_per_distinct_score(mock_db):
+    mock_db.user_stats.find.return_value = _cursor([
+        {"user_id": "u2", "userName": "p2", "totalGames": 1, "totalScores": 40},
+        {"user_id": "u1", "userName": "p1", "totalGames": 1, "totalScores": 90},
+        {"user_id": "u3", "userName": "p3", "totalGames": 1, "totalScores": 40},
+    ])
+
+    async def count(query):
+        return {90: 0, 40: 5}[query["totalScores"]["$gt"]]
+
+    mock_db.user_stats.count_documents = AsyncMock(side_effect=count)
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        data = await crud.get_user_ranks("totalScores", ["u1", "u2", "ghost", "u3", "u1"])
+
+    query = mock_db.user_stats.find.call_args[0][0]
+    assert query == {"user_id": {"$in": ["u1", "u2", "ghost", "u3"]}}
+    assert mock_db.user_stats.count_documents.await_count == 2
+    assert [(row["id"], row["place"]) for row in data] == [("u1", 1), ("u2", 6), ("u3", 6)]
+
+
+def _histogram(scores, edges):
+    buckets = []
+    for lo, hi in zip(edges, edges[1:]):
+        count = sum(1 for s in scores if lo <= s < hi)
+        if count:
+            buckets.append({"lo": lo, "hi": hi, "count": count})
+    return buckets
+
+
+def test_percentile_bounds_contain_exact_value():
+    import random
+    rng = random.Random(7)
+    scores = [int(rng.paretovariate(1.2) * 10) for _ in range(5000)]
+    # Exact buckets up to 16, then ~9% geometric growth like the game service
+    edges = list(range(17))
+    while edges[-1] <= max(scores):
+        edges.append(max(edges[-1] + 1, round(edges[-1] * 1.09)))
+    buckets = _histogram(scores, edges)
+
+    for score in rng.sample(scores, 200):
+        exact = 100.0 * sum(1 for s in scores if s < score) / len(scores)
+        result = crud.percentile_from_histogram(buckets, score)
+        assert result["lower"] - 1e-9 <= exact <= result["upper"] + 1e-9
+        assert abs(result["percentile"] - exact) <= (result["upper"] - result["lower"]) / 2 + 1e-9
+        if score < 16:
+            assert result["percentile"] == pytest.approx(exact)
+
+
+def test_percentile_from_empty_histogram():
+    assert crud.percentile_from_histogram([], 10)["totalPlayers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_get_score_histogram(mock_db):
+    mock_db.score_histogram.find.return_value = _cursor([
+        {"lo": 0, "hi": 1, "count": 4}, {"lo": 1, "hi": 2, "count": 6},
+    ])
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        histogram = await crud.get_score_histogram("bestScore")
+
+    assert histogram["total"] == 10
+    assert mock_db.score_histogram.find.call_args[0][0] == {"metric": "bestScore", "count": {"$gt": 0}}
+
+
+@pytest.mark.asyncio
+async def test_get_leaderboard_around_at_the_top_counts_once(mock_db):
+    me = {"user_id": "u1", "userName": "p1", "totalGames": 1, "bestScore": 90}
+    below = [{"user_id": "u2", "userName": "p2", "totalGames": 1, "bestScore": 90}]
+    mock_db.user_stats.find_one = AsyncMock(return_value=me)
+    mock_db.user_stats.find.side_effect = [_cursor([]), _cursor(below)]
+    mock_db.user_stats.count_documents = AsyncMock(return_value=0)
+
+    with patch("leaderboard_service.app.crud.get_db", return_value=mock_db):
+        data = await crud.get_leaderboard_around("bestScore", "u1", radius=3)
+
+    assert [row["place"] for row in data] == [1, 1]
+    mock_db.user_stats.count_documents.assert_awaited_once_with({"bestScore": {"$gt": 90}})
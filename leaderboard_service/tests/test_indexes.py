@@ -0,0 +1,52 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from leaderboard_service.app import indexes
+
+
+def _db(index_info):
+    """Mock database whose collections report `index_info[name]`."""
+    collections = {}
+    for name in indexes.INDEXES:
+        collection = MagicMock()
+        collection.create_indexes = AsyncMock()
+        collection.index_information = AsyncMock(return_value=index_info.get(name, {}))
+        collections[name] = collection
+    db = MagicMock()
+    db.__getitem__.side_effect = collections.__getitem__
+    return db, collections
+
+
+def _info(models):
+    return {
+        f"ix{i}": {"key": list(model.document["key"].items()), **{
+            k: v for k, v in model.document.items() if k in ("unique", "expireAfterSeconds")
+        }}
+        for i, model in enumerate(models)
+    }
+
+
+def test_spec_covers_board_indexes():
+    keys = [dict(model.document["key"]) for model in indexes.INDEXES["user_stats"]]
+    assert {"totalScores": -1, "user_id": 1} in keys
+    assert {"bestScore": -1, "user_id": 1} in keys
+    ttl = [m.document for m in indexes.INDEXES["user_stats_rollups"] if "expireAfterSeconds" in m.document]
+    assert dict(ttl[0]["key"]) == {"expires_at": 1}
+
+
+@pytest.mark.asyncio
+async def test_no_drift_when_everything_matches():
+    db, _ = _db({name: _info(models) for name, models in indexes.INDEXES.items()})
+
+    assert await indexes.index_drift(db) == {}
+
+
+@pytest.mark.asyncio
+async def test_cli_check_exit_code():
+    db, _ = _db({})
+
+    with patch("leaderboard_service.app.indexes.get_db", return_value=db):
+        assert await indexes.main(["--check"]) == 1
+
+    db, _ = _db({name: _info(models) for name, models in indexes.INDEXES.items()})
+    with patch("leaderboard_service.app.indexes.get_db", return_value=db):
+        assert await indexes.main(["--check"]) == 0
@@ -0,0 +1,77 @@
+import pytest
+from leaderboard_service.app.live import LiveBoard, Subscriber, diff_boards
+
+
+def entry(uid, score, place):
+    return {"id": uid, "userName": uid, "totalGames": 1, "totalScores": score, "place": place}
+
+
+def test_diff_boards():
+    old = [entry("a", 90, 1), entry("b", 80, 2), entry("c", 70, 3)]
+    new = [entry("b", 95, 1), entry("a", 90, 2), entry("d", 75, 3)]
+
+    changes = diff_boards(old, new, "totalScores")
+
+    assert changes["entered"] == [entry("d", 75, 3)]
+    assert changes["left"] == ["c"]
+    assert [e["id"] for e in changes["moved"]] == ["b", "a"]
+
+
+def test_diff_boards_unchanged():
+    board = [entry("a", 90, 1)]
+    assert diff_boards(board, list(board), "totalScores") == {"entered": [], "left": [], "moved": []}
+
+
+def test_slow_subscriber_is_coalesced_to_snapshot():
+    subscriber = Subscriber(maxsize=2)
+    snapshot = {"type": "snapshot", "entries": []}
+
+    for version in range(5):
+        subscriber.offer({"type": "diff", "version": version}, lambda: snapshot)
+
+    assert subscriber.queue.qsize() <= 2
+    assert subscriber.coalesced >= 1
+    messages = [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+    assert snapshot in messages
+
+
+@pytest.mark.asyncio
+async def test_live_board_computes_once_for_all_subscribers():
+    boards = [[entry("a", 10, 1)], [entry("a", 10, 2), entry("b", 20, 1)]]
+    calls = {"n": 0}
+
+    async def loader():
+        calls["n"] += 1
+        return boards[calls["n"] - 1]
+
+    board = LiveBoard("totalScores", loader)
+    subscribers = [await board.subscribe() for _ in range(3)]
+    await board.on_standings_changed(2)
+
+    # One load for the initial board, one for the change: not one per subscriber
+    assert calls["n"] == 2
+    for subscriber in subscribers:
+        first = subscriber.queue.get_nowait()
+        second = subscriber.queue.get_nowait()
+        assert first["type"] == "snapshot"
+        assert second["type"] == "diff"
+        assert second["version"] == 2
+        assert [e["id"] for e in second["entered"]] == ["b"]
+        assert [e["id"] for e in second["moved"]] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_live_board_without_subscribers_skips_loading():
+    calls = {"n": 0}
+
+    async def loader():
+        calls["n"] += 1
+        return []
+
+    board = LiveBoard("bestScore", loader)
+    await board.on_standings_changed(1)
+
+    assert calls["n"] == 0
+    subscriber = await board.subscribe()
+    board.unsubscribe(subscriber)
+    assert board.stats()["subscribers"] == 0
@@ -3,6 +3,14 @@ from httpx import AsyncClient, ASGITransport
 from unittest.mock import AsyncMock, patch
 from leaderboard_service.app.main import app
 from leaderboard_service.app.auth_deps import TokenData, get_current_user  # <--- IMPORT THIS
+from leaderboard_service.app.cache import leaderboard_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_leaderboard_cache():
+    leaderboard_cache.invalidate()
+    yield
+    leaderboard_cache.invalidate()
 
 
 @pytest.mark.asyncio
@@ -107,4 +115,304 @@ async def test_get_best_single_run_me_404():
 
         app.dependency_overrides = {}
 
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_public_leaderboard_is_cached():
+    fake_data = [{"id": "u1", "userName": "Player1", "totalGames": 5, "totalScores": 100, "place": 1}]
+    mock_get = AsyncMock(return_value=fake_data)
+
+    with patch("leaderboard_service.app.main.get_leaderboard", new=mock_get):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            first = await ac.get("/leaderboard/total-score?limit=5")
+            second = await ac.get("/leaderboard/total-score?limit=5")
+            metrics = await ac.get("/metrics")
+
+    assert first.json() == second.json()
+    mock_get.assert_awaited_once_with(group_by="totalScores", limit=5, me_only=False, window="all")
+    assert metrics.json()["leaderboard_cache"]["hits"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_around_me_resolves_metric():
+    fake_data = [{"id": "u1", "userName": "Me", "totalGames": 5, "bestScore": 70, "place": 12}]
+    fake_user = TokenData(user_id="u1", loging="Me")
+    mock_around = AsyncMock(return_value=fake_data)
+
+    with patch("leaderboard_service.app.main.get_leaderboard_around", new=mock_around):
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.get("/leaderboard/best-single-run/around-me?radius=3")
+            unknown = await ac.get("/leaderboard/nope/around-me")
+            too_wide = await ac.get("/leaderboard/total-score/around-me?radius=1000")
+
+        app.dependency_overrides = {}
+
+    assert response.status_code == 200
+    assert response.json()[0]["place"] == 12
+    mock_around.assert_awaited_once_with("bestScore", "u1", 3, "all")
+    assert unknown.status_code == 404
+    assert too_wide.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_pagination_with_cursor():
+    first_page = [
+        {"id": "u1", "userName": "P1", "totalGames": 1, "totalScores": 90, "place": 1},
+        {"id": "u2", "userName": "P2", "totalGames": 1, "totalScores": 80, "place": 2},
+    ]
+    second_page = [{"id": "u3", "userName": "P3", "totalGames": 1, "totalScores": 70, "place": 3}]
+    mock_page = AsyncMock(return_value=second_page)
+
+    with patch("leaderboard_service.app.main.get_leaderboard", new=AsyncMock(return_value=first_page)), \
+            patch("leaderboard_service.app.main.get_leaderboard_page", new=mock_page):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            first = await ac.get("/leaderboard/total-score?limit=2")
+            cursor = first.headers["X-Next-Cursor"]
+            second = await ac.get(f"/leaderboard/total-score?limit=2&cursor={cursor}")
+            bad = await ac.get("/leaderboard/total-score?cursor=garbage")
+
+    assert second.status_code == 200
+    assert second.json()[0]["id"] == "u3"
+    mock_page.assert_awaited_once_with("totalScores", (80, "u2", 2, 1), 2, "all")
+    # Short page means the end of the board
+    assert "X-Next-Cursor" not in second.headers
+    assert bad.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_page_size_is_capped():
+    mock_get = AsyncMock(return_value=[])
+
+    with patch("leaderboard_service.app.main.get_leaderboard", new=mock_get):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.get("/leaderboard/best-single-run?limit=1000000")
+
+    assert response.status_code == 200
+    mock_get.assert_awaited_once_with(group_by="bestScore", limit=100, me_only=False, window="all")
+
+
+
+@pytest.mark.asyncio
+async def test_windowed_leaderboard():
+    mock_get = AsyncMock(return_value=[])
+
+    with patch("leaderboard_service.app.main.get_leaderboard", new=mock_get):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            weekly = await ac.get("/leaderboard/total-score?window=weekly")
+            invalid = await ac.get("/leaderboard/total-score?window=yearly")
+
+    assert weekly.status_code == 200
+    mock_get.assert_awaited_once_with(group_by="totalScores", limit=10, me_only=False, window="weekly")
+    assert invalid.status_code == 422
+
+
+def test_live_leaderboard_websocket_snapshot_and_diff():
+    from fastapi.testclient import TestClient
+    from leaderboard_service.app.main import on_standings_changed, live_boards
+
+    boards = iter([
+        [{"id": "u1", "userName": "P1", "totalGames": 1, "totalScores": 10, "place": 1}],
+        [{"id": "u2", "userName": "P2", "totalGames": 1, "totalScores": 50, "place": 1},
+         {"id": "u1", "userName": "P1", "totalGames": 1, "totalScores": 10, "place": 2}],
+    ])
+
+    async def fake_get_leaderboard(**kwargs):
+        return next(boards)
+
+    with patch("leaderboard_service.app.main.get_leaderboard", new=fake_get_leaderboard):
+        client = TestClient(app)
+        with client.websocket_connect("/leaderboard/total-score/live") as ws:
+            snapshot = ws.receive_json()
+            # Simulate the watcher seeing a new version on the app's event loop
+            ws.portal.call(on_standings_changed, 4)
+            diff = ws.receive_json()
+
+    assert snapshot["type"] == "snapshot"
+    assert snapshot["entries"][0]["id"] == "u1"
+    assert diff["type"] == "diff"
+    assert [e["id"] for e in diff["entered"]] == ["u2"]
+    assert [e["id"] for e in diff["moved"]] == ["u1"]
+    live_boards["totalScores"]._board = None
+
+
+@pytest.mark.asyncio
+async def test_batch_ranks():
+    fake_data = [{"id": "u1", "userName": "P1", "totalGames": 1, "totalScores": 10, "place": 3}]
+    mock_ranks = AsyncMock(return_value=fake_data)
+
+    with patch("leaderboard_service.app.main.get_user_ranks", new=mock_ranks):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            anonymous = await ac.post("/leaderboard/total-score/ranks", json={"user_ids": ["u1"]})
+
+            app.dependency_overrides[get_current_user] = lambda: TokenData(user_id="u1", loging="P1")
+            response = await ac.post("/leaderboard/total-score/ranks", json={"user_ids": ["u1", "u2"]})
+            too_many = await ac.post(
+                "/leaderboard/total-score/ranks", json={"user_ids": [f"u{i}" for i in range(500)]}
+            )
+            app.dependency_overrides = {}
+
+    assert anonymous.status_code == 401
+    assert response.status_code == 200
+    assert response.json()[0]["place"] == 3
+    mock_ranks.assert_awaited_once_with("totalScores", ["u1", "u2"], "all")
+    assert too_many.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_percentile_endpoint():
+    fake_user = TokenData(user_id="u1", loging="Me")
+    histogram = {"metric": "totalScores", "total": 10, "buckets": [
+        {"lo": 0, "hi": 1, "count": 3}, {"lo": 1, "hi": 2, "count": 7},
+    ]}
+
+    with patch("leaderboard_service.app.main.get_user_score", new=AsyncMock(return_value=1)), \
+            patch("leaderboard_service.app.main.get_score_histogram", new=AsyncMock(return_value=histogram)):
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.get("/leaderboard/total-score/percentile")
+            hist = await ac.get("/leaderboard/total-score/histogram")
+
+        app.dependency_overrides = {}
+
+    assert response.status_code == 200
+    assert response.json()["percentile"] == 30.0
+    assert hist.json()["total"] == 10
+
+
+@pytest.mark.asyncio
+async def test_percentile_endpoint_unknown_user():
+    fake_user = TokenData(user_id="u1", loging="Me")
+
+    with patch("leaderboard_service.app.main.get_user_score", new=AsyncMock(return_value=None)):
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.get("/leaderboard/best-single-run/percentile")
+
+        app.dependency_overrides = {}
+
+    assert response.status_code == 404
+
+
+@pytest.fixture
+def standings_version():
+    from leaderboard_service.app.main import standings_watcher
+    previous = standings_watcher.version
+    standings_watcher.version = 7
+    yield 7
+    standings_watcher.version = previous
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_conditional_get(standings_version):
+    fake_data = [{
+        "id": "u1", "userName": "Player1", "totalGames": 5,
+        "totalScores": 100, "bestScore": None, "place": 1
+    }]
+    mock_get = AsyncMock(return_value=fake_data)
+
+    with patch("leaderboard_service.app.main.get_leaderboard", new=mock_get):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            first = await ac.get("/leaderboard/total-score")
+            leaderboard_cache.invalidate()
+            second = await ac.get("/leaderboard/total-score", headers={"If-None-Match": first.headers["ETag"]})
+            daily = await ac.get("/leaderboard/total-score?window=daily", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.status_code == 200
+    assert first.headers["ETag"] == 'W/"7"'
+    assert first.headers["Cache-Control"].startswith("public, max-age=")
+
+    # Matching ETag: empty 304 and no Mongo read
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["ETag"] == 'W/"7"'
+    assert mock_get.await_count == 2  # first request + the daily board
+
+    # Windowed boards carry their bucket in the ETag
+    assert daily.status_code == 200
+    assert daily.headers["ETag"] != first.headers["ETag"]
+
+
+@pytest.mark.asyncio
+async def test_me_conditional_get_is_private(standings_version):
+    fake_user = TokenData(user_id="u1", loging="Me")
+    mock_get = AsyncMock(return_value=[])
+
+    with patch("leaderboard_service.app.main.get_leaderboard", new=mock_get):
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.get("/leaderboard/best-single-run/me", headers={"If-None-Match": 'W/"7"'})
+
+        app.dependency_overrides = {}
+
+    assert response.status_code == 304
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    mock_get.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_combined_me_endpoint():
+    fake_user = TokenData(user_id="u1", loging="Me")
+    standings = {
+        "totalScores": {"id": "u1", "userName": "Me", "totalGames": 3, "totalScores": 90, "place": 5},
+        "bestScore": {"id": "u1", "userName": "Me", "totalGames": 3, "bestScore": 40, "place": 1},
+    }
+
+    with patch("leaderboard_service.app.main.get_user_standings", new=AsyncMock(return_value=standings)):
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.get("/leaderboard/me")
+
+        app.dependency_overrides = {}
+
+    assert response.status_code == 200
+    assert response.json()["total-score"]["place"] == 5
+    assert response.json()["best-single-run"]["bestScore"] == 40
+
+
+@pytest.mark.asyncio
+async def test_combined_me_endpoint_unknown_user():
+    fake_user = TokenData(user_id="ghost", loging="Me")
+
+    with patch("leaderboard_service.app.main.get_user_standings", new=AsyncMock(return_value={})):
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.get("/leaderboard/me")
+
+        app.dependency_overrides = {}
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_me_approximate_passes_sketch():
+    from leaderboard_service.app.main import rank_sketches
+    fake_user = TokenData(user_id="u1", loging="Me")
+    fake_entry = [{
+        "id": "u1", "userName": "Me", "totalGames": 10,
+        "totalScores": 500, "place": 48200, "approximate": True,
+    }]
+    sketch = object()
+    mock_get = AsyncMock(return_value=fake_entry)
+
+    with patch("leaderboard_service.app.main.get_leaderboard", new=mock_get), \
+            patch.dict(rank_sketches.sketches, {"totalScores": sketch}):
+        app.dependency_overrides[get_current_user] = lambda: fake_user
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.get("/leaderboard/total-score/me?approximate=true")
+            exact = await ac.get("/leaderboard/total-score/me")
+
+        app.dependency_overrides = {}
+
+    assert response.json()["approximate"] is True
+    assert mock_get.await_args_list[0].kwargs["sketch"] is sketch
+    assert mock_get.await_args_list[1].kwargs["sketch"] is None
+    assert exact.status_code == 200
@@ -0,0 +1,13 @@
+import pytest
+from pydantic import ValidationError
+from leaderboard_service.app.models import RANKS_MAX_USER_IDS, RanksRequest
+
+
+def test_ranks_request_bounds():
+    assert RanksRequest(user_ids=["u1", "u2"]).user_ids == ["u1", "u2"]
+
+    with pytest.raises(ValidationError):
+        RanksRequest(user_ids=[])
+
+    with pytest.raises(ValidationError):
+        RanksRequest(user_ids=[f"u{i}" for i in range(RANKS_MAX_USER_IDS + 1)])
@@ -0,0 +1,119 @@
+import bisect
+import random
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from leaderboard_service.app.sketch import KLLSketch, RankSketches, SKETCH_FIELDS
+
+
+def _exact_greater(sorted_scores, value):
+    return len(sorted_scores) - bisect.bisect_right(sorted_scores, value)
+
+
+def test_small_sketch_is_exact():
+    sketch = KLLSketch(k=200, seed=1)
+    scores = [5, 1, 9, 9, 3]
+    for score in scores:
+        sketch.update(score)
+
+    assert sketch.count_greater(9) == 0
+    assert sketch.count_greater(5) == 2
+    assert sketch.count_greater(0) == 5
+
+
+def test_rank_error_within_bound():
+    rng = random.Random(3)
+    scores = [int(rng.paretovariate(1.2) * 10) for _ in range(50_000)]
+    sketch = KLLSketch(k=200, seed=3)
+    for score in scores:
+        sketch.update(score)
+
+    ordered = sorted(scores)
+    assert sketch.n == len(scores)
+    assert sketch.retained() < 1000
+    for score in rng.sample(scores, 200):
+        assert abs(sketch.count_greater(score) - _exact_greater(ordered, score)) <= sketch.error_bound()
+
+
+def test_merge_matches_single_sketch():
+    rng = random.Random(5)
+    scores = [rng.randint(0, 10_000) for _ in range(20_000)]
+    left, right = KLLSketch(k=200, seed=1), KLLSketch(k=200, seed=2)
+    for i, score in enumerate(scores):
+        (left if i % 2 else right).update(score)
+    left.merge(right)
+
+    ordered = sorted(scores)
+    assert left.n == len(scores)
+    for score in rng.sample(scores, 100):
+        assert abs(left.count_greater(score) - _exact_greater(ordered, score)) <= left.error_bound()
+
+
+def test_doc_round_trip():
+    sketch = KLLSketch(k=50, seed=1)
+    for score in range(1000):
+        sketch.update(score)
+    restored = KLLSketch.from_doc(sketch.to_doc())
+
+    assert restored.n == 1000
+    assert restored.count_greater(500) == sketch.count_greater(500)
+
+
+def _stats_cursor(docs):
+    cursor = MagicMock()
+    cursor.batch_size.return_value = cursor
+    cursor.__aiter__.return_value = docs
+    return cursor
+
+
+@pytest.mark.asyncio
+async def test_rebuild_persists_and_load_restores():
+    db = MagicMock()
+    db.user_stats.find.return_value = _stats_cursor([
+        {"totalScores": 30, "bestScore": 10},
+        {"totalScores": 50, "bestScore": 20},
+    ])
+    db.rank_sketches.replace_one = AsyncMock()
+
+    sketches = RankSketches(interval=60, k=50)
+    assert await sketches.rebuild(db) == 2
+    assert db.rank_sketches.replace_one.await_count == len(SKETCH_FIELDS)
+    assert sketches.get("totalScores").count_greater(30) == 1
+
+    saved = [c.args[1] | {"_id": c.args[0]["_id"]} for c in db.rank_sketches.replace_one.await_args_list]
+    db.rank_sketches.find.return_value.to_list = AsyncMock(return_value=saved)
+
+    restarted = RankSketches(interval=60, k=50)
+    assert await restarted.load(db) is True
+    assert restarted.get("bestScore").count_greater(10) == 1
+
+
+@pytest.mark.asyncio
+async def test_load_without_persisted_sketches():
+    db = MagicMock()
+    db.rank_sketches.find.return_value.to_list = AsyncMock(return_value=[])
+
+    assert await RankSketches().load(db) is False
+
+
+@pytest.mark.asyncio
+async def test_refresh_only_rebuilds_with_the_lease(monkeypatch):
+    from pymongo.errors import DuplicateKeyError
+    from leaderboard_service.app import sketch as sketch_module
+
+    db = MagicMock()
+    db.rank_sketches.find.return_value.to_list = AsyncMock(return_value=[])
+    db.rank_sketches.replace_one = AsyncMock()
+    db.rank_sketches.find_one_and_update = AsyncMock(side_effect=[None, DuplicateKeyError("held")])
+    db.user_stats.find.return_value = _stats_cursor([{"totalScores": 30, "bestScore": 10}])
+    monkeypatch.setattr(sketch_module, "get_db", lambda: db)
+
+    holder, other = RankSketches(interval=60, k=50), RankSketches(interval=60, k=50)
+    await holder.refresh()
+    await other.refresh()
+
+    assert holder.rebuilds == 1 and holder.get("totalScores") is not None
+    assert other.rebuilds == 0 and other.get("totalScores") is None
+    lease_filter = db.rank_sketches.find_one_and_update.await_args_list[0].args[0]
+    assert lease_filter["_id"] == "rebuild_lease"
@@ -0,0 +1,49 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from leaderboard_service.app.standings import StandingsWatcher
+
+
+@pytest.mark.asyncio
+async def test_listeners_fire_once_per_version_change():
+    mock_db = MagicMock()
+    mock_db.leaderboard_meta.find_one = AsyncMock(side_effect=[
+        {"_id": "standings", "version": 3},
+        {"_id": "standings", "version": 3},
+        {"_id": "standings", "version": 5},
+    ])
+    listener = AsyncMock()
+    watcher = StandingsWatcher(interval=0)
+    watcher.add_listener(listener)
+
+    with patch("leaderboard_service.app.standings.get_db", return_value=mock_db):
+        for _ in range(3):
+            await watcher.poll_once()
+
+    assert watcher.version == 5
+    assert [c.args[0] for c in listener.await_args_list] == [3, 5]
+
+
+@pytest.mark.asyncio
+async def test_missing_document_is_version_zero():
+    mock_db = MagicMock()
+    mock_db.leaderboard_meta.find_one = AsyncMock(return_value=None)
+    watcher = StandingsWatcher(interval=0)
+
+    with patch("leaderboard_service.app.standings.get_db", return_value=mock_db):
+        assert await watcher.poll_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_failing_listener_does_not_block_others():
+    mock_db = MagicMock()
+    mock_db.leaderboard_meta.find_one = AsyncMock(return_value={"version": 1})
+    broken = AsyncMock(side_effect=RuntimeError("boom"))
+    healthy = AsyncMock()
+    watcher = StandingsWatcher(interval=0)
+    watcher.add_listener(broken)
+    watcher.add_listener(healthy)
+
+    with patch("leaderboard_service.app.standings.get_db", return_value=mock_db):
+        await watcher.poll_once()
+
+    healthy.assert_awaited_once_with(1)
@@ -0,0 +1,21 @@
+import pytest
+from datetime import datetime, timezone
+from leaderboard_service.app.windows import current_bucket, WINDOWS
+
+NOW = datetime(2026, 1, 1, 8, 0, tzinfo=timezone.utc).timestamp()
+
+
+def test_windows():
+    assert WINDOWS == ("all", "daily", "weekly", "monthly")
+
+
+def test_current_bucket_keys():
+    assert current_bucket("daily", NOW) == "2026-01-01"
+    # Jan 1st 2026 is a Thursday, so it belongs to ISO week 1 of 2026
+    assert current_bucket("weekly", NOW) == "2026-W01"
+    assert current_bucket("monthly", NOW) == "2026-01"
+
+
+def test_current_bucket_invalid():
+    with pytest.raises(ValueError):
+        current_bucket("all", NOW)
@@ -0,0 +1,100 @@
+"""
+Storage size and encode/decode speed of click chunks: the delta-encoded
+blob `session_clicks` stores (clickcodec.py) against BSON list-of-dicts
+and BSON column arrays.
+
+Pure Python, no database. Synthetic games: a click every 150-600 ms,
+moving up to ~200 px between targets on a 1920x1080 field, ~60% hits,
+chunked as ClickIngestor would (BENCH_CHUNK events per chunk).
+
+    python perf/bench_click_codec.py
+
+BENCH_GAMES, BENCH_CLICKS (per game) and BENCH_CHUNK can be set in the
+environment.
+"""
+import os
+import random
+import sys
+import time
+
+import bson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_service.app.clickcodec import decode_events, encode_events  # noqa: E402
+
+GAMES = int(os.getenv("BENCH_GAMES", "200"))
+CLICKS = int(os.getenv("BENCH_CLICKS", "500"))
+CHUNK = int(os.getenv("BENCH_CHUNK", "60"))
+SEED = 42
+
+
+def game(rng):
+    t, x, y = 0, rng.randint(0, 1919), rng.randint(0, 1079)
+    events = []
+    for _ in range(CLICKS):
+        t += rng.randint(150, 600)
+        x = min(max(x + rng.randint(-200, 200), 0), 1919)
+        y = min(max(y + rng.randint(-200, 200), 0), 1079)
+        events.append((t, x, y, rng.random() < 0.6))
+    return events
+
+
+def as_dicts(events):
+    return bson.encode({"clicks": [{"t": t, "x": x, "y": y, "hit": hit} for t, x, y, hit in events]})
+
+
+def from_dicts(data):
+    return [(c["t"], c["x"], c["y"], c["hit"]) for c in bson.decode(data)["clicks"]]
+
+
+def as_columns(events):
+    return bson.encode(dict(zip(("t", "x", "y", "hit"), map(list, zip(*events)))))
+
+
+def from_columns(data):
+    doc = bson.decode(data)
+    return list(zip(doc["t"], doc["x"], doc["y"], doc["hit"]))
+
+
+def as_blob(events):
+    return bson.encode({"data": encode_events(events)})
+
+
+def from_blob(data):
+    return decode_events(bson.decode(data)["data"])
+
+
+def measure(name, encode, decode, chunks, events):
+    start = time.perf_counter()
+    encoded = [encode(chunk) for chunk in chunks]
+    encode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded = [decode(data) for data in encoded]
+    decode_s = time.perf_counter() - start
+
+    assert decoded == chunks, name
+    size = sum(map(len, encoded))
+    print(f"{name:<16} {size / events:>8.2f} B/click  "
+          f"encode {events / encode_s / 1e6:>6.2f} M clicks/s  decode {events / decode_s / 1e6:>6.2f} M clicks/s")
+    return size
+
+
+def main():
+    rng = random.Random(SEED)
+    chunks = []
+    for _ in range(GAMES):
+        events = game(rng)
+        chunks.extend(events[i:i + CHUNK] for i in range(0, len(events), CHUNK))
+    events = GAMES * CLICKS
+
+    print(f"{GAMES} games x {CLICKS} clicks, {len(chunks)} chunks of up to {CHUNK}")
+    dicts = measure("bson dicts", as_dicts, from_dicts, chunks, events)
+    measure("bson columns", as_columns, from_columns, chunks, events)
+    blob = measure("delta blob", as_blob, from_blob, chunks, events)
+    print(f"blob is {dicts / blob:.1f}x smaller than list-of-dicts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Click ingestion capacity of one game service worker.
+
+Opens BENCH_SESSIONS concurrent WebSocket sessions against a running game
+service, each sending BENCH_RATE click events per second (in messages of
+BENCH_EVENTS_PER_MESSAGE) for BENCH_SECONDS, then reads the worker's
+/metrics to compare what was sent with what was ingested and written.
+Step BENCH_SESSIONS / BENCH_RATE up until sent and ingested diverge or
+the worker's CPU saturates.
+
+    GAME_SVC=http://127.0.0.1:8000 TOKEN=<bearer token> python perf/bench_clicks.py
+"""
+import asyncio
+import json
+import os
+import time
+
+import httpx
+import websockets
+
+GAME_SVC = os.getenv("GAME_SVC", "http://127.0.0.1:8000")
+TOKEN = os.getenv("TOKEN", "")
+SESSIONS = int(os.getenv("BENCH_SESSIONS", "200"))
+RATE = int(os.getenv("BENCH_RATE", "20"))
+EVENTS_PER_MESSAGE = int(os.getenv("BENCH_EVENTS_PER_MESSAGE", "1"))
+SECONDS = float(os.getenv("BENCH_SECONDS", "30"))
+
+
+async def play(session_id: str) -> int:
+    url = GAME_SVC.replace("http", "ws", 1) + f"/game/{session_id}/clicks?token={TOKEN}"
+    interval = EVENTS_PER_MESSAGE / RATE
+    sent = 0
+    started = time.perf_counter()
+    async with websockets.connect(url) as ws:
+        while (elapsed := time.perf_counter() - started) < SECONDS:
+            t = int(elapsed * 1000)
+            events = [{"t": t, "x": (sent + i) % 800, "y": (sent + i) % 600, "hit": i % 3 == 0}
+                      for i in range(EVENTS_PER_MESSAGE)]
+            await ws.send(json.dumps(events))
+            sent += EVENTS_PER_MESSAGE
+            await asyncio.sleep(interval)
+    return sent
+
+
+async def main():
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    async with httpx.AsyncClient(base_url=GAME_SVC, headers=headers, timeout=30) as client:
+        before = (await client.get("/metrics")).json()["clicks"]
+        session_ids = [
+            (await client.post("/game/start")).json()["session_id"] for _ in range(SESSIONS)
+        ]
+
+        t0 = time.perf_counter()
+        sent = sum(await asyncio.gather(*(play(sid) for sid in session_ids)))
+        elapsed = time.perf_counter() - t0
+        await asyncio.sleep(1)  # let the last flush go out
+        after = (await client.get("/metrics")).json()["clicks"]
+
+    ingested = after["events"] - before["events"]
+    print(f"sessions={SESSIONS}  target={SESSIONS * RATE:,} events/s")
+    print(f"sent={sent:,} ({sent / elapsed:,.0f}/s)  ingested={ingested:,}  "
+          f"dropped={after['dropped'] - before['dropped']:,}  flushes={after['writes'] - before['writes']:,}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
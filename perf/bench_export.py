@@ -0,0 +1,90 @@
+"""
+Peak memory of GET /game/export on a large synthetic history.
+
+Seeds one player with N sessions in a scratch database, then drains the
+export route's streaming body in-process and reports peak RSS growth and
+throughput. For comparison it then loads the same history into one list
+(what returning a JSON array would need). ru_maxrss only ever grows, so
+the streaming run goes first.
+
+    MONGODB_URI=mongodb://localhost:27017 python perf/bench_export.py
+"""
+import asyncio
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_service.app import crud  # noqa: E402
+from game_service.app import db as game_db  # noqa: E402
+from game_service.app.auth_deps import TokenData  # noqa: E402
+from game_service.app.ids import new_session_id  # noqa: E402
+from game_service.app.indexes import index_drift  # noqa: E402
+from game_service.app.main import export_games  # noqa: E402
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+BENCH_DB = os.getenv("BENCH_DB", "aim_clicker_bench")
+SESSIONS = int(os.getenv("BENCH_SESSIONS", "500000"))
+PLAYER = "bench-player"
+INSERT_CHUNK = 10_000
+
+
+def _rss_mb() -> float:
+    # Linux reports KiB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def _seed(db):
+    for lo in range(0, SESSIONS, INSERT_CHUNK):
+        await db.sessions.insert_many([
+            {"session_id": new_session_id(), "user_id": [PLAYER], "scores": {PLAYER: i % 100},
+             "started_at": float(i), "finished_at": float(i) + 30}
+            for i in range(lo, min(lo + INSERT_CHUNK, SESSIONS))
+        ], ordered=False)
+
+
+async def main():
+    game_db.MONGODB_URI = MONGODB_URI
+    game_db.MONGODB_DB = BENCH_DB
+    game_db._client = None
+
+    client = game_db.get_client()
+    await client.drop_database(BENCH_DB)
+    db = game_db.get_db()
+    await index_drift(db, apply=True)
+
+    try:
+        await _seed(db)
+        baseline = _rss_mb()
+
+        t0 = time.perf_counter()
+        response = await export_games(since=None, until=None, current_user=TokenData(user_id=PLAYER, loging="bench"))
+        streamed = 0
+        async for chunk in response.body_iterator:
+            streamed += len(chunk)
+        elapsed = time.perf_counter() - t0
+        after_stream = _rss_mb()
+        print(
+            f"stream   sessions={SESSIONS:,}  bytes={streamed:,}  {SESSIONS / elapsed:,.0f} sessions/s  "
+            f"peak RSS +{after_stream - baseline:.1f} MiB"
+        )
+
+        t0 = time.perf_counter()
+        rows = await (
+            db.sessions.find({"user_id": PLAYER}, crud.HISTORY_PROJECTION)
+            .sort([("finished_at", -1), ("session_id", -1)])
+            .to_list(length=None)
+        )
+        elapsed = time.perf_counter() - t0
+        print(
+            f"to_list  sessions={len(rows):,}  {len(rows) / elapsed:,.0f} sessions/s  "
+            f"peak RSS +{_rss_mb() - baseline:.1f} MiB"
+        )
+    finally:
+        await client.drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
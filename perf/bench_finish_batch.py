@@ -0,0 +1,77 @@
+"""
+Finish throughput: one finish_game per session vs. finish_games batches.
+
+Seeds N unfinished sessions for one player in a scratch database, then
+finishes them either one call at a time (what /game/finish does per
+request) or in batches of BENCH_BATCH_SIZE (what /game/finish/batch does),
+and prints sessions per second for each. Stats, rollups and histogram
+updates run in both modes, as in production.
+
+    MONGODB_URI=mongodb://localhost:27017 python perf/bench_finish_batch.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_service.app import crud  # noqa: E402
+from game_service.app import db as game_db  # noqa: E402
+from game_service.app.ids import new_session_id  # noqa: E402
+from game_service.app.indexes import index_drift  # noqa: E402
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+BENCH_DB = os.getenv("BENCH_DB", "aim_clicker_bench")
+SESSIONS = int(os.getenv("BENCH_SESSIONS", "2000"))
+BATCH_SIZE = int(os.getenv("BENCH_BATCH_SIZE", "100"))
+PLAYER = "bench-player"
+
+
+async def _seed(db, n: int) -> list:
+    ids = [new_session_id() for _ in range(n)]
+    await db.sessions.insert_many([
+        {"session_id": sid, "user_id": [PLAYER], "scores": {PLAYER: 0},
+         "started_at": time.time(), "finished_at": None}
+        for sid in ids
+    ])
+    return ids
+
+
+async def single(ids: list):
+    for i, sid in enumerate(ids):
+        await crud.finish_game(sid, {PLAYER: i % 50}, user_id=PLAYER)
+
+
+async def batched(ids: list):
+    for lo in range(0, len(ids), BATCH_SIZE):
+        items = [
+            {"session_id": sid, "scores": {PLAYER: i % 50}, "finished_at": None}
+            for i, sid in enumerate(ids[lo:lo + BATCH_SIZE], start=lo)
+        ]
+        await crud.finish_games(items, user_id=PLAYER)
+
+
+async def main():
+    game_db.MONGODB_URI = MONGODB_URI
+    game_db.MONGODB_DB = BENCH_DB
+    game_db._client = None
+
+    client = game_db.get_client()
+    await client.drop_database(BENCH_DB)
+    db = game_db.get_db()
+    await index_drift(db, apply=True)
+
+    try:
+        for label, run in (("single", single), (f"batch of {BATCH_SIZE}", batched)):
+            ids = await _seed(db, SESSIONS)
+            t0 = time.perf_counter()
+            await run(ids)
+            elapsed = time.perf_counter() - t0
+            print(f"{label:<14} sessions={SESSIONS:,}  {SESSIONS / elapsed:10.1f} sessions/s")
+    finally:
+        await client.drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""
+Cost of deep pages of GET /game history: keyset cursor vs. skip.
+
+Seeds one player with N finished sessions in a scratch database, then
+times fetching the page at several depths, either by seeking from a
+cursor (what list_sessions does) or with skip() (what offset paging
+would do). Keyset pages should cost the same at any depth.
+
+    MONGODB_URI=mongodb://localhost:27017 python perf/bench_history.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_service.app import crud  # noqa: E402
+from game_service.app import db as game_db  # noqa: E402
+from game_service.app.ids import new_session_id  # noqa: E402
+from game_service.app.indexes import index_drift  # noqa: E402
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+BENCH_DB = os.getenv("BENCH_DB", "aim_clicker_bench")
+SESSIONS = int(os.getenv("BENCH_SESSIONS", "100000"))
+PAGE_SIZE = int(os.getenv("BENCH_PAGE_SIZE", "50"))
+DEPTHS = [int(d) for d in os.getenv("BENCH_DEPTHS", "0,1000,10000,90000").split(",")]
+SAMPLES = int(os.getenv("BENCH_SAMPLES", "20"))
+PLAYER = "bench-player"
+INSERT_CHUNK = 10_000
+
+
+async def _seed(db):
+    for lo in range(0, SESSIONS, INSERT_CHUNK):
+        await db.sessions.insert_many([
+            {"session_id": new_session_id(), "user_id": [PLAYER], "scores": {PLAYER: i % 100},
+             "started_at": float(i), "finished_at": float(i) + 30}
+            for i in range(lo, min(lo + INSERT_CHUNK, SESSIONS))
+        ], ordered=False)
+
+
+async def _time(fn) -> float:
+    timings = []
+    for _ in range(SAMPLES):
+        t0 = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings)
+
+
+async def main():
+    game_db.MONGODB_URI = MONGODB_URI
+    game_db.MONGODB_DB = BENCH_DB
+    game_db._client = None
+
+    client = game_db.get_client()
+    await client.drop_database(BENCH_DB)
+    db = game_db.get_db()
+    await index_drift(db, apply=True)
+
+    try:
+        await _seed(db)
+        for depth in DEPTHS:
+            # Cursor of the entry just before the page, as a client would hold it
+            after = None
+            if depth:
+                previous = await (
+                    db.sessions.find({"user_id": PLAYER}, crud.HISTORY_PROJECTION)
+                    .sort([("finished_at", -1), ("session_id", -1)])
+                    .skip(depth - 1)
+                    .limit(1)
+                    .to_list(length=1)
+                )
+                after = crud.decode_cursor(crud.encode_cursor(previous[0]))
+
+            async def keyset():
+                await crud.list_sessions(user_id=PLAYER, limit=PAGE_SIZE, after=after)
+
+            async def offset():
+                await (
+                    db.sessions.find({"user_id": PLAYER}, crud.HISTORY_PROJECTION)
+                    .sort([("finished_at", -1), ("session_id", -1)])
+                    .skip(depth)
+                    .limit(PAGE_SIZE)
+                    .to_list(length=PAGE_SIZE)
+                )
+
+            print(
+                f"depth={depth:>7,}  keyset p50={await _time(keyset):7.2f} ms  "
+                f"skip p50={await _time(offset):7.2f} ms"
+            )
+    finally:
+        await client.drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
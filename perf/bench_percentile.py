@@ -0,0 +1,96 @@
+"""
+Accuracy and latency of the histogram percentile against an exact count.
+
+Seeds a scratch database with N players in `user_stats`, rebuilds the
+`score_histogram` buckets the way the game service does, then for random
+players compares `percentile_from_histogram` with the exact share of
+players scoring strictly lower (one index count per sample).
+
+    MONGODB_URI=mongodb://localhost:27017 python perf/bench_percentile.py
+
+Prints the max/mean absolute error in percentage points, how often the
+exact value fell outside [lower, upper] (should be 0), and p50 timings.
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_service.app.histogram import rebuild_histogram  # noqa: E402
+from leaderboard_service.app import crud  # noqa: E402
+from leaderboard_service.app import db as lb_db  # noqa: E402
+from leaderboard_service.app.backfill import ensure_user_stats_indexes  # noqa: E402
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+BENCH_DB = os.getenv("BENCH_DB", "aim_clicker_bench")
+USERS = int(os.getenv("BENCH_USERS", "200000"))
+SAMPLES = int(os.getenv("BENCH_SAMPLES", "500"))
+INSERT_CHUNK = 10_000
+
+
+async def _seed(db, n: int):
+    for lo in range(0, n, INSERT_CHUNK):
+        stats = []
+        for i in range(lo, min(lo + INSERT_CHUNK, n)):
+            games = random.randint(1, 200)
+            # Long-tailed like real scores: most players low, a few very high
+            best = int(random.paretovariate(1.5) * 20)
+            stats.append({
+                "user_id": f"u{i}",
+                "totalGames": games,
+                "totalScores": best * games // 2,
+                "bestScore": best,
+            })
+        await db.user_stats.insert_many(stats, ordered=False)
+
+
+async def main():
+    lb_db.MONGODB_URI = MONGODB_URI
+    lb_db.MONGODB_DB = BENCH_DB
+    lb_db._client = None
+
+    client = lb_db.get_client()
+    await client.drop_database(BENCH_DB)
+    db = lb_db.get_db()
+    await ensure_user_stats_indexes(db)
+
+    try:
+        await _seed(db, USERS)
+        await rebuild_histogram(db)
+
+        for group_by in crud.SCORE_FIELDS:
+            errors, outside, hist_ms, exact_ms = [], 0, [], []
+            for _ in range(SAMPLES):
+                score = await crud.get_user_score(group_by, f"u{random.randrange(USERS)}")
+
+                t0 = time.perf_counter()
+                histogram = await crud.get_score_histogram(group_by)
+                estimate = crud.percentile_from_histogram(histogram["buckets"], score)
+                hist_ms.append((time.perf_counter() - t0) * 1000)
+
+                t0 = time.perf_counter()
+                below = await db.user_stats.count_documents({group_by: {"$lt": score}})
+                exact_ms.append((time.perf_counter() - t0) * 1000)
+
+                exact = 100.0 * below / USERS
+                errors.append(abs(estimate["percentile"] - exact))
+                if not estimate["lower"] - 1e-9 <= exact <= estimate["upper"] + 1e-9:
+                    outside += 1
+
+            print(
+                f"{group_by:<12} users={USERS:,}  buckets={len(histogram['buckets'])}  "
+                f"max_err={max(errors):.3f}pp  mean_err={statistics.mean(errors):.3f}pp  "
+                f"outside_bounds={outside}  "
+                f"histogram p50={statistics.median(hist_ms):.2f} ms  "
+                f"exact count p50={statistics.median(exact_ms):.2f} ms"
+            )
+    finally:
+        await client.drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""
+Benchmark for the "/me" rank lookup.
+
+Seeds a scratch database with N users in `user_stats` (and `users`), then
+times `get_user_rank` (index count) against the old $setWindowFields
+pipeline for random users.
+
+The count is a COUNT_SCAN over every key ranked above the user, so its cost
+is O(rank), not O(log n): it avoids ranking everyone and fetches no
+documents, but a player in the middle of 1M users still walks ~500k index
+keys. To make that visible the lookup is also timed for users at fixed
+rank percentiles (BENCH_RANK_PERCENTILES); expect latency to grow with the
+percentile and, at a given percentile, with N.
+
+    MONGODB_URI=mongodb://localhost:27017 python perf/bench_rank.py
+
+The legacy pipeline ranks every user per call, so it is only run up to
+LEGACY_MAX_USERS to keep the benchmark short.
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leaderboard_service.app import crud  # noqa: E402
+from leaderboard_service.app import db as lb_db  # noqa: E402
+from leaderboard_service.app.backfill import ensure_user_stats_indexes  # noqa: E402
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+BENCH_DB = os.getenv("BENCH_DB", "aim_clicker_bench")
+SIZES = [int(n) for n in os.getenv("BENCH_SIZES", "10000,100000,1000000").split(",")]
+SAMPLES = int(os.getenv("BENCH_SAMPLES", "200"))
+LEGACY_MAX_USERS = int(os.getenv("LEGACY_MAX_USERS", "100000"))
+RANK_PERCENTILES = [float(p) for p in os.getenv("BENCH_RANK_PERCENTILES", "0.001,0.01,0.1,0.5,0.9,0.99").split(",")]
+INSERT_CHUNK = 10_000
+
+
+def _legacy_pipeline(group_by: str, user_id: str) -> list:
+    return [
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "user_id", "as": "user"}},
+        {"$unwind": "$user"},
+        {"$setWindowFields": {"sortBy": {group_by: -1}, "output": {"place": {"$rank": {}}}}},
+        {"$match": {"user_id": user_id}},
+    ]
+
+
+async def _seed(db, start: int, stop: int):
+    for lo in range(start, stop, INSERT_CHUNK):
+        hi = min(lo + INSERT_CHUNK, stop)
+        stats, users = [], []
+        for i in range(lo, hi):
+            games = random.randint(1, 200)
+            best = random.randint(0, 500)
+            stats.append({
+                "user_id": f"u{i}",
+                "totalGames": games,
+                "totalScores": best * games // 2,
+                "bestScore": best,
+            })
+            users.append({"user_id": f"u{i}", "loging": f"player{i}"})
+        await db.user_stats.insert_many(stats, ordered=False)
+        await db.users.insert_many(users, ordered=False)
+
+
+async def _time(fn, samples: int) -> list[float]:
+    timings = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+async def _user_at(db, percentile: float, n: int) -> str:
+    """user_id of the player at `percentile` of the totalScores standings (0 = top)."""
+    doc = await (
+        db.user_stats.find({}, {"_id": 0, "user_id": 1})
+        .sort([("totalScores", -1), ("user_id", 1)])
+        .skip(min(int(n * percentile), n - 1))
+        .limit(1)
+        .to_list(length=1)
+    )
+    return doc[0]["user_id"]
+
+
+def _report(label: str, n: int, timings: list[float]):
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<14} users={n:>9,}  p50={statistics.median(timings):8.2f} ms  p95={p95:8.2f} ms")
+
+
+async def main():
+    lb_db.MONGODB_URI = MONGODB_URI
+    lb_db.MONGODB_DB = BENCH_DB
+    lb_db._client = None
+
+    client = lb_db.get_client()
+    await client.drop_database(BENCH_DB)
+    db = lb_db.get_db()
+    await ensure_user_stats_indexes(db)
+    await db.users.create_index("user_id", unique=True)
+
+    seeded = 0
+    try:
+        for n in sorted(SIZES):
+            await _seed(db, seeded, n)
+            seeded = n
+
+            async def rank_lookup():
+                await crud.get_user_rank("totalScores", f"u{random.randrange(n)}")
+
+            _report("index count", n, await _time(rank_lookup, SAMPLES))
+
+            for percentile in RANK_PERCENTILES:
+                uid = await _user_at(db, percentile, n)
+
+                async def lookup_at():
+                    await crud.get_user_rank("totalScores", uid)
+
+                _report(f"  rank p{percentile * 100:g}", n, await _time(lookup_at, max(SAMPLES // 10, 5)))
+
+            if n <= LEGACY_MAX_USERS:
+                async def legacy_lookup():
+                    uid = f"u{random.randrange(n)}"
+                    await db.user_stats.aggregate(_legacy_pipeline("totalScores", uid)).to_list(length=1)
+
+                _report("setWindowFields", n, await _time(legacy_lookup, max(SAMPLES // 20, 5)))
+    finally:
+        await client.drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""
+uuid4 vs time-ordered (ULID) session ids: insert throughput and size of
+the unique session_id index on a large collection.
+
+Seeds two scratch collections with BENCH_SESSIONS session documents each,
+one keyed by uuid4 strings (the old scheme), one by new_session_id(), both
+with the sessions index spec, and reports inserts/s per tenth of the run
+(random keys slow down once the index no longer fits in cache; ordered
+keys should not) plus the final data and index sizes. Id generation speed
+is printed first and needs no database.
+
+    MONGODB_URI=mongodb://localhost:27017 python perf/bench_session_ids.py
+
+Use a BENCH_SESSIONS large enough that the uuid4 index outgrows the
+WiredTiger cache of the server under test, or the difference will not show.
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_service.app.ids import new_session_id  # noqa: E402
+from game_service.app.indexes import INDEXES  # noqa: E402
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+BENCH_DB = os.getenv("BENCH_DB", "aim_clicker_bench")
+SESSIONS = int(os.getenv("BENCH_SESSIONS", "5000000"))
+BATCH = int(os.getenv("BENCH_BATCH", "100"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "16"))
+GENERATE = 200_000
+
+SCHEMES = {
+    "uuid4": lambda: str(uuid.uuid4()),
+    "ulid": new_session_id,
+}
+
+
+def _doc(session_id: str, i: int) -> dict:
+    player = f"bench-{i % 10_000}"
+    return {"session_id": session_id, "user_id": [player], "scores": {player: i % 100},
+            "started_at": float(i), "finished_at": float(i) + 30}
+
+
+async def _seed(collection, make_id) -> list:
+    """Insert SESSIONS documents; returns inserts/s for each tenth of the run."""
+    tenth = max(SESSIONS // 10, 1)
+    rates = []
+    next_batch = 0
+    lock = asyncio.Lock()
+    marks = {"done": 0, "t0": time.perf_counter()}
+
+    async def worker():
+        nonlocal next_batch
+        while True:
+            async with lock:
+                lo = next_batch
+                next_batch += BATCH
+            if lo >= SESSIONS:
+                return
+            await collection.insert_many(
+                [_doc(make_id(), i) for i in range(lo, min(lo + BATCH, SESSIONS))], ordered=False
+            )
+            async with lock:
+                marks["done"] += min(BATCH, SESSIONS - lo)
+                while marks["done"] >= tenth * (len(rates) + 1) and len(rates) < 10:
+                    now = time.perf_counter()
+                    rates.append(tenth / (now - marks["t0"]))
+                    marks["t0"] = now
+
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return rates
+
+
+async def main():
+    for name, make_id in SCHEMES.items():
+        t0 = time.perf_counter()
+        sample = [make_id() for _ in range(GENERATE)]
+        elapsed = time.perf_counter() - t0
+        print(f"{name:<6} generate {GENERATE / elapsed / 1e6:.2f} M ids/s, {len(sample[0])} chars")
+
+    client = AsyncIOMotorClient(MONGODB_URI)
+    db = client[BENCH_DB]
+    try:
+        for name, make_id in SCHEMES.items():
+            collection = db[f"sessions_{name}"]
+            await collection.drop()
+            await collection.create_indexes(INDEXES["sessions"])
+
+            rates = await _seed(collection, make_id)
+            stats = await db.command("collStats", collection.name)
+            id_index = next(size for index, size in stats["indexSizes"].items() if index.startswith("session_id"))
+            print(f"\n{name}: {SESSIONS:,} sessions")
+            print("  inserts/s by tenth: " + " ".join(f"{rate:,.0f}" for rate in rates))
+            print(f"  session_id index {id_index / 2**20:,.1f} MiB, all indexes "
+                  f"{stats['totalIndexSize'] / 2**20:,.1f} MiB, data {stats['size'] / 2**20:,.1f} MiB")
+    finally:
+        await client.drop_database(BENCH_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Accuracy and footprint of the KLL rank sketch against exact ranks.
+
+Pure Python, no database: builds the sketch over N synthetic players
+(long-tailed totals, like real scores), then compares the estimated place
+of random players with their exact place. As in crud.get_user_rank,
+players whose estimate is within EXACT_RANK_TOP_N + error bound would be
+counted exactly, so the errors below are over the approximate answers only.
+
+    python perf/bench_sketch.py
+
+BENCH_USERS (default 1,000,000), BENCH_SAMPLES and RANK_SKETCH_K can be set
+in the environment.
+"""
+import bisect
+import os
+import random
+import statistics
+import sys
+import time
+
+import bson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leaderboard_service.app.sketch import EXACT_RANK_TOP_N, RANK_SKETCH_K, KLLSketch  # noqa: E402
+
+USERS = int(os.getenv("BENCH_USERS", "1000000"))
+SAMPLES = int(os.getenv("BENCH_SAMPLES", "2000"))
+SEED = 42
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def main():
+    rng = random.Random(SEED)
+    scores = [int(rng.paretovariate(1.2) * 50 * rng.randint(1, 200)) for _ in range(USERS)]
+
+    t0 = time.perf_counter()
+    sketch = KLLSketch(RANK_SKETCH_K, seed=SEED)
+    for score in scores:
+        sketch.update(score)
+    build_s = time.perf_counter() - t0
+
+    ordered = sorted(scores)
+    sketch.count_greater(0)  # builds the CDF once, like the first request after a rebuild
+    abs_errors, rel_errors = [], []
+    exact_served = 0
+    query_s = 0.0
+    for _ in range(SAMPLES):
+        score = scores[rng.randrange(USERS)]
+        exact_place = USERS - bisect.bisect_right(ordered, score) + 1
+        t0 = time.perf_counter()
+        higher = sketch.count_greater(score)
+        query_s += time.perf_counter() - t0
+        if higher < EXACT_RANK_TOP_N + sketch.error_bound():
+            exact_served += 1
+            continue
+        abs_errors.append(abs(higher + 1 - exact_place))
+        rel_errors.append(abs(higher + 1 - exact_place) / exact_place)
+
+    doc_bytes = len(bson.encode({"_id": "totalScores", **sketch.to_doc(), "built_at": 0.0}))
+    print(f"players={USERS:,}  k={sketch.k}  build={build_s:.2f}s")
+    print(f"retained values={sketch.retained():,}  levels={len(sketch.levels)}  persisted doc={doc_bytes:,} bytes")
+    print(f"error bound (n*{1.7}/k)={sketch.error_bound():,} places")
+    print(f"sampled players={SAMPLES}  counted exactly (near the top)={exact_served}")
+    print(
+        f"place error over {len(abs_errors)} approximate answers: "
+        f"p50={statistics.median(abs_errors):,.0f}  p99={_percentile(abs_errors, 0.99):,.0f}  "
+        f"max={max(abs_errors):,} places"
+    )
+    print(
+        f"relative: p50={statistics.median(rel_errors):.3%}  p99={_percentile(rel_errors, 0.99):.3%}  "
+        f"max={max(rel_errors):.3%}"
+    )
+    print(f"query: {query_s / SAMPLES * 1e6:.1f} us/lookup")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ TEST_LOGIN = os.getenv("TEST_LOGIN", "perfuser")
 TEST_PASSWORD = os.getenv("TEST_PASSWORD", "secret123")
 
 CREATE_USER_ON_START = os.getenv("CREATE_USER_ON_START", "false").lower() == "true"
+REPEAT_FINISH_RATIO = float(os.getenv("REPEAT_FINISH_RATIO", "0.1"))
 
 
 class ClickerMicroservicesUser(HttpUser):
@@ -95,6 +96,16 @@ class ClickerMicroservicesUser(HttpUser):
         ) as resp:
             if resp.status_code != 200:
                 resp.failure(f"Finish failed: {resp.status_code} {resp.text}")
+                return
+
+        # Some clients retry the finish; that must be a cheap, write-free no-op
+        if random.random() < REPEAT_FINISH_RATIO:
+            self.client.post(
+                f"{GAME_SVC}/game/finish",
+                headers=self.auth_headers,
+                json={"session_id": session_id, "scores": {}, "finished_at": time.time()},
+                name="game/game/finish (repeat)",
+            )
 
     @task(2)
     def list_games(self):
@@ -1,6 +1,7 @@
 import pytest
 import pytest_asyncio
 import os
+import time
 from httpx import AsyncClient, ASGITransport
 from motor.motor_asyncio import AsyncIOMotorClient
 
@@ -99,7 +100,7 @@ async def test_full_user_flow(db_cleanup):
         score_payload = {
             "session_id": session_id,
             "scores": {user_id: 150},
-            "finished_at": 1700000000
+            "finished_at": time.time()
         }
         resp = await game_client.post("/game/finish", headers=headers, json=score_payload)
         assert resp.status_code == 200
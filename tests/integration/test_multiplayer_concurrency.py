@@ -0,0 +1,95 @@
+import asyncio
+import os
+import random
+
+import pytest
+import pytest_asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from game_service.app import crud
+from game_service.app import db as game_db
+
+# Shared Test Config
+TEST_DB_NAME = "test_integration_db"
+MONGO_URI = "mongodb://localhost:27017"
+
+os.environ["MONGODB_DB"] = TEST_DB_NAME
+
+PLAYERS = 50
+RETRIES = 3
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def db_cleanup():
+    # Many clients report into one session at once; only a real Mongo can
+    # show lost updates, so the game service runs against the test DB
+    game_db.MONGODB_URI = MONGO_URI
+    game_db.MONGODB_DB = TEST_DB_NAME
+    game_db._client = None
+
+    client = AsyncIOMotorClient(MONGO_URI)
+    await client.drop_database(TEST_DB_NAME)
+    yield
+    await client.drop_database(TEST_DB_NAME)
+
+
+def _players(prefix):
+    return [f"{prefix}{i}" for i in range(PLAYERS)]
+
+
+async def _total_games(db, players):
+    cursor = db.user_stats.find({"user_id": {"$in": players}}, {"_id": 0, "user_id": 1, "totalGames": 1})
+    return {doc["user_id"]: doc["totalGames"] async for doc in cursor}
+
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_concurrent_submissions_lose_nothing_and_finalize_once(db_cleanup):
+    db = game_db.get_db()
+    players = _players("race")
+    session_id = await crud.start_multiplayer_game(players[0], players[1:], submit_window=60)
+
+    calls = [(uid, i * 10 + attempt) for i, uid in enumerate(players) for attempt in range(RETRIES)]
+    random.shuffle(calls)
+    results = await asyncio.gather(*(crud.submit_score(session_id, uid, score) for uid, score in calls))
+
+    doc = await db.sessions.find_one({"session_id": session_id})
+
+    accepted = [uid for (uid, _), (status, _) in zip(calls, results) if status == "accepted"]
+    assert sorted(accepted) == sorted(players)
+    assert all(status == "already_submitted" for status, _ in results if status != "accepted")
+
+    assert sorted(doc["user_id"]) == sorted(players)
+    assert set(doc["scores"]) == set(players)
+    for i, uid in enumerate(players):
+        assert i * 10 <= doc["scores"][uid] < i * 10 + RETRIES
+    assert doc["finished_at"] is not None and "submit_deadline" not in doc
+
+    # Finalized exactly once: every player counted one game
+    assert doc["stats_recorded"] is True
+    assert await _total_games(db, players) == {uid: 1 for uid in players}
+
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_deadline_sweep_racing_submissions_keeps_every_accepted_score(db_cleanup):
+    db = game_db.get_db()
+    players = _players("sweep")
+    session_id = await crud.start_multiplayer_game(players[0], players[1:], submit_window=0.05)
+
+    async def submit(uid):
+        await asyncio.sleep(random.uniform(0, 0.1))
+        return uid, await crud.submit_score(session_id, uid, 1)
+
+    async def sweep():
+        await asyncio.sleep(0.05)
+        return await crud.finalize_expired_sessions()
+
+    *submitted, swept = await asyncio.gather(*(submit(uid) for uid in players), sweep())
+    doc = await db.sessions.find_one({"session_id": session_id})
+
+    accepted = {uid for uid, (status, _) in submitted if status == "accepted"}
+    closed = {uid for uid, (status, _) in submitted if status == "closed"}
+    # Everything accepted made it into the finished session, nothing else did
+    assert set(doc["scores"]) == accepted
+    assert accepted | closed == set(players)
+    assert doc["finished_at"] is not None
+    assert await _total_games(db, players) == {uid: 1 for uid in accepted}
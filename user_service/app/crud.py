@@ -43,6 +43,17 @@ async def get_user_by_loging(db: AsyncIOMotorDatabase, loging: str) -> Optional[
     return doc
 
 
+# Rename a user and propagate the new loging to the leaderboard stats,
+# which keep a copy of it so leaderboard reads never join users
+async def rename_user(db: AsyncIOMotorDatabase, user_id: str, new_loging: str) -> Optional[UserInDB]:
+    result = await db.users.update_one({"user_id": user_id}, {"$set": {"loging": new_loging}})
+    if not result.matched_count:
+        return None
+    await db.user_stats.update_one({"user_id": user_id}, {"$set": {"userName": new_loging}})
+    await db.user_stats_rollups.update_many({"user_id": user_id}, {"$set": {"userName": new_loging}})
+    return await get_user(db, user_id)
+
+
 # Authenticate a user
 async def authenticate_user(db: AsyncIOMotorDatabase, loging: str, password: str) -> Optional[dict]:
     user = await get_user_by_loging(db, loging)
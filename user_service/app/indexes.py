@@ -0,0 +1,107 @@
+# user_service/app/indexes.py
+"""
+MongoDB indexes this service relies on, declared in one place.
+
+They are applied idempotently at startup (see the lifespan in main.py;
+set APPLY_INDEXES_ON_STARTUP=0 to skip) and can be applied or checked
+ahead of a deploy:
+
+    python -m user_service.app.indexes           # create, then report drift
+    python -m user_service.app.indexes --check   # report drift only
+
+Drift is reported per collection: declared indexes that are missing,
+indexes whose options differ from the declaration (create_indexes refuses
+to change those, drop them by hand first), and extra indexes nobody
+declared. Extras are informational only: collections shared with another
+service also carry that service's indexes.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from typing import Dict, List
+
+from pymongo import ASCENDING, IndexModel
+
+from user_service.app.db import get_db
+
+APPLY_INDEXES_ON_STARTUP = os.getenv("APPLY_INDEXES_ON_STARTUP", "1") == "1"
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # get_user, and the game service's name lookups by id
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        # Login looks users up by loging, which must stay unique
+        IndexModel([("loging", ASCENDING)], unique=True),
+    ],
+}
+
+_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def _key(fields) -> tuple:
+    return tuple((field, int(direction) if isinstance(direction, float) else direction) for field, direction in fields)
+
+
+def _options(spec: dict) -> dict:
+    return {option: spec[option] for option in _OPTIONS if spec.get(option) not in (None, False)}
+
+
+async def collection_drift(db, collection: str, declared: List[IndexModel]) -> dict:
+    actual = await db[collection].index_information()
+    actual = {_key(info["key"]): _options(info) for name, info in actual.items() if name != "_id_"}
+    wanted = {_key(model.document["key"].items()): _options(model.document) for model in declared}
+
+    drift = {
+        "missing": [list(key) for key in wanted if key not in actual],
+        "conflicting": [list(key) for key, options in wanted.items() if key in actual and actual[key] != options],
+        "extra": [list(key) for key in actual if key not in wanted],
+    }
+    return {kind: keys for kind, keys in drift.items() if keys}
+
+
+async def index_drift(db, apply: bool = False) -> Dict[str, dict]:
+    """
+    Drift between INDEXES and the database, per collection (collections
+    without drift are left out). With `apply`, missing indexes are created
+    first; an error creating them is reported under "error".
+    """
+    async def check(collection: str, declared: List[IndexModel]) -> dict:
+        try:
+            if apply:
+                # create_indexes is a no-op for indexes that already exist
+                await db[collection].create_indexes(declared)
+            return await collection_drift(db, collection, declared)
+        except Exception as exc:
+            return {"error": repr(exc)}
+
+    reports = await asyncio.gather(*(check(c, d) for c, d in INDEXES.items()))
+    return {collection: report for collection, report in zip(INDEXES, reports) if report}
+
+
+def needs_attention(drift: Dict[str, dict]) -> bool:
+    return any(set(report) - {"extra"} for report in drift.values())
+
+
+async def bootstrap_indexes() -> None:
+    # Startup must not fail because of an index; the drift is logged instead
+    drift = await index_drift(get_db(), apply=True)
+    for collection, report in drift.items():
+        print(f"index drift on {collection}:", report)
+
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Apply or check the user service MongoDB indexes")
+    parser.add_argument("--check", action="store_true", help="only report drift, create nothing")
+    args = parser.parse_args(argv)
+
+    drift = await index_drift(get_db(), apply=not args.check)
+    for collection, report in drift.items():
+        print(f"{collection}: {report}")
+    if not drift:
+        print("indexes match the spec")
+    return 1 if needs_attention(drift) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
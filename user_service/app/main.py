@@ -1,5 +1,6 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from typing import List
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
@@ -7,8 +8,17 @@ from user_service.app.auth.routes import router as auth_router
 from user_service.app.models import UserCreate, UserInDB
 from user_service.app.db import get_db
 from user_service.app import crud
+from user_service.app.indexes import APPLY_INDEXES_ON_STARTUP, bootstrap_indexes
 
-app = FastAPI(title="Aim Clicker User Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if APPLY_INDEXES_ON_STARTUP:
+        await bootstrap_indexes()
+    yield
+
+
+app = FastAPI(title="Aim Clicker User Service", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
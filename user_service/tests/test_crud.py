@@ -88,4 +88,35 @@ async def test_authenticate_user_not_found():
     mock_db.users.find_one = AsyncMock(return_value=None)
 
     res = await crud.authenticate_user(mock_db, "missing", "pass")
-    assert res is None
\ No newline at end of file
+    assert res is None
+
+
+@pytest.mark.asyncio
+async def test_rename_user_propagates_to_leaderboard_stats():
+    mock_db = MagicMock()
+    mock_db.users.update_one = AsyncMock(return_value=MagicMock(matched_count=1))
+    mock_db.user_stats.update_one = AsyncMock()
+    mock_db.user_stats_rollups.update_many = AsyncMock()
+    mock_db.users.find_one = AsyncMock(return_value={
+        "user_id": "u1", "loging": "new_name", "email": None, "created_at": 1.0, "password": "p"
+    })
+
+    user = await crud.rename_user(mock_db, "u1", "new_name")
+
+    assert user.loging == "new_name"
+    mock_db.user_stats.update_one.assert_awaited_once_with(
+        {"user_id": "u1"}, {"$set": {"userName": "new_name"}}
+    )
+    mock_db.user_stats_rollups.update_many.assert_awaited_once_with(
+        {"user_id": "u1"}, {"$set": {"userName": "new_name"}}
+    )
+
+
+@pytest.mark.asyncio
+async def test_rename_user_not_found():
+    mock_db = MagicMock()
+    mock_db.users.update_one = AsyncMock(return_value=MagicMock(matched_count=0))
+    mock_db.user_stats.update_one = AsyncMock()
+
+    assert await crud.rename_user(mock_db, "missing", "x") is None
+    mock_db.user_stats.update_one.assert_not_called()
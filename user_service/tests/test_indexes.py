@@ -0,0 +1,53 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from user_service.app import indexes
+
+
+def _db(index_info):
+    """Mock database whose collections report `index_info[name]`."""
+    collections = {}
+    for name in indexes.INDEXES:
+        collection = MagicMock()
+        collection.create_indexes = AsyncMock()
+        collection.index_information = AsyncMock(return_value=index_info.get(name, {}))
+        collections[name] = collection
+    db = MagicMock()
+    db.__getitem__.side_effect = collections.__getitem__
+    return db, collections
+
+
+def _info(models):
+    return {
+        f"ix{i}": {"key": list(model.document["key"].items()), **{
+            k: v for k, v in model.document.items() if k in ("unique", "expireAfterSeconds")
+        }}
+        for i, model in enumerate(models)
+    }
+
+
+def test_spec_has_unique_user_id_and_loging():
+    keys = {
+        tuple(model.document["key"].items()): model.document.get("unique", False)
+        for model in indexes.INDEXES["users"]
+    }
+    assert keys[(("user_id", 1),)] is True
+    assert keys[(("loging", 1),)] is True
+
+
+@pytest.mark.asyncio
+async def test_no_drift_when_everything_matches():
+    db, _ = _db({name: _info(models) for name, models in indexes.INDEXES.items()})
+
+    assert await indexes.index_drift(db) == {}
+
+
+@pytest.mark.asyncio
+async def test_cli_check_exit_code():
+    db, _ = _db({})
+
+    with patch("user_service.app.indexes.get_db", return_value=db):
+        assert await indexes.main(["--check"]) == 1
+
+    db, _ = _db({name: _info(models) for name, models in indexes.INDEXES.items()})
+    with patch("user_service.app.indexes.get_db", return_value=db):
+        assert await indexes.main(["--check"]) == 0